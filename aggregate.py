@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Agregacja wydz_lin_seg wg adr_les ograniczona pamięciowo (krok 28).
+
+native:aggregate trzyma geometrie i atrybuty wszystkich grup aż do końca
+wejścia. Tutaj grupa jest zamykana i oddawana, gdy tylko na wejściu
+pojawi się kolejny adr_les, więc w pamięci jest najwyżej jedna grupa.
+Wymaga to wejścia uporządkowanego (albo przynajmniej pogrupowanego) wg
+adr_les – gdy takie nie jest, obiekty przechodzą najpierw przez
+GroupSpill, który porządkuje je w tymczasowej bazie SQLite na dysku.
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from qgis.core import QgsGeometry, QgsMultiLineString
+
+
+class GroupSpill:
+    """
+    Tymczasowy plik SQLite: (adr_les, kolejność, atrybuty, WKB). Odczyt
+    w kolejności adr_les, a w grupie – w kolejności dopisania (first_value
+    jak w native:aggregate). Sortowanie wykonuje SQLite, z użyciem dysku.
+    """
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(suffix='.sqlite', prefix='agreg_', dir=directory)
+        os.close(fd)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=OFF')
+        self._db.execute('PRAGMA synchronous=OFF')
+        self._db.execute('PRAGMA temp_store=FILE')
+        self._db.execute('CREATE TABLE seg (klucz TEXT, nr INTEGER, kod_ob TEXT, silp_pow REAL, dlugosc REAL, wkb BLOB)')
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, adr_les, kod_ob, silp_pow, dlugosc, geom):
+        wkb = None if geom is None or geom.isNull() else bytes(geom.asWkb())
+        self._db.execute('INSERT INTO seg VALUES (?, ?, ?, ?, ?, ?)',
+                         (adr_les, self._count, kod_ob, silp_pow, dlugosc, wkb))
+        self._count += 1
+
+    def rows(self):
+        """(adr_les, kod_ob, silp_pow, dlugosc, geometria) uporządkowane wg adr_les."""
+        cursor = self._db.execute('SELECT klucz, kod_ob, silp_pow, dlugosc, wkb FROM seg ORDER BY klucz, nr')
+        for key, kod_ob, silp_pow, dlugosc, wkb in cursor:
+            geom = QgsGeometry()
+            if wkb is not None:
+                geom.fromWkb(wkb)
+            yield key, kod_ob, silp_pow, dlugosc, geom
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def aggregate_sorted(rows):
+    """
+    Grupy z wierszy (adr_les, kod_ob, silp_pow, dlugosc, geometria)
+    uporządkowanych wg adr_les: (adr_les, kod_ob, silp_pow, suma dlugosc,
+    geometria zebrana w MultiLineString). kod_ob i SILP_pow – first_value.
+    """
+    current = None
+    for key, kod_ob, silp_pow, dlugosc, geom in rows:
+        if current is None or key != current[0]:
+            if current is not None:
+                yield _finish(current)
+            current = [key, kod_ob, silp_pow, None, QgsMultiLineString()]
+        if dlugosc is not None:
+            current[3] = dlugosc if current[3] is None else current[3] + dlugosc
+        if geom is not None and not geom.isNull():
+            # części dopisywane od razu – bez listy geometrii grupy
+            for part in geom.constParts():
+                current[4].addGeometry(part.clone())
+    if current is not None:
+        yield _finish(current)
+
+
+def _finish(group):
+    key, kod_ob, silp_pow, dlugosc, multi = group
+    return key, kod_ob, silp_pow, dlugosc, QgsGeometry(multi)
@@ -11,37 +11,53 @@ from qgis.core import (
     QgsProcessingParameterFeatureSink,
     QgsProcessingParameterVectorDestination,
     QgsProcessingParameterDefinition,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingUtils,
     QgsCoordinateReferenceSystem,
+    QgsWkbTypes,
+)
+
+# processing i moduły obliczeniowe (engine, dag, cache, profiling, funkcje zapisu
+# z writers) importowane są w metodach – rejestracja algorytmu przy starcie QGIS
+# ich nie wczytuje; z writers potrzebne są tu tylko stałe parametrów
+from .utils import opis_html
+from .writers import COMPRESSION_OPTIONS, DEFAULT_ROW_GROUP_SIZE
+
+# Tryby obliczeń (parametr 'silnik')
+SILNIK_LANCUCH = 0
+SILNIK_STRUMIENIOWY = 1
+SILNIK_OPCJE = [
+    'Łańcuch algorytmów Processing (33 kroki)',
+    'Silnik strumieniowy (jeden przebieg, bez warstw pośrednich)',
+]
+
+# wpis pamięci podręcznej łańcucha: wyniki kroków 3, 5 i 12
+CACHE_KIND = 'lancuch'
+CACHE_LAYERS = ('oddz_pol', 'oddz_lin', 'oddz_adr')
+CACHE_STEPS = ('DodajAdr_lesDoOddz_pol', 'Oddz_polNaOddz_lin', 'ZmieAdr_lesNaAdr_oddz')
+
+# wyniki algorytmu -> kroki łańcucha, które je tworzą
+RESULT_STEPS = {'Wydz_lin_seg': 'DodajPowSilpDoWydz_lin_seg', 'Wydz_lin_agreg': 'PrzeliczDlugoscPoAgreg'}
+
+# Parametry wejściowe bazowego modelu
+INPUT_LAYERS = (
+    'wydzielenia_nr_wew_formularz_z_bo',
+    'a_kom_adbf',
+    'a_kom_linshp',
+    'a_line_adbf',
+    'a_line_linshp',
+    'a_oddz_polshp',
 )
-import processing
-import os
-
-# wczytanie ścieżki katalogu wtyczki
-from .utils import plugin_dir
-
-
-def _opis_html() -> str:
-    """
-    Czyta plik Opis.txt z katalogu wtyczki i zwraca prosty HTML
-    do wyświetlenia po prawej stronie natywnego dialogu Processing.
-    Bez żadnego nagłówka nad treścią.
-    """
-    try:
-        path = os.path.join(plugin_dir(), 'Opis.txt')
-        with open(path, 'r', encoding='utf-8') as f:
-            txt = f.read().strip()
-        body = '<br>'.join(txt.splitlines())
-        return f'<div style="white-space:normal">{body}</div>'
-    except Exception:
-        return ('<div>Wtyczka „Wydzielenia liniowe”. '
-                'Umieść plik <code>Opis.txt</code> w folderze wtyczki, aby tutaj pojawiła się treść opisu.</div>')
 
 
 class Wydz_liniowe(QgsProcessingAlgorithm):
 
     # ------ opis w prawym panelu natywnego dialogu ------
     def shortHelpString(self) -> str:
-        return _opis_html()
+        return opis_html()
     # -----------------------------------------------------
 
     def initAlgorithm(self, config=None):
@@ -89,401 +105,437 @@ class Wydz_liniowe(QgsProcessingAlgorithm):
         )
         self.addParameter(p_seg)
 
+        # --- Tryb obliczeń (zaawansowane) ---
+        p_silnik = QgsProcessingParameterEnum(
+            'silnik', 'Tryb obliczeń',
+            options=SILNIK_OPCJE,
+            defaultValue=SILNIK_LANCUCH
+        )
+        p_silnik.setFlags(p_silnik.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_silnik)
+
+        # --- Liczba wątków: gałęzie łańcucha albo grupy oddziałów silnika (zaawansowane) ---
+        p_watki = QgsProcessingParameterNumber(
+            'liczba_watkow', 'Liczba wątków (0 = wszystkie rdzenie)',
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0, defaultValue=1
+        )
+        p_watki.setFlags(p_watki.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_watki)
+
+        # --- Kroki 31/32 (wczytanie do projektu) – wyłączane w trybie wsadowym ---
+        p_wczytaj = QgsProcessingParameterBoolean(
+            'wczytaj_wyniki', 'Wczytaj warstwy wynikowe do projektu',
+            defaultValue=True
+        )
+        p_wczytaj.setFlags(p_wczytaj.flags() | QgsProcessingParameterDefinition.FlagHidden)
+        self.addParameter(p_wczytaj)
+
+        # --- Pomiar kroków (zaawansowane) ---
+        p_profil = QgsProcessingParameterBoolean(
+            'profilowanie', 'Mierz czas, CPU, pamięć i liczbę obiektów w każdym kroku',
+            defaultValue=False
+        )
+        p_profil.setFlags(p_profil.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_profil)
+
+        p_raport = QgsProcessingParameterFileDestination(
+            'raport_profilu', 'Raport pomiarów kroków',
+            fileFilter='JSON (*.json);;CSV (*.csv)',
+            optional=True, createByDefault=False
+        )
+        p_raport.setFlags(p_raport.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_raport)
+
+        # przygotowane oddziały zapamiętywane między uruchomieniami (zaawansowane)
+        p_cache = QgsProcessingParameterBoolean(
+            'pamiec_podreczna', 'Zapamiętuj przygotowane oddziały między uruchomieniami',
+            defaultValue=True
+        )
+        p_cache.setFlags(p_cache.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_cache)
+
+        # krok 20 – przyciąganie do siatki przy porównaniu geometrii (zaawansowane)
+        p_siatka = QgsProcessingParameterNumber(
+            'siatka_duplikatow', 'Siatka przyciągania przy wyszukiwaniu duplikatów geometrii [m] (0 = bez przyciągania)',
+            type=QgsProcessingParameterNumber.Double,
+            minValue=0.0, defaultValue=0.0
+        )
+        p_siatka.setFlags(p_siatka.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_siatka)
+
+        # łańcuch: powyżej budżetu wyniki pośrednie zapisywane na dysk (zaawansowane)
+        p_budzet = QgsProcessingParameterNumber(
+            'budzet_pamieci', 'Budżet pamięci dla warstw pośrednich [MB] (0 = bez limitu)',
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0, defaultValue=0
+        )
+        p_budzet.setFlags(p_budzet.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_budzet)
+
+        # --- Wyniki .parquet / .arrow: paczki wierszy i kompresja (zaawansowane) ---
+        p_grupa = QgsProcessingParameterNumber(
+            'rozmiar_grupy_wierszy', 'GeoParquet/Arrow: liczba obiektów w grupie wierszy',
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=1, defaultValue=DEFAULT_ROW_GROUP_SIZE
+        )
+        p_grupa.setFlags(p_grupa.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_grupa)
+
+        p_kompresja = QgsProcessingParameterEnum(
+            'kompresja', 'GeoParquet/Arrow: kompresja',
+            options=COMPRESSION_OPTIONS,
+            defaultValue=0
+        )
+        p_kompresja.setFlags(p_kompresja.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_kompresja)
+
+        # --- Oba wyniki w jednym GeoPackage, zapis zbiorczy (zaawansowane) ---
+        p_gpkg = QgsProcessingParameterFileDestination(
+            'wyniki_gpkg', 'Wspólny GeoPackage wyników (zapis zbiorczy, zastępuje oba wyjścia)',
+            fileFilter='GeoPackage (*.gpkg)',
+            optional=True, createByDefault=False
+        )
+        p_gpkg.setFlags(p_gpkg.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_gpkg)
+
     def processAlgorithm(self, parameters, context, model_feedback):
+        from .cache import PreparedCache
+        from .profiling import StepProfiler
+
+        profiler = StepProfiler() if self.parameterAsBoolean(parameters, 'profilowanie', context) else None
+        cache = PreparedCache() if self.parameterAsBoolean(parameters, 'pamiec_podreczna', context) else None
+
+        if self.parameterAsEnum(parameters, 'silnik', context) == SILNIK_STRUMIENIOWY:
+            results = self._process_streaming(parameters, context, model_feedback, profiler, cache)
+        else:
+            results = self._process_chain(parameters, context, model_feedback, profiler, cache)
+
+        if profiler is not None and results:
+            model_feedback.pushInfo('Pomiar kroków:\n' + profiler.summary())
+            report_path = self.parameterAsFileOutput(parameters, 'raport_profilu', context)
+            if report_path:
+                profiler.write(report_path)
+                results['raport_profilu'] = report_path
+            # rekordy jako wynik strukturalny – tryb wsadowy je agreguje
+            results['PROFIL'] = profiler.records
+        return results
+
+    def _run_step(self, profiler, key, alg_id, alg_params, context, feedback):
+        """processing.run kroku łańcucha; z profilerem – z pomiarem kroku."""
+        import processing
+        if profiler is None:
+            return processing.run(alg_id, alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+        with profiler.step(key, alg_id, profiler.count(alg_params.get('INPUT'), context)) as record:
+            out = processing.run(alg_id, alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+            record['wyjscie'] = profiler.count(out.get('OUTPUT'), context)
+        return out
+
+    def _process_chain(self, parameters, context, model_feedback, profiler=None, cache=None):
         # 33 kroki – po agregacji: reproject do EPSG:2180 i dopiero liczenie $length
         # 31: loadlayer seg, 32: loadlayer agreg (narzucają nazwy w projekcie)
+        from .writers import GPKG_LAYERS, columnar_driver, destination_path, write_columnar, write_gpkg_bulk
+
         feedback = QgsProcessingMultiStepFeedback(33, model_feedback)
         results = {}
         outputs = {}
 
-        # 0) Zmień pola na dziesiętne
-        alg_params = {
-            'FIELDS_MAPPING': [
-                {'alias': None, 'comment': None, 'expression': 'adr_les', 'length': 25, 'name': 'adr_les', 'precision': 0, 'sub_type': 0, 'type': 10, 'type_name': 'text'},
-                {'alias': None, 'comment': None, 'expression': 'nr_wew', 'length': 10, 'name': 'nr_wew', 'precision': 0, 'sub_type': 0, 'type': 4, 'type_name': 'int8'},
-                {'alias': None, 'comment': None, 'expression': 'pow', 'length': 10, 'name': 'pow', 'precision': 4, 'sub_type': 0, 'type': 6, 'type_name': 'double precision'}
-            ],
-            'INPUT': parameters['wydzielenia_nr_wew_formularz_z_bo'],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['ZmiePolaNaDziesitne'] = processing.run('native:refactorfields', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+        # kroki 2, 3, 5 i 12 zależą tylko od a_oddz_pol i raportu BO – z pamięci podręcznej, jeśli jest
+        cache_key = None
+        if cache is not None:
+            from .cache import layers_key
+            cache_key = layers_key(self.parameterAsVectorLayer(parameters, 'a_oddz_polshp', context),
+                                   self.parameterAsVectorLayer(parameters, 'wydzielenia_nr_wew_formularz_z_bo', context))
+        cached = cache.get(cache_key, CACHE_KIND, CACHE_LAYERS) if cache_key else None
+        if cached:
+            feedback.pushInfo('Oddziały z pamięci podręcznej – pomijam kroki 2, 3, 5 i 12.')
+            # krok 2 służy tylko jako nakładka przycięcia – geometria ta sama co po kroku 3
+            outputs['NaprawGeometrieOddz_pol'] = {'OUTPUT': cached['oddz_pol']}
+            outputs['DodajAdr_lesDoOddz_pol'] = {'OUTPUT': cached['oddz_pol']}
+            outputs['Oddz_polNaOddz_lin'] = {'OUTPUT': cached['oddz_lin']}
+            outputs['ZmieAdr_lesNaAdr_oddz'] = {'OUTPUT': cached['oddz_adr']}
+
+        # wyniki .parquet/.arrow i wspólny GeoPackage: łańcuch kończy się w pamięci,
+        # a pliki zapisywane są jednym przebiegiem na końcu
+        bulk_path = self.parameterAsFileOutput(parameters, 'wyniki_gpkg', context)
+        columnar = {name: destination_path(parameters.get(name)) for name in RESULT_STEPS
+                    if not bulk_path and columnar_driver(parameters.get(name))}
+        in_memory = RESULT_STEPS if bulk_path else columnar
+        chain_parameters = dict(parameters, **{name: QgsProcessing.TEMPORARY_OUTPUT for name in in_memory})
+
+        # kroki 1-30 jako graf zależności (dag.py) – gałęzie a_kom_* i a_line_*
+        # liczone równolegle, gdy liczba wątków > 1
+        graph = self._chain_graph(chain_parameters, context, cached)
+        # wejścia tylko z kolumnami, z których korzystają kroki (planner.py), a linie
+        # tylko z zasięgu oddziałów czytanego z indeksem .qix (pushdown.py);
+        # klucz pamięci podręcznej liczony wyżej z oryginalnych warstw
+        from .planner import ColumnPlan
+        from .pushdown import SLMN_SHAPEFILES, compartment_rect, ensure_indexes
+        slmn = {name: self.parameterAsVectorLayer(parameters, name, context) for name in SLMN_SHAPEFILES}
+        ensure_indexes(slmn.values(), feedback)
+        rects = [(chain_parameters[name], compartment_rect(slmn['a_oddz_polshp'], slmn[name],
+                                                           context.transformContext()))
+                 for name in ('a_kom_linshp', 'a_line_linshp')]
+        ColumnPlan(graph, RESULT_STEPS.values()).apply(context, feedback, rects)
+        # wyniki kroków 3, 5 i 12 wstrzymane przed zwolnieniem do chwili zapisu w pamięci
+        # podręcznej – krok 5 ma ostatnich odbiorców (10, 11) przed zakończeniem kroku 12
+        hold = set(CACHE_STEPS) if cache_key and not cached else set()
+
+        def on_done(key):
+            if hold and all(step in outputs for step in CACHE_STEPS):
+                try:
+                    self._store_prepared(cache, cache_key, outputs, context, feedback)
+                finally:
+                    hold.clear()
+
+        workers = self.parameterAsInt(parameters, 'liczba_watkow', context)
+        budget = self.parameterAsInt(parameters, 'budzet_pamieci', context)
+
+        def run_stage(stage, params, stage_context, stage_feedback):
+            return self._run_step(profiler, stage.key, stage.alg_id, params, stage_context, stage_feedback)
+
+        # warstwy pośrednie zwalniane po ostatnim kroku, który ich używa; wyniki zostają
+        if not graph.run(run_stage, outputs, context, feedback, workers, steps=31, on_done=on_done,
+                         keep=RESULT_STEPS.values(), hold=hold, budget_mb=budget):
+            return {}
+        for name, key in RESULT_STEPS.items():
+            results[name] = outputs[key]['OUTPUT']
+        for name, path in columnar.items():
+            layer = QgsProcessingUtils.mapLayerFromString(results[name], context)
+            write_columnar(layer, path, context.transformContext(), *self._columnar_options(parameters, context),
+                           feedback=feedback)
+            results[name] = path
+        if bulk_path:
+            layers = {GPKG_LAYERS[name]: QgsProcessingUtils.mapLayerFromString(results[name], context)
+                      for name in RESULT_STEPS}
+            sources = write_gpkg_bulk(bulk_path, layers, layers[GPKG_LAYERS['Wydz_lin_seg']].crs(), feedback)
+            if not sources:
+                return {}
+            results = {name: sources[GPKG_LAYERS[name]] for name in RESULT_STEPS}
+
+        if not self.parameterAsBoolean(parameters, 'wczytaj_wyniki', context):
+            return results
 
-        feedback.setCurrentStep(1)
+        feedback.setCurrentStep(31)
         if feedback.isCanceled():
             return {}
 
-        # 1) Dodaj adr_les do a_kom_a
+        # 31) Wczytaj do projektu: wydz_lin_seg (narzuć nazwę)
         alg_params = {
-            'DISCARD_NONMATCHING': False,
-            'FIELD': 'nr_wew',
-            'FIELDS_TO_COPY': ['adr_les'],
-            'FIELD_2': 'nr_wew',
-            'INPUT': parameters['a_kom_adbf'],
-            'INPUT_2': outputs['ZmiePolaNaDziesitne']['OUTPUT'],
-            'METHOD': 1,
-            'PREFIX': None,
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
+            'INPUT': results['Wydz_lin_seg'],
+            'NAME': 'wydz_lin_seg'
         }
-        outputs['DodajAdr_lesDoA_kom_a'] = processing.run('native:joinattributestable', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+        self._run_step(profiler, 'WczytajWydz_lin_seg', 'native:loadlayer', alg_params, context, feedback)
 
-        feedback.setCurrentStep(2)
+        feedback.setCurrentStep(32)
         if feedback.isCanceled():
             return {}
 
-        # 2) Napraw geometrie oddz_pol
+        # 32) Wczytaj do projektu: wydz_lin_agreg (narzuć nazwę)
         alg_params = {
-            'INPUT': parameters['a_oddz_polshp'],
-            'METHOD': 1,
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
+            'INPUT': results['Wydz_lin_agreg'],
+            'NAME': 'wydz_lin_agreg'
         }
-        outputs['NaprawGeometrieOddz_pol'] = processing.run('native:fixgeometries', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+        self._run_step(profiler, 'WczytajWydz_lin_agreg', 'native:loadlayer', alg_params, context, feedback)
 
-        feedback.setCurrentStep(3)
-        if feedback.isCanceled():
-            return {}
+        return results
 
-        # 3) Dodaj adr_les do oddz_pol
-        alg_params = {
-            'DISCARD_NONMATCHING': False,
-            'FIELD': 'nr_wew',
-            'FIELDS_TO_COPY': ['adr_les'],
-            'FIELD_2': 'nr_wew',
-            'INPUT': outputs['NaprawGeometrieOddz_pol']['OUTPUT'],
-            'INPUT_2': outputs['ZmiePolaNaDziesitne']['OUTPUT'],
-            'METHOD': 1,
-            'PREFIX': None,
+    def _chain_graph(self, parameters, context, cached):
+        """Kroki 1-30 łańcucha (dag.StageGraph); przy 'cached' bez kroków 2, 3, 5 i 12."""
+        from .dag import Ref, StageGraph
+
+        graph = StageGraph()
+
+        # 0-1) Dodaj adr_les do a_kom_a – rzutowanie pól raportu BO (dawny krok 0) w locie,
+        # tabele DBF czytane bezpośrednio, bez obiektów QgsFeature (algorithm_join.py)
+        graph.add(1, 'DodajAdr_lesDoA_kom_a', 'lmn:zlacz_adr_les', {
+            'INPUT': parameters['a_kom_adbf'],
+            'BO': parameters['wydzielenia_nr_wew_formularz_z_bo'],
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['DodajAdr_lesDoOddz_pol'] = processing.run('native:joinattributestable', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+        })
+
+        # 2) Napraw geometrie oddz_pol – sprawdzenie poprawności równolegle, naprawa
+        # tylko niepoprawnych, zbiór napraw zapamiętany pod skrótem a_oddz_pol (validity.py)
+        if not cached:
+            graph.add(2, 'NaprawGeometrieOddz_pol', 'lmn:napraw_niepoprawne_geometrie', {
+                'INPUT': parameters['a_oddz_polshp'],
+                'BO': parameters['wydzielenia_nr_wew_formularz_z_bo'],
+                'PAMIEC_PODRECZNA': self.parameterAsBoolean(parameters, 'pamiec_podreczna', context),
+                'LICZBA_WATKOW': 0,
+                'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
+            })
 
-        feedback.setCurrentStep(4)
-        if feedback.isCanceled():
-            return {}
+        # 3) Dodaj adr_les do oddz_pol
+        if not cached:
+            graph.add(3, 'DodajAdr_lesDoOddz_pol', 'lmn:zlacz_adr_les', {
+                'INPUT': Ref('NaprawGeometrieOddz_pol'),
+                'BO': parameters['wydzielenia_nr_wew_formularz_z_bo'],
+                'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
+            })
 
         # 4) Przytnij a_kom_lin do oddz_pol
-        alg_params = {
+        graph.add(4, 'PrzytnijA_kom_linDoOddz_pol', 'native:clip', {
             'INPUT': parameters['a_kom_linshp'],
-            'OVERLAY': outputs['NaprawGeometrieOddz_pol']['OUTPUT'],
+            'OVERLAY': Ref('NaprawGeometrieOddz_pol'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['PrzytnijA_kom_linDoOddz_pol'] = processing.run('native:clip', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(5)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 5) Oddz_pol na oddz_lin
-        alg_params = {
-            'INPUT': outputs['DodajAdr_lesDoOddz_pol']['OUTPUT'],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['Oddz_polNaOddz_lin'] = processing.run('native:polygonstolines', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(6)
-        if feedback.isCanceled():
-            return {}
+        if not cached:
+            graph.add(5, 'Oddz_polNaOddz_lin', 'native:polygonstolines', {
+                'INPUT': Ref('DodajAdr_lesDoOddz_pol'),
+                'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
+            })
 
         # 6) Przytnij a_line_lin do oddz_pol
-        alg_params = {
+        graph.add(6, 'PrzytnijA_line_linDoOddz_pol', 'native:clip', {
             'INPUT': parameters['a_line_linshp'],
-            'OVERLAY': outputs['DodajAdr_lesDoOddz_pol']['OUTPUT'],
+            'OVERLAY': Ref('DodajAdr_lesDoOddz_pol'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['PrzytnijA_line_linDoOddz_pol'] = processing.run('native:clip', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+        })
 
-        feedback.setCurrentStep(7)
-        if feedback.isCanceled():
-            return {}
-
-        # 7) Dodaj id_oddz do a_kom_a
-        alg_params = {
-            'FIELD_LENGTH': 50,
-            'FIELD_NAME': 'id_oddz',
-            'FIELD_PRECISION': 0,
-            'FIELD_TYPE': 2,
-            'FORMULA': '"id_kom" || trim(substr("adr_les",1,17))',
-            'INPUT': outputs['DodajAdr_lesDoA_kom_a']['OUTPUT'],
+        # 7) Dodaj id_oddz do a_kom_a: "id_kom" || trim(substr("adr_les",1,17))
+        # (kroki 7, 9, 15 i 16 – reguły skompilowane raz, derived.py)
+        graph.add(7, 'DodajId_oddzDoA_kom_a', 'lmn:pola_pochodne', {
+            'REGULY': 'id_oddz = id_oddz(id_kom, adr_les)',
+            'INPUT': Ref('DodajAdr_lesDoA_kom_a'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['DodajId_oddzDoA_kom_a'] = processing.run('native:fieldcalculator', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(8)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 8) Dodaj adr_les do a_line_a
-        alg_params = {
-            'DISCARD_NONMATCHING': False,
-            'FIELD': 'nr_wew',
-            'FIELDS_TO_COPY': ['adr_les'],
-            'FIELD_2': 'nr_wew',
+        graph.add(8, 'DodajAdr_lesDoA_line_a', 'lmn:zlacz_adr_les', {
             'INPUT': parameters['a_line_adbf'],
-            'INPUT_2': outputs['ZmiePolaNaDziesitne']['OUTPUT'],
-            'METHOD': 1,
-            'PREFIX': None,
+            'BO': parameters['wydzielenia_nr_wew_formularz_z_bo'],
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['DodajAdr_lesDoA_line_a'] = processing.run('native:joinattributestable', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(9)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 9) Dodaj id_oddz do a_line_a
-        alg_params = {
-            'FIELD_LENGTH': 50,
-            'FIELD_NAME': 'id_oddz',
-            'FIELD_PRECISION': 0,
-            'FIELD_TYPE': 2,
-            'FORMULA': '"id_lin" || trim(substr("adr_les",1,17))',
-            'INPUT': outputs['DodajAdr_lesDoA_line_a']['OUTPUT'],
+        graph.add(9, 'DodajId_oddzDoA_line_a', 'lmn:pola_pochodne', {
+            'REGULY': 'id_oddz = id_oddz(id_lin, adr_les)',
+            'INPUT': Ref('DodajAdr_lesDoA_line_a'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['DodajId_oddzDoA_line_a'] = processing.run('native:fieldcalculator', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(10)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 10) Podziel a_kom_lin pomocą oddz_lin
-        alg_params = {
-            'INPUT': outputs['PrzytnijA_kom_linDoOddz_pol']['OUTPUT'],
-            'LINES': outputs['Oddz_polNaOddz_lin']['OUTPUT'],
+        graph.add(10, 'PodzielA_kom_linPomocOddz_lin', 'native:splitwithlines', {
+            'INPUT': Ref('PrzytnijA_kom_linDoOddz_pol'),
+            'LINES': Ref('Oddz_polNaOddz_lin'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['PodzielA_kom_linPomocOddz_lin'] = processing.run('native:splitwithlines', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(11)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 11) Podziel a_line_lin pomocą oddz_lin
-        alg_params = {
-            'INPUT': outputs['PrzytnijA_line_linDoOddz_pol']['OUTPUT'],
-            'LINES': outputs['Oddz_polNaOddz_lin']['OUTPUT'],
+        graph.add(11, 'PodzielA_line_linPomocOddz_lin', 'native:splitwithlines', {
+            'INPUT': Ref('PrzytnijA_line_linDoOddz_pol'),
+            'LINES': Ref('Oddz_polNaOddz_lin'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['PodzielA_line_linPomocOddz_lin'] = processing.run('native:splitwithlines', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(12)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 12) Zmień adr_les na adr_oddz
-        alg_params = {
-            'FIELDS_MAPPING': [{'alias': None, 'comment': None, 'expression': 'adr_les', 'length': 25, 'name': 'adr_oddz', 'precision': 0, 'sub_type': 0, 'type': 10, 'type_name': 'text'}],
-            'INPUT': outputs['DodajAdr_lesDoOddz_pol']['OUTPUT'],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['ZmieAdr_lesNaAdr_oddz'] = processing.run('native:refactorfields', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(13)
-        if feedback.isCanceled():
-            return {}
+        if not cached:
+            graph.add(12, 'ZmieAdr_lesNaAdr_oddz', 'native:refactorfields', {
+                'FIELDS_MAPPING': [{'alias': None, 'comment': None, 'expression': 'adr_les', 'length': 25, 'name': 'adr_oddz', 'precision': 0, 'sub_type': 0, 'type': 10, 'type_name': 'text'}],
+                'INPUT': Ref('DodajAdr_lesDoOddz_pol'),
+                'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
+            })
 
         # 13) Dodaj adr_oddz do a_line_lin
-        alg_params = {
+        graph.add(13, 'DodajAdr_oddzDoA_line_lin', 'native:joinattributesbylocation', {
             'DISCARD_NONMATCHING': False,
-            'INPUT': outputs['PodzielA_line_linPomocOddz_lin']['OUTPUT'],
-            'JOIN': outputs['ZmieAdr_lesNaAdr_oddz']['OUTPUT'],
+            'INPUT': Ref('PodzielA_line_linPomocOddz_lin'),
+            'JOIN': Ref('ZmieAdr_lesNaAdr_oddz'),
             'JOIN_FIELDS': ['adr_oddz'],
             'METHOD': 2,
             'PREDICATE': [0, 1, 5],
             'PREFIX': None,
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['DodajAdr_oddzDoA_line_lin'] = processing.run('native:joinattributesbylocation', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(14)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 14) Dodaj adr_oddz do a_kom_lin
-        alg_params = {
+        graph.add(14, 'DodajAdr_oddzDoA_kom_lin', 'native:joinattributesbylocation', {
             'DISCARD_NONMATCHING': False,
-            'INPUT': outputs['PodzielA_kom_linPomocOddz_lin']['OUTPUT'],
-            'JOIN': outputs['ZmieAdr_lesNaAdr_oddz']['OUTPUT'],
+            'INPUT': Ref('PodzielA_kom_linPomocOddz_lin'),
+            'JOIN': Ref('ZmieAdr_lesNaAdr_oddz'),
             'JOIN_FIELDS': ['adr_oddz'],
             'METHOD': 2,
             'PREDICATE': [0, 1, 5],
             'PREFIX': None,
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['DodajAdr_oddzDoA_kom_lin'] = processing.run('native:joinattributesbylocation', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(15)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 15) Oblicz id_oddz do a_kom_lin
-        alg_params = {
-            'FIELD_LENGTH': 50,
-            'FIELD_NAME': 'id_oddz',
-            'FIELD_PRECISION': 0,
-            'FIELD_TYPE': 2,
-            'FORMULA': '"id_kom" || trim(substr("adr_oddz",1,17))',
-            'INPUT': outputs['DodajAdr_oddzDoA_kom_lin']['OUTPUT'],
+        graph.add(15, 'ObliczId_oddzDoA_kom_lin', 'lmn:pola_pochodne', {
+            'REGULY': 'id_oddz = id_oddz(id_kom, adr_oddz)',
+            'INPUT': Ref('DodajAdr_oddzDoA_kom_lin'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['ObliczId_oddzDoA_kom_lin'] = processing.run('native:fieldcalculator', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(16)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 16) Oblicz id_oddz do a_line_lin
-        alg_params = {
-            'FIELD_LENGTH': 50,
-            'FIELD_NAME': 'id_oddz',
-            'FIELD_PRECISION': 0,
-            'FIELD_TYPE': 2,
-            'FORMULA': '"id_lin" || trim(substr("adr_oddz",1,17))',
-            'INPUT': outputs['DodajAdr_oddzDoA_line_lin']['OUTPUT'],
+        graph.add(16, 'ObliczId_oddzDoA_line_lin', 'lmn:pola_pochodne', {
+            'REGULY': 'id_oddz = id_oddz(id_lin, adr_oddz)',
+            'INPUT': Ref('DodajAdr_oddzDoA_line_lin'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['ObliczId_oddzDoA_line_lin'] = processing.run('native:fieldcalculator', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(17)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 17) Dodaj adr_les_line do a_line_lin
-        alg_params = {
+        graph.add(17, 'DodajAdr_les_lineDoA_line_lin', 'native:joinattributestable', {
             'DISCARD_NONMATCHING': False,
             'FIELD': 'id_oddz',
             'FIELDS_TO_COPY': ['adr_les'],
             'FIELD_2': 'id_oddz',
-            'INPUT': outputs['ObliczId_oddzDoA_line_lin']['OUTPUT'],
-            'INPUT_2': outputs['DodajId_oddzDoA_line_a']['OUTPUT'],
+            'INPUT': Ref('ObliczId_oddzDoA_line_lin'),
+            'INPUT_2': Ref('DodajId_oddzDoA_line_a'),
             'METHOD': 1,
             'PREFIX': None,
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['DodajAdr_les_lineDoA_line_lin'] = processing.run('native:joinattributestable', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(18)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 18) Dodaj adr_les_line do a_kom_lin
-        alg_params = {
+        graph.add(18, 'DodajAdr_les_lineDoA_kom_lin', 'native:joinattributestable', {
             'DISCARD_NONMATCHING': False,
             'FIELD': 'id_oddz',
             'FIELDS_TO_COPY': ['adr_les'],
             'FIELD_2': 'id_oddz',
-            'INPUT': outputs['ObliczId_oddzDoA_kom_lin']['OUTPUT'],
-            'INPUT_2': outputs['DodajId_oddzDoA_kom_a']['OUTPUT'],
+            'INPUT': Ref('ObliczId_oddzDoA_kom_lin'),
+            'INPUT_2': Ref('DodajId_oddzDoA_kom_a'),
             'METHOD': 1,
             'PREFIX': None,
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['DodajAdr_les_lineDoA_kom_lin'] = processing.run('native:joinattributestable', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(19)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 19) Złącz a_kom_lin i a_line_lin (wymuszamy CRS 2180)
-        alg_params = {
+        graph.add(19, 'ZczA_kom_linIA_line_lin', 'native:mergevectorlayers', {
             'CRS': QgsCoordinateReferenceSystem('EPSG:2180'),
-            'LAYERS': [outputs['DodajAdr_les_lineDoA_kom_lin']['OUTPUT'],
-                       outputs['DodajAdr_les_lineDoA_line_lin']['OUTPUT']],
+            'LAYERS': [Ref('DodajAdr_les_lineDoA_kom_lin'),
+                       Ref('DodajAdr_les_lineDoA_line_lin')],
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['ZczA_kom_linIA_line_lin'] = processing.run('native:mergevectorlayers', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+        })
 
-        feedback.setCurrentStep(20)
-        if feedback.isCanceled():
-            return {}
-
-        # 20) Usuń duplikaty geometrii
-        alg_params = {
-            'INPUT': outputs['ZczA_kom_linIA_line_lin']['OUTPUT'],
+        # 20) Usuń duplikaty geometrii (skrót postaci kanonicznej, algorithm_dedup.py)
+        graph.add(20, 'UsuDuplikatyGeometrii', 'lmn:usun_duplikaty_geometrii', {
+            'INPUT': Ref('ZczA_kom_linIA_line_lin'),
+            'SIATKA': self.parameterAsDouble(parameters, 'siatka_duplikatow', context),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['UsuDuplikatyGeometrii'] = processing.run('native:deleteduplicategeometries', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(21)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 21) Wyodrębnij obiekty z adr_les
-        alg_params = {
+        graph.add(21, 'WyodrbnijObiektyZAdr_les', 'native:extractbyexpression', {
             'EXPRESSION': '"adr_les" IS NOT NULL',
-            'INPUT': outputs['UsuDuplikatyGeometrii']['OUTPUT'],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['WyodrbnijObiektyZAdr_les'] = processing.run('native:extractbyexpression', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(22)
-        if feedback.isCanceled():
-            return {}
-
-        # 22) Zagreguj id_kom i id_lin -> 'id'
-        alg_params = {
-            'FIELD_LENGTH': 20,
-            'FIELD_NAME': 'id',
-            'FIELD_PRECISION': 0,
-            'FIELD_TYPE': 0,
-            'FORMULA': ' coalesce(  "id_kom", "id_lin" )',
-            'INPUT': outputs['WyodrbnijObiektyZAdr_les']['OUTPUT'],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['ZagregujId_komIId_lin'] = processing.run('native:fieldcalculator', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(23)
-        if feedback.isCanceled():
-            return {}
-
-        # 23) Oblicz długość segmentów (wstępnie)
-        alg_params = {
-            'FIELD_LENGTH': 10,
-            'FIELD_NAME': 'dlugosc',
-            'FIELD_PRECISION': 2,
-            'FIELD_TYPE': 0,
-            'FORMULA': '$length',
-            'INPUT': outputs['ZagregujId_komIId_lin']['OUTPUT'],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['ObliczDugo'] = processing.run('native:fieldcalculator', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(24)
-        if feedback.isCanceled():
-            return {}
-
-        # 24) Zaokrąglij atrybut 'dlugosc' do 2 miejsc (aktualizacja pola)
-        alg_params = {
-            'FIELD_LENGTH': 10,
-            'FIELD_NAME': 'dlugosc',
-            'FIELD_PRECISION': 2,
-            'FIELD_TYPE': 0,
-            'FORMULA': 'round("dlugosc", 2)',
-            'NEW_FIELD': False,
-            'INPUT': outputs['ObliczDugo']['OUTPUT'],
+            'INPUT': Ref('UsuDuplikatyGeometrii'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['ZaokraglijDlugosc'] = processing.run('native:fieldcalculator', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(25)
-        if feedback.isCanceled():
-            return {}
-
-        # 25) Wyodrębnij segmenty z długością > 0
-        alg_params = {
-            'FIELD': 'dlugosc',
-            'INPUT': outputs['ZaokraglijDlugosc']['OUTPUT'],
-            'OPERATOR': 2,  # greater than
-            'VALUE': '0',
+        })
+
+        # 22-25) id = coalesce("id_kom", "id_lin"), długość segmentów ($length),
+        # zaokrąglenie do 2 miejsc i wybór dlugosc > 0 w jednym przebiegu –
+        # długości liczone paczkami (derived.py, kernels.py)
+        graph.add(22, 'ZagregujId_komIId_lin', 'lmn:pola_pochodne', {
+            'REGULY': 'id = coalesce(id_kom, id_lin); dlugosc = dlugosc(2)',
+            'TYLKO_DODATNIE': 'dlugosc',
+            'INPUT': Ref('WyodrbnijObiektyZAdr_les'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['WyodrebnijDlugoscWieksza0'] = processing.run('native:extractbyattribute', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(26)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 26) Kolejność atrybutów
-        alg_params = {
+        graph.add(26, 'KolejnoAtrybutw', 'native:refactorfields', {
             'FIELDS_MAPPING': [
                 {'alias': None, 'comment': None, 'expression': '"id"', 'length': 20, 'name': 'id', 'precision': 0, 'sub_type': 0, 'type': 6, 'type_name': 'double precision'},
                 {'alias': None, 'comment': None, 'expression': '"adr_les"', 'length': 25, 'name': 'adr_les', 'precision': 0, 'sub_type': 0, 'type': 10, 'type_name': 'text'},
@@ -495,99 +547,146 @@ class Wydz_liniowe(QgsProcessingAlgorithm):
                 {'alias': None, 'comment': None, 'expression': '"nr_droga"', 'length': 6, 'name': 'nr_droga', 'precision': 0, 'sub_type': 0, 'type': 10, 'type_name': 'text'},
                 {'alias': None, 'comment': None, 'expression': '"nr_inw"', 'length': 12, 'name': 'nr_inw', 'precision': 0, 'sub_type': 0, 'type': 10, 'type_name': 'text'}
             ],
-            'INPUT': outputs['WyodrebnijDlugoscWieksza0']['OUTPUT'],
+            'INPUT': Ref('ZagregujId_komIId_lin'),
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['KolejnoAtrybutw'] = processing.run('native:refactorfields', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(27)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 27) Dodaj pow SILP do wydz_lin_seg  -> WYJŚCIE (tymczasowe lub ścieżka)
-        alg_params = {
+        graph.add(27, 'DodajPowSilpDoWydz_lin_seg', 'native:joinattributestable', {
             'DISCARD_NONMATCHING': False,
             'FIELD': 'adr_les',
             'FIELDS_TO_COPY': ['pow'],
             'FIELD_2': 'adr_les',
-            'INPUT': outputs['KolejnoAtrybutw']['OUTPUT'],
+            'INPUT': Ref('KolejnoAtrybutw'),
             'INPUT_2': parameters['wydzielenia_nr_wew_formularz_z_bo'],
             'METHOD': 1,
             'PREFIX': 'SILP_',
             'OUTPUT': parameters.get('Wydz_lin_seg', QgsProcessing.TEMPORARY_OUTPUT)
-        }
-        outputs['DodajPowSilpDoWydz_lin_seg'] = processing.run('native:joinattributestable', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-        results['Wydz_lin_seg'] = outputs['DodajPowSilpDoWydz_lin_seg']['OUTPUT']
-
-        feedback.setCurrentStep(28)
-        if feedback.isCanceled():
-            return {}
-
-        # 28) Agregacja wydz_lin_seg -> WYJŚCIE TYMCZASOWE
-        alg_params = {
-            'AGGREGATES': [
-                {'aggregate': 'first_value', 'delimiter': ',', 'input': '"adr_les"', 'length': 25, 'name': 'adr_les', 'precision': 0, 'sub_type': 0, 'type': 10, 'type_name': 'text'},
-                {'aggregate': 'first_value', 'delimiter': ',', 'input': '"kod_ob"', 'length': 10, 'name': 'kod_ob', 'precision': 0, 'sub_type': 0, 'type': 10, 'type_name': 'text'},
-                {'aggregate': 'sum', 'delimiter': ',', 'input': '"dlugosc"', 'length': 10, 'name': 'dlugosc', 'precision': 2, 'sub_type': 0, 'type': 6, 'type_name': 'double precision'},
-                {'aggregate': 'first_value', 'delimiter': ',', 'input': '"SILP_pow"', 'length': 10, 'name': 'SILP_pow', 'precision': 4, 'sub_type': 0, 'type': 6, 'type_name': 'double precision'}
-            ],
-            'GROUP_BY': '"adr_les"',
-            'INPUT': outputs['DodajPowSilpDoWydz_lin_seg']['OUTPUT'],
+        })
+
+        # 28) Agregacja wydz_lin_seg wg adr_les -> WYJŚCIE TYMCZASOWE
+        # (first_value adr_les/kod_ob/SILP_pow, suma dlugosc; grupy zapisywane
+        # po kolei, w pamięci najwyżej jedna – algorithm_aggregate.py)
+        graph.add(28, 'AgregacjaWydz_lin_seg', 'lmn:agreguj_wg_adr_les', {
+            'INPUT': Ref('DodajPowSilpDoWydz_lin_seg'),
+            'POSORTOWANE': False,
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['AgregacjaWydz_lin_seg'] = processing.run('native:aggregate', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(29)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 29) REPROJEKCJA PO AGREGACJI -> EPSG:2180 (PL-1992)
-        alg_params = {
-            'INPUT': outputs['AgregacjaWydz_lin_seg']['OUTPUT'],
+        graph.add(29, 'AgregacjaW2180', 'native:reprojectlayer', {
+            'INPUT': Ref('AgregacjaWydz_lin_seg'),
             'TARGET_CRS': QgsCoordinateReferenceSystem('EPSG:2180'),
             'OPERATION': '',
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['AgregacjaW2180'] = processing.run('native:reprojectlayer', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(30)
-        if feedback.isCanceled():
-            return {}
+        })
 
         # 30) KOŃCOWE PRZELICZENIE DŁUGOŚCI W METRACH (EPSG:2180) -> wynik docelowy
-        alg_params = {
-            'FIELD_LENGTH': 10,
+        graph.add(30, 'PrzeliczDlugoscPoAgreg', 'lmn:dlugosci_segmentow', {
             'FIELD_NAME': 'dlugosc',
-            'FIELD_PRECISION': 2,
-            'FIELD_TYPE': 0,
-            'FORMULA': '$length',
-            'INPUT': outputs['AgregacjaW2180']['OUTPUT'],
+            'ZAOKRAGLIJ': False,
+            'TYLKO_DODATNIE': False,
+            'INPUT': Ref('AgregacjaW2180'),
             'OUTPUT': parameters.get('Wydz_lin_agreg', QgsProcessing.TEMPORARY_OUTPUT)
-        }
-        outputs['PrzeliczDlugoscPoAgreg'] = processing.run('native:fieldcalculator', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-        results['Wydz_lin_agreg'] = outputs['PrzeliczDlugoscPoAgreg']['OUTPUT']
-
-        feedback.setCurrentStep(31)
-        if feedback.isCanceled():
-            return {}
-
-        # 31) Wczytaj do projektu: wydz_lin_seg (narzuć nazwę)
-        alg_params = {
-            'INPUT': results['Wydz_lin_seg'],
-            'NAME': 'wydz_lin_seg'
-        }
-        processing.run('native:loadlayer', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(32)
-        if feedback.isCanceled():
-            return {}
+        })
+
+        return graph
+
+    def _columnar_options(self, parameters, context) -> tuple:
+        """(rozmiar grupy wierszy, kompresja) dla wyników .parquet/.arrow."""
+        return (self.parameterAsInt(parameters, 'rozmiar_grupy_wierszy', context),
+                COMPRESSION_OPTIONS[self.parameterAsEnum(parameters, 'kompresja', context)])
+
+    def _store_prepared(self, cache, key, outputs, context, feedback):
+        """Zapis wyników kroków 3, 5 i 12 do pamięci podręcznej (kolejne uruchomienia je pominą)."""
+        tables = {}
+        for name, step in zip(CACHE_LAYERS, CACHE_STEPS):
+            output = outputs[step].get('OUTPUT')
+            layer = QgsProcessingUtils.mapLayerFromString(output, context) if output else None
+            if layer is None:
+                feedback.pushWarning(f'Pamięć podręczna oddziałów nie została zapisana – brak wyniku kroku {step}.')
+                return
+            tables[name] = (layer.fields(), layer.wkbType(), layer.crs(), layer.getFeatures())
+        cache.put(key, CACHE_KIND, tables)
+
+    def _process_streaming(self, parameters, context, model_feedback, profiler=None, cache=None):
+        """
+        Ten sam wynik co łańcuch 33 kroków, ale liczony silnikiem strumieniowym
+        (engine.py) – bez tymczasowych warstw pośrednich.
+        """
+        from .engine import StreamingEngine, TARGET_CRS, agreg_fields, seg_fields
+        from .writers import (
+            GPKG_LAYERS,
+            GpkgBulkWriter,
+            columnar_driver,
+            create_columnar_writer,
+            destination_path,
+            gpkg_layer_source,
+        )
 
-        # 32) Wczytaj do projektu: wydz_lin_agreg (narzuć nazwę)
-        alg_params = {
-            'INPUT': results['Wydz_lin_agreg'],
-            'NAME': 'wydz_lin_agreg'
-        }
-        processing.run('native:loadlayer', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+        # kroki silnika + 2 kroki wczytania do projektu
+        feedback = QgsProcessingMultiStepFeedback(StreamingEngine.STEPS + 2, model_feedback)
+        crs = QgsCoordinateReferenceSystem(TARGET_CRS)
+        layers = {name: self.parameterAsVectorLayer(parameters, name, context) for name in INPUT_LAYERS}
+        # linie czytane z filterRect grup oddziałów – z indeksem .qix tylko potrzebne rekordy
+        from .pushdown import SLMN_SHAPEFILES, ensure_indexes
+        ensure_indexes([layers[name] for name in SLMN_SHAPEFILES], feedback)
+
+        # wspólny GeoPackage – obie warstwy w jednej transakcji, indeksy na końcu
+        bulk_path = self.parameterAsFileOutput(parameters, 'wyniki_gpkg', context)
+        bulk = GpkgBulkWriter(bulk_path, crs) if bulk_path else None
+        if bulk is not None:
+            seg_id = gpkg_layer_source(bulk_path, GPKG_LAYERS['Wydz_lin_seg'])
+            seg_sink = bulk.add_layer(GPKG_LAYERS['Wydz_lin_seg'], seg_fields(), QgsWkbTypes.MultiLineString)
+        # .parquet/.arrow – silnik pisze paczkami wprost do pliku kolumnowego
+        elif columnar_driver(parameters.get('Wydz_lin_seg')):
+            seg_id = destination_path(parameters['Wydz_lin_seg'])
+            seg_sink = create_columnar_writer(seg_id, seg_fields(), QgsWkbTypes.MultiLineString, crs,
+                                              context.transformContext(), *self._columnar_options(parameters, context))
+        else:
+            seg_sink, seg_id = self.parameterAsSink(
+                parameters, 'Wydz_lin_seg', context, seg_fields(), QgsWkbTypes.MultiLineString, crs)
+        agreg_path = self.parameterAsOutputLayer(parameters, 'Wydz_lin_agreg', context)
+        if bulk is not None:
+            agreg_id = gpkg_layer_source(bulk_path, GPKG_LAYERS['Wydz_lin_agreg'])
+            agreg_sink = bulk.add_layer(GPKG_LAYERS['Wydz_lin_agreg'], agreg_fields(), QgsWkbTypes.MultiLineString)
+        elif columnar_driver(agreg_path):
+            agreg_id = agreg_path
+            agreg_sink = create_columnar_writer(agreg_path, agreg_fields(), QgsWkbTypes.MultiLineString, crs,
+                                                context.transformContext(), *self._columnar_options(parameters, context))
+        else:
+            agreg_sink, agreg_id = QgsProcessingUtils.createFeatureSink(
+                agreg_path, context, agreg_fields(), QgsWkbTypes.MultiLineString, crs)
+
+        workers = self.parameterAsInt(parameters, 'liczba_watkow', context)
+        grid = self.parameterAsDouble(parameters, 'siatka_duplikatow', context)
+        try:
+            StreamingEngine(context, feedback, workers, profiler, cache, grid).run(layers, seg_sink, agreg_sink)
+        except Exception:
+            if bulk is not None:
+                bulk.abort()
+            raise
+        # zamknięcie zapisu przed wczytaniem warstw
+        del seg_sink, agreg_sink
+        if bulk is not None:
+            if feedback.isCanceled():
+                bulk.abort()
+            else:
+                bulk.finish(feedback)
+        if feedback.isCanceled():
+            return {}
+
+        results = {'Wydz_lin_seg': seg_id, 'Wydz_lin_agreg': agreg_id}
+        if not self.parameterAsBoolean(parameters, 'wczytaj_wyniki', context):
+            return results
+
+        feedback.setCurrentStep(StreamingEngine.STEPS)
+        self._run_step(profiler, 'WczytajWydz_lin_seg', 'native:loadlayer',
+                       {'INPUT': results['Wydz_lin_seg'], 'NAME': 'wydz_lin_seg'}, context, feedback)
+
+        feedback.setCurrentStep(StreamingEngine.STEPS + 1)
+        self._run_step(profiler, 'WczytajWydz_lin_agreg', 'native:loadlayer',
+                       {'INPUT': results['Wydz_lin_agreg'], 'NAME': 'wydz_lin_agreg'}, context, feedback)
 
         return results
 
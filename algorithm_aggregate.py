@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Agreguj_wg_adr_les – pomocniczy algorytm łańcucha wydz_liniowe.
+
+Zastępuje krok 28 (native:aggregate wg "adr_les": first_value adr_les,
+kod_ob i SILP_pow, suma dlugosc, geometrie zebrane w multi). Grupy są
+zapisywane zaraz po zamknięciu (aggregate.py), więc w pamięci jest
+najwyżej jedna grupa.
+"""
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureSink,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingUtils,
+    QgsWkbTypes,
+)
+
+
+class Agreguj_wg_adr_les(QgsProcessingAlgorithm):
+
+    def name(self):
+        return 'agreguj_wg_adr_les'
+
+    def displayName(self):
+        return 'Agreguj wg adresu leśnego'
+
+    def group(self):
+        return 'LMN'
+
+    def groupId(self):
+        return 'LMN'
+
+    def flags(self):
+        # krok wewnętrzny łańcucha – niewidoczny w przyborniku
+        return super().flags() | QgsProcessingAlgorithm.FlagHideFromToolbox
+
+    def createInstance(self):
+        return Agreguj_wg_adr_les()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            'INPUT', 'wydz_lin_seg', types=[QgsProcessing.TypeVectorLine]
+        ))
+        self.addParameter(QgsProcessingParameterBoolean(
+            'POSORTOWANE', 'Wejście uporządkowane wg adr_les (bez sortowania na dysku)', defaultValue=False
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            'OUTPUT', 'Wynik', type=QgsProcessing.TypeVectorLine
+        ))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        from .aggregate import GroupSpill, aggregate_sorted
+        from .engine import agreg_fields
+        from .joins import as_float, as_text
+
+        source = self.parameterAsSource(parameters, 'INPUT', context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, 'INPUT'))
+        presorted = self.parameterAsBoolean(parameters, 'POSORTOWANE', context)
+
+        fields = agreg_fields()
+        sink, dest_id = self.parameterAsSink(
+            parameters, 'OUTPUT', context, fields, QgsWkbTypes.multiType(source.wkbType()), source.sourceCrs())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, 'OUTPUT'))
+
+        names = ('adr_les', 'kod_ob', 'SILP_pow', 'dlugosc')
+        idx = [source.fields().lookupField(name) for name in names]
+        missing = [name for name, i in zip(names, idx) if i < 0]
+        if missing:
+            raise QgsProcessingException('Brak pól w warstwie wejściowej: ' + ', '.join(missing))
+        i_adr, i_kod, i_pow, i_dl = idx
+
+        total = source.featureCount() or 1
+
+        def rows():
+            for n, f in enumerate(source.getFeatures()):
+                if feedback.isCanceled():
+                    return
+                attrs = f.attributes()
+                feedback.setProgress(50.0 * n / total)
+                # NULL (QVariant) -> None: sqlite3 nie przyjmuje QVariant, a NULL adr_les
+                # tworzy jedną grupę jak w native:aggregate
+                yield (as_text(attrs[i_adr]), as_text(attrs[i_kod]), as_float(attrs[i_pow]),
+                       as_float(attrs[i_dl]), f.geometry())
+
+        spill = None
+        if presorted:
+            ordered = rows()
+        else:
+            spill = GroupSpill(QgsProcessingUtils.tempFolder())
+            for row in rows():
+                spill.add(*row)
+            ordered = spill.rows()
+
+        try:
+            written = 0
+            for adr_les, kod_ob, silp_pow, dlugosc, geom in aggregate_sorted(ordered):
+                if feedback.isCanceled():
+                    break
+                out = QgsFeature(fields)
+                out.setGeometry(geom)
+                out.setAttributes([adr_les, kod_ob, dlugosc, silp_pow])
+                sink.addFeature(out, QgsFeatureSink.FastInsert)
+                written += 1
+                feedback.setProgress(50.0 + 50.0 * min(written, total) / total)
+        finally:
+            if spill is not None:
+                spill.close()
+
+        return {'OUTPUT': dest_id}
@@ -10,6 +10,8 @@ a wtyczka sama wyszukuje wymagane pliki i wywołuje bazowy model: lmn:wydz_linio
 import os
 from qgis.core import (
     QgsProcessing,
+    QgsProcessingUtils,
+    QgsVectorLayer,
     QgsProcessingAlgorithm,
     QgsProcessingException,
     QgsProcessingContext,
@@ -19,10 +21,15 @@ from qgis.core import (
     QgsProcessingParameterFeatureSink,
     QgsProcessingParameterVectorDestination,
     QgsProcessingParameterDefinition,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterFileDestination,
 )
 
-import processing
-from .utils import plugin_dir  # ścieżka do folderu wtyczki
+from .utils import opis_html
+from .algorithm import SILNIK_LANCUCH, SILNIK_OPCJE
+from .writers import COMPRESSION_OPTIONS, DEFAULT_ROW_GROUP_SIZE
 
 
 # Pliki wymagane w folderze SLMN – zgodnie z parametrami bazowego modelu
@@ -35,23 +42,6 @@ REQUIRED_FILES = {
 }
 
 
-def _opis_html() -> str:
-    """
-    Czyta plik Opis.txt z katalogu wtyczki i zwraca prosty HTML
-    do wyświetlenia po prawej stronie natywnego dialogu Processing.
-    Bez żadnego nagłówka nad treścią.
-    """
-    try:
-        path = os.path.join(plugin_dir(), 'Opis.txt')
-        with open(path, 'r', encoding='utf-8') as f:
-            txt = f.read().strip()
-        body = '<br>'.join(txt.splitlines())
-        return f'<div style="white-space:normal">{body}</div>'
-    except Exception:
-        return ('<div>Wtyczka „Wydzielenia liniowe”. '
-                'Umieść plik <code>Opis.txt</code> w folderze wtyczki, aby tutaj pojawiła się treść opisu.</div>')
-
-
 class Wydz_liniowe_auto(QgsProcessingAlgorithm):
 
     def name(self):
@@ -71,7 +61,7 @@ class Wydz_liniowe_auto(QgsProcessingAlgorithm):
 
     # ------ opis w prawym panelu natywnego dialogu ------
     def shortHelpString(self) -> str:
-        return _opis_html()
+        return opis_html()
     # -----------------------------------------------------
 
     # ---- Parametry dialogu Processing ----
@@ -105,8 +95,93 @@ class Wydz_liniowe_auto(QgsProcessingAlgorithm):
         # UWAGA: brak FlagOptional, żeby w GUI nie pojawiał się dopisek [opcjonalne]
         self.addParameter(p_seg)
 
+        # 4a) Tryb przyrostowy – przeliczenie tylko zmienionych oddziałów
+        self.addParameter(QgsProcessingParameterBoolean(
+            'przyrostowo', 'Przelicz tylko oddziały zmienione od poprzedniego uruchomienia (wyniki GeoPackage)',
+            defaultValue=False
+        ))
+
+        # 5) Tryb obliczeń – przekazywany do bazowego modelu (zaawansowane)
+        p_silnik = QgsProcessingParameterEnum(
+            'silnik', 'Tryb obliczeń',
+            options=SILNIK_OPCJE,
+            defaultValue=SILNIK_LANCUCH
+        )
+        p_silnik.setFlags(p_silnik.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_silnik)
+
+        # 6) Liczba wątków (zaawansowane)
+        p_watki = QgsProcessingParameterNumber(
+            'liczba_watkow', 'Liczba wątków (0 = wszystkie rdzenie)',
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0, defaultValue=1
+        )
+        p_watki.setFlags(p_watki.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_watki)
+
+        # 7) Pomiary kroków – przekazywane do bazowego modelu (zaawansowane)
+        p_profil = QgsProcessingParameterBoolean(
+            'profilowanie', 'Mierz czas, CPU, pamięć i liczbę obiektów w każdym kroku',
+            defaultValue=False
+        )
+        p_profil.setFlags(p_profil.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_profil)
+
+        p_raport = QgsProcessingParameterFileDestination(
+            'raport_profilu', 'Raport pomiarów kroków',
+            fileFilter='JSON (*.json);;CSV (*.csv)',
+            optional=True, createByDefault=False
+        )
+        p_raport.setFlags(p_raport.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_raport)
+
+        # 8) Pamięć podręczna przygotowanych oddziałów (zaawansowane)
+        p_cache = QgsProcessingParameterBoolean(
+            'pamiec_podreczna', 'Zapamiętuj przygotowane oddziały między uruchomieniami',
+            defaultValue=True
+        )
+        p_cache.setFlags(p_cache.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_cache)
+
+        # 9) Siatka przyciągania przy usuwaniu duplikatów geometrii (zaawansowane)
+        p_siatka = QgsProcessingParameterNumber(
+            'siatka_duplikatow', 'Siatka przyciągania przy wyszukiwaniu duplikatów geometrii [m] (0 = bez przyciągania)',
+            type=QgsProcessingParameterNumber.Double,
+            minValue=0.0, defaultValue=0.0
+        )
+        p_siatka.setFlags(p_siatka.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_siatka)
+
+        # 10) Budżet pamięci warstw pośrednich łańcucha (zaawansowane)
+        p_budzet = QgsProcessingParameterNumber(
+            'budzet_pamieci', 'Budżet pamięci dla warstw pośrednich [MB] (0 = bez limitu)',
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0, defaultValue=0
+        )
+        p_budzet.setFlags(p_budzet.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_budzet)
+
+        # 11) Wyniki .parquet / .arrow (zaawansowane)
+        p_grupa = QgsProcessingParameterNumber(
+            'rozmiar_grupy_wierszy', 'GeoParquet/Arrow: liczba obiektów w grupie wierszy',
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=1, defaultValue=DEFAULT_ROW_GROUP_SIZE
+        )
+        p_grupa.setFlags(p_grupa.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_grupa)
+
+        p_kompresja = QgsProcessingParameterEnum(
+            'kompresja', 'GeoParquet/Arrow: kompresja',
+            options=COMPRESSION_OPTIONS,
+            defaultValue=0
+        )
+        p_kompresja.setFlags(p_kompresja.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_kompresja)
+
     # ---- Logika ----
     def processAlgorithm(self, parameters, context: QgsProcessingContext, model_feedback):
+        from .preflight import scan_slmn_folder
+
         feedback = QgsProcessingMultiStepFeedback(1, model_feedback)
 
         folder = self.parameterAsString(parameters, 'slmn_folder', context).strip()
@@ -128,14 +203,39 @@ class Wydz_liniowe_auto(QgsProcessingAlgorithm):
                 'Brakujące pliki w folderze SLMN:\n  - ' + '\n  - '.join(missing)
             )
 
+        # Kontrola wstępna z nagłówków plików (schemat, geometria, .prj, liczby obiektów)
+        report = scan_slmn_folder(
+            folder, self.parameterAsVectorLayer(parameters, 'wydzielenia_nr_wew_formularz_z_bo', context))
+        for warning in report.warnings:
+            feedback.pushWarning(warning)
+        if not report.ok:
+            raise QgsProcessingException(report.text())
+        feedback.pushInfo(report.summary())
+
         # Złóż parametry dla algorytmu bazowego (z modelera)
         inner_params = {
             'wydzielenia_nr_wew_formularz_z_bo': parameters['wydzielenia_nr_wew_formularz_z_bo'],
             **resolved_paths,
             'Wydz_lin_agreg': parameters.get('Wydz_lin_agreg'),  # VectorDestination
             'Wydz_lin_seg': parameters.get('Wydz_lin_seg'),
+            'silnik': self.parameterAsEnum(parameters, 'silnik', context),
+            'liczba_watkow': self.parameterAsInt(parameters, 'liczba_watkow', context),
+            'profilowanie': self.parameterAsBoolean(parameters, 'profilowanie', context),
+            'raport_profilu': parameters.get('raport_profilu'),
+            'pamiec_podreczna': self.parameterAsBoolean(parameters, 'pamiec_podreczna', context),
+            'siatka_duplikatow': self.parameterAsDouble(parameters, 'siatka_duplikatow', context),
+            'budzet_pamieci': self.parameterAsInt(parameters, 'budzet_pamieci', context),
+            'rozmiar_grupy_wierszy': self.parameterAsInt(parameters, 'rozmiar_grupy_wierszy', context),
+            'kompresja': self.parameterAsEnum(parameters, 'kompresja', context),
         }
 
+        if self.parameterAsBoolean(parameters, 'przyrostowo', context):
+            return self._process_incremental(parameters, context, feedback, folder, resolved_paths, inner_params)
+        return self._run_base(inner_params, context, feedback)
+
+    def _run_base(self, inner_params, context, feedback):
+        import processing
+
         # Uruchom bazowy algorytm (zarejestrowany jako lmn:wydz_liniowe)
         results = processing.run(
             'lmn:wydz_liniowe',
@@ -147,5 +247,100 @@ class Wydz_liniowe_auto(QgsProcessingAlgorithm):
 
         return {
             'Wydz_lin_agreg': results.get('Wydz_lin_agreg'),
-            'Wydz_lin_seg': results.get('Wydz_lin_seg')
+            'Wydz_lin_seg': results.get('Wydz_lin_seg'),
+            'raport_profilu': results.get('raport_profilu'),
+            'PROFIL': results.get('PROFIL'),
+        }
+
+    def _process_incremental(self, parameters, context, feedback, folder, resolved_paths, inner_params):
+        """
+        Porównuje odciski oddziałów z manifestem poprzedniego uruchomienia
+        i przelicza tylko zmienione oddziały (incremental.py). Bez manifestu,
+        bez wyników albo przy dużej liczbie zmian – pełne obliczenie.
+        """
+        import processing
+        from .incremental import (
+            FULL_RUN_SHARE,
+            LINE_LAYERS,
+            CompartmentFingerprints,
+            load_manifest,
+            manifest_path,
+            replace_features,
+            result_settings,
+            save_manifest,
+            subset_layer,
+        )
+
+        seg_path = self.parameterAsOutputLayer(parameters, 'Wydz_lin_seg', context)
+        agreg_path = self.parameterAsOutputLayer(parameters, 'Wydz_lin_agreg', context)
+        if not all(p and p.split('|')[0].lower().endswith('.gpkg') for p in (seg_path, agreg_path)):
+            feedback.reportError('Tryb przyrostowy wymaga wyników w plikach GeoPackage (.gpkg) – pełne obliczenie.', False)
+            return self._run_base(inner_params, context, feedback)
+        # te same pliki dla pełnego przebiegu i podmiany obiektów
+        inner_params = dict(inner_params, Wydz_lin_seg=seg_path, Wydz_lin_agreg=agreg_path)
+
+        layers = {key: QgsVectorLayer(path, key, 'ogr') for key, path in resolved_paths.items()}
+        bo_layer = self.parameterAsVectorLayer(parameters, 'wydzielenia_nr_wew_formularz_z_bo', context)
+        prints = CompartmentFingerprints.build(
+            bo_layer, layers['a_oddz_polshp'], layers['a_kom_adbf'], layers['a_line_adbf'], layers, feedback)
+        if feedback.isCanceled():
+            return {}
+        current = prints.fingerprints()
+        manifest = manifest_path(agreg_path)
+        # wyniki policzone z innym trybem obliczeń / siatką duplikatów nie są podmieniane częściowo
+        settings = result_settings(inner_params)
+        previous = load_manifest(manifest, folder, settings)
+
+        changed = {a for a, h in current.items() if previous is None or previous.get(a) != h}
+        removed = set(previous or ()) - set(current)
+        outputs_exist = all(os.path.exists(p.split('|')[0]) for p in (seg_path, agreg_path))
+        if previous is None or not outputs_exist or len(changed) > FULL_RUN_SHARE * max(1, len(current)):
+            feedback.pushInfo('Tryb przyrostowy: brak manifestu, inne parametry obliczeń '
+                              'lub wiele zmian – pełne obliczenie.')
+            results = self._run_base(inner_params, context, feedback)
+            if results.get('Wydz_lin_agreg') and not feedback.isCanceled():
+                save_manifest(manifest, folder, current, settings)
+            return results
+
+        results = {}
+        if not changed and not removed:
+            feedback.pushInfo('Tryb przyrostowy: dane wejściowe bez zmian – wyniki są aktualne.')
+        else:
+            # sąsiedzi liczeni razem ze zmienionymi – odcinki na wspólnych granicach jak w pełnym przebiegu
+            scope = prints.with_neighbours(changed)
+            feedback.pushInfo(f'Tryb przyrostowy: zmienione oddziały {len(changed)}, usunięte {len(removed)}, '
+                              f'przeliczane (z sąsiadami) {len(scope)}.')
+            sources = {'Wydz_lin_seg': None, 'Wydz_lin_agreg': None}
+            oddz_fids = prints.oddz_fids(scope)
+            if oddz_fids:
+                subset = {'a_oddz_polshp': subset_layer(layers['a_oddz_polshp'], oddz_fids)}
+                for key, _ in LINE_LAYERS:
+                    subset[key] = subset_layer(layers[key], prints.line_fids(key, scope))
+                results = processing.run('lmn:wydz_liniowe', dict(
+                    inner_params, **subset,
+                    Wydz_lin_seg=QgsProcessing.TEMPORARY_OUTPUT,
+                    Wydz_lin_agreg=QgsProcessing.TEMPORARY_OUTPUT,
+                    raport_profilu=None, pamiec_podreczna=False, wczytaj_wyniki=False,
+                ), context=context, feedback=feedback, is_child_algorithm=True)
+                if feedback.isCanceled():
+                    return {}
+                sources = {key: QgsProcessingUtils.mapLayerFromString(results[key], context) for key in sources}
+
+            for key, path in (('Wydz_lin_seg', seg_path), ('Wydz_lin_agreg', agreg_path)):
+                try:
+                    deleted, added = replace_features(path, sources[key], changed, removed)
+                except OSError as e:
+                    raise QgsProcessingException(str(e))
+                feedback.pushInfo(f'{os.path.basename(path.split("|")[0])}: usunięto {deleted}, dodano {added} obiektów.')
+            save_manifest(manifest, folder, current, settings)
+
+        # wczytanie do projektu jak w bazowym modelu
+        for path, name in ((seg_path, 'wydz_lin_seg'), (agreg_path, 'wydz_lin_agreg')):
+            processing.run('native:loadlayer', {'INPUT': path, 'NAME': name},
+                           context=context, feedback=feedback, is_child_algorithm=True)
+
+        return {
+            'Wydz_lin_agreg': agreg_path,
+            'Wydz_lin_seg': seg_path,
+            'PROFIL': results.get('PROFIL'),
         }
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Wydz_liniowe_batch – tryb wsadowy dla wielu nadleśnictw.
+Użytkownik wskazuje:
+  - folder nadrzędny z folderami SLMN (jeden podfolder = jedna jednostka)
+    i/lub listę folderów SLMN,
+  - raporty BO (folder z raportami nazwanymi jak folder jednostki
+    albo raport w folderze jednostki),
+a wtyczka uruchamia bazowy model lmn:wydz_liniowe dla każdej jednostki
+w ograniczonej puli wątków. Błąd jednej jednostki nie przerywa całej partii.
+"""
+
+import csv
+import fnmatch
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.core import (
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsProcessingAlgorithm,
+    QgsProcessingContext,
+    QgsProcessingException,
+    QgsProcessingFeedback,
+    QgsProcessingOutputNumber,
+    QgsProcessingOutputString,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterDefinition,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterFile,
+    QgsProcessingParameterFolderDestination,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterString,
+)
+
+from .algorithm import SILNIK_LANCUCH, SILNIK_OPCJE
+from .algorithm_auto import REQUIRED_FILES
+
+# rozszerzenia, pod którymi szukamy raportu BO w folderze raportów
+BO_EXTENSIONS = ('.xlsx', '.xls', '.ods', '.csv', '.dbf', '.gpkg')
+
+
+def _find_bo_report(unit_folder: str, reports_folder: str, pattern: str):
+    """
+    Raport BO jednostki:
+    1) <folder raportów>/<nazwa folderu jednostki>.<rozszerzenie>,
+    2) plik pasujący do wzorca w folderze jednostki.
+    """
+    unit = os.path.basename(os.path.normpath(unit_folder))
+    if reports_folder:
+        for ext in BO_EXTENSIONS:
+            candidate = os.path.join(reports_folder, unit + ext)
+            if os.path.exists(candidate):
+                return candidate
+    if pattern:
+        for name in sorted(os.listdir(unit_folder)):
+            if fnmatch.fnmatch(name.lower(), pattern.lower()):
+                return os.path.join(unit_folder, name)
+    return None
+
+
+class Wydz_liniowe_batch(QgsProcessingAlgorithm):
+
+    def name(self):
+        return 'wydz_liniowe_batch'
+
+    def displayName(self):
+        return 'Wydzielenia liniowe (wsadowo)'
+
+    def group(self):
+        return 'LMN'
+
+    def groupId(self):
+        return 'LMN'
+
+    def createInstance(self):
+        return Wydz_liniowe_batch()
+
+    def shortHelpString(self) -> str:
+        return ('<p>Generuje wydzielenia liniowe dla wielu jednostek (nadleśnictw) naraz.</p>'
+                '<p>Każdy podfolder folderu nadrzędnego (lub każdy folder z listy) to jeden folder SLMN. '
+                'Raport BO jednostki jest szukany w folderze raportów pod nazwą folderu jednostki '
+                '(np. <i>Torun.xlsx</i>), a w drugiej kolejności w folderze jednostki według wzorca.</p>'
+                '<p>Wyniki trafiają do <i>&lt;folder wynikowy&gt;/&lt;jednostka&gt;/wydz_lin_seg.gpkg</i> '
+                'i <i>wydz_lin_agreg.gpkg</i>; opcjonalnie powstaje też wynik scalony. '
+                'Czasy i błędy jednostek są zapisywane w <i>raport_wsadowy.csv</i>, '
+                'a przy włączonych pomiarach kroków – w <i>profil_wsadowy.csv</i>.</p>')
+
+    # ---- Parametry dialogu Processing ----
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFile(
+            'folder_nadrzedny',
+            'Folder nadrzędny z folderami SLMN',
+            behavior=QgsProcessingParameterFile.Folder,
+            optional=True
+        ))
+
+        self.addParameter(QgsProcessingParameterString(
+            'lista_folderow',
+            'Lista folderów SLMN (jeden w wierszu)',
+            multiLine=True,
+            optional=True
+        ))
+
+        self.addParameter(QgsProcessingParameterFile(
+            'raporty_bo',
+            'Folder z raportami BO (nazwa pliku = nazwa folderu jednostki)',
+            behavior=QgsProcessingParameterFile.Folder,
+            optional=True
+        ))
+
+        self.addParameter(QgsProcessingParameterString(
+            'wzorzec_bo',
+            'Wzorzec nazwy raportu BO w folderze jednostki',
+            defaultValue='raport_bo*',
+            optional=True
+        ))
+
+        self.addParameter(QgsProcessingParameterFolderDestination(
+            'folder_wynikowy', 'Folder wynikowy'
+        ))
+
+        self.addParameter(QgsProcessingParameterBoolean(
+            'scal_wyniki', 'Utwórz dodatkowo scalone wydz_lin_seg i wydz_lin_agreg',
+            defaultValue=False
+        ))
+
+        self.addParameter(QgsProcessingParameterNumber(
+            'rownolegle_jednostki', 'Liczba jednostek liczonych równolegle',
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=1, defaultValue=2
+        ))
+
+        p_silnik = QgsProcessingParameterEnum(
+            'silnik', 'Tryb obliczeń',
+            options=SILNIK_OPCJE,
+            defaultValue=SILNIK_LANCUCH
+        )
+        p_silnik.setFlags(p_silnik.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_silnik)
+
+        p_watki = QgsProcessingParameterNumber(
+            'liczba_watkow', 'Liczba wątków na jednostkę (0 = wszystkie rdzenie)',
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0, defaultValue=1
+        )
+        p_watki.setFlags(p_watki.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_watki)
+
+        p_profil = QgsProcessingParameterBoolean(
+            'profilowanie', 'Mierz kroki każdej jednostki (profil_wsadowy.csv)',
+            defaultValue=False
+        )
+        p_profil.setFlags(p_profil.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_profil)
+
+        self.addOutput(QgsProcessingOutputString('RAPORT', 'Raport wsadowy'))
+        self.addOutput(QgsProcessingOutputNumber('BLEDY', 'Liczba jednostek z błędem'))
+
+    # ---- Logika ----
+    def _unit_folders(self, parameters, context) -> list:
+        folders = []
+        parent = self.parameterAsString(parameters, 'folder_nadrzedny', context).strip()
+        if parent:
+            if not os.path.isdir(parent):
+                raise QgsProcessingException(f'Folder nadrzędny nie istnieje: {parent}')
+            for name in sorted(os.listdir(parent)):
+                path = os.path.join(parent, name)
+                # podfolder jest jednostką, jeśli zawiera choć jeden plik SLMN
+                if os.path.isdir(path) and any(
+                        os.path.exists(os.path.join(path, f)) for f in REQUIRED_FILES.values()):
+                    folders.append(path)
+        listed = self.parameterAsString(parameters, 'lista_folderow', context)
+        for line in (listed or '').splitlines():
+            path = line.strip().strip('"')
+            if path and path not in folders:
+                folders.append(path)
+        return folders
+
+    def _run_unit(self, unit: dict, engine: int, workers: int, profile: bool, context, feedback) -> dict:
+        """Zadanie wątku: jedna jednostka, własny kontekst Processing."""
+        started = time.perf_counter()
+        report = {'jednostka': unit['name'], 'status': 'OK', 'czas_s': 0.0, 'blad': ''}
+        try:
+            if unit['error']:
+                raise QgsProcessingException(unit['error'])
+            os.makedirs(unit['out'], exist_ok=True)
+            params = {
+                'wydzielenia_nr_wew_formularz_z_bo': unit['bo'],
+                **{key: os.path.join(unit['folder'], fname) for key, fname in REQUIRED_FILES.items()},
+                'Wydz_lin_seg': os.path.join(unit['out'], 'wydz_lin_seg.gpkg'),
+                'Wydz_lin_agreg': os.path.join(unit['out'], 'wydz_lin_agreg.gpkg'),
+                'silnik': engine,
+                'liczba_watkow': workers,
+                'wczytaj_wyniki': False,
+                'profilowanie': profile,
+            }
+            # kontekst tworzony w wątku roboczym – warstwy pośrednie należą do tego wątku
+            unit_context = QgsProcessingContext()
+            unit_context.copyThreadSafeSettings(context)
+            alg = QgsApplication.processingRegistry().createAlgorithmById('lmn:wydz_liniowe')
+            results, ok = alg.run(params, unit_context, feedback)
+            if not ok:
+                raise QgsProcessingException('Algorytm zakończony niepowodzeniem lub został przerwany.')
+            report['Wydz_lin_seg'] = params['Wydz_lin_seg']
+            report['Wydz_lin_agreg'] = params['Wydz_lin_agreg']
+            report['profil'] = results.get('PROFIL') or []
+        except Exception as e:
+            report['status'] = 'BŁĄD'
+            report['blad'] = str(e).replace('\n', ' ')
+        report['czas_s'] = round(time.perf_counter() - started, 2)
+        return report
+
+    def processAlgorithm(self, parameters, context: QgsProcessingContext, feedback):
+        import processing
+        from .profiling import write_profile_csv
+
+        folders = self._unit_folders(parameters, context)
+        if not folders:
+            raise QgsProcessingException('Wskaż folder nadrzędny albo listę folderów SLMN.')
+
+        reports_folder = self.parameterAsString(parameters, 'raporty_bo', context).strip()
+        pattern = self.parameterAsString(parameters, 'wzorzec_bo', context).strip()
+        out_folder = self.parameterAsString(parameters, 'folder_wynikowy', context)
+        os.makedirs(out_folder, exist_ok=True)
+
+        units = []
+        for folder in folders:
+            name = os.path.basename(os.path.normpath(folder))
+            unit = {'name': name, 'folder': folder, 'out': os.path.join(out_folder, name), 'bo': None, 'error': ''}
+            if not os.path.isdir(folder):
+                unit['error'] = f'Folder nie istnieje: {folder}'
+            else:
+                missing = [f for f in REQUIRED_FILES.values() if not os.path.exists(os.path.join(folder, f))]
+                unit['bo'] = _find_bo_report(folder, reports_folder, pattern)
+                if missing:
+                    unit['error'] = 'Brakujące pliki: ' + ', '.join(missing)
+                elif not unit['bo']:
+                    unit['error'] = 'Nie znaleziono raportu BO.'
+            units.append(unit)
+
+        engine = self.parameterAsEnum(parameters, 'silnik', context)
+        workers = self.parameterAsInt(parameters, 'liczba_watkow', context)
+        pool_size = self.parameterAsInt(parameters, 'rownolegle_jednostki', context)
+        profile = self.parameterAsBoolean(parameters, 'profilowanie', context)
+        feedback.pushInfo(f'Jednostek: {len(units)}, równolegle: {pool_size}.')
+
+        # osobny feedback na jednostkę – anulowanie partii przekazujemy do każdej z nich
+        unit_feedbacks = [QgsProcessingFeedback() for _ in units]
+        reports = []
+        with ThreadPoolExecutor(max_workers=pool_size) as pool:
+            futures = [pool.submit(self._run_unit, unit, engine, workers, profile, context, fb)
+                       for unit, fb in zip(units, unit_feedbacks)]
+            for n, future in enumerate(futures):
+                while not future.done():
+                    if feedback.isCanceled():
+                        for fb in unit_feedbacks:
+                            fb.cancel()
+                        for pending in futures:
+                            pending.cancel()
+                    time.sleep(0.1)
+                if future.cancelled():
+                    report = {'jednostka': units[n]['name'], 'status': 'PRZERWANO', 'czas_s': 0.0, 'blad': ''}
+                else:
+                    report = future.result()
+                reports.append(report)
+                if report['status'] == 'OK':
+                    feedback.pushInfo(f'{report["jednostka"]}: OK ({report["czas_s"]} s)')
+                else:
+                    feedback.reportError(f'{report["jednostka"]}: {report["status"]} {report["blad"]}', False)
+                feedback.setProgress(100.0 * (n + 1) / len(futures))
+
+        # wynik scalony (opcjonalnie) – tylko z jednostek zakończonych powodzeniem
+        done = [r for r in reports if r['status'] == 'OK']
+        if done and self.parameterAsBoolean(parameters, 'scal_wyniki', context) and not feedback.isCanceled():
+            for key, fname in (('Wydz_lin_seg', 'wydz_lin_seg.gpkg'), ('Wydz_lin_agreg', 'wydz_lin_agreg.gpkg')):
+                processing.run('native:mergevectorlayers', {
+                    'LAYERS': [r[key] for r in done],
+                    'CRS': QgsCoordinateReferenceSystem('EPSG:2180'),
+                    'OUTPUT': os.path.join(out_folder, fname),
+                }, context=context, feedback=feedback, is_child_algorithm=True)
+
+        columns = ['jednostka', 'status', 'czas_s', 'blad']
+        with open(os.path.join(out_folder, 'raport_wsadowy.csv'), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, delimiter=';', extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(reports)
+
+        # pomiary kroków wszystkich jednostek w jednym pliku, z kolumną jednostki
+        if profile:
+            records = [dict(rec, jednostka=r['jednostka']) for r in done for rec in r.get('profil', [])]
+            write_profile_csv(os.path.join(out_folder, 'profil_wsadowy.csv'), records, extra_columns=('jednostka',))
+
+        errors = sum(1 for r in reports if r['status'] != 'OK')
+        summary = '\n'.join(f'{r["jednostka"]};{r["status"]};{r["czas_s"]};{r["blad"]}' for r in reports)
+        return {
+            'folder_wynikowy': out_folder,
+            'RAPORT': summary,
+            'BLEDY': errors,
+        }
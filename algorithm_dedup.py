@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Usun_duplikaty_geometrii – pomocniczy algorytm łańcucha wydz_liniowe.
+
+Zastępuje krok 20 (native:deleteduplicategeometries) jednym przebiegiem
+ze skrótem postaci kanonicznej geometrii (dedup.py).
+"""
+
+from qgis.core import (
+    QgsFeatureSink,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingOutputNumber,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterString,
+)
+
+
+class Usun_duplikaty_geometrii(QgsProcessingAlgorithm):
+
+    def name(self):
+        return 'usun_duplikaty_geometrii'
+
+    def displayName(self):
+        return 'Usuń duplikaty geometrii (skrót)'
+
+    def group(self):
+        return 'LMN'
+
+    def groupId(self):
+        return 'LMN'
+
+    def flags(self):
+        # krok wewnętrzny łańcucha – niewidoczny w przyborniku
+        return super().flags() | QgsProcessingAlgorithm.FlagHideFromToolbox
+
+    def createInstance(self):
+        return Usun_duplikaty_geometrii()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            'INPUT', 'Warstwa wejściowa', types=[QgsProcessing.TypeVectorAnyGeometry]
+        ))
+        self.addParameter(QgsProcessingParameterNumber(
+            'SIATKA', 'Siatka przyciągania przy porównaniu [jednostki CRS] (0 = bez przyciągania)',
+            type=QgsProcessingParameterNumber.Double, minValue=0.0, defaultValue=0.0
+        ))
+        self.addParameter(QgsProcessingParameterString(
+            'POLA', 'Zachowaj tylko pola (po przecinku; puste – wszystkie)', optional=True
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            'OUTPUT', 'Wynik', type=QgsProcessing.TypeVectorAnyGeometry
+        ))
+        # te same wyniki liczbowe co native:deleteduplicategeometries
+        self.addOutput(QgsProcessingOutputNumber('RETAINED_COUNT', 'Liczba zachowanych obiektów'))
+        self.addOutput(QgsProcessingOutputNumber('DUPLICATE_COUNT', 'Liczba usuniętych duplikatów'))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        from .dedup import GeometryDeduplicator
+        from .planner import keep_fields
+
+        source = self.parameterAsSource(parameters, 'INPUT', context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, 'INPUT'))
+        grid = self.parameterAsDouble(parameters, 'SIATKA', context)
+        keep = self.parameterAsString(parameters, 'POLA', context).strip()
+        fields, kept = keep_fields(source.fields(), keep) if keep else (source.fields(), None)
+
+        sink, dest_id = self.parameterAsSink(
+            parameters, 'OUTPUT', context, fields, source.wkbType(), source.sourceCrs())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, 'OUTPUT'))
+
+        dedup = GeometryDeduplicator(grid)
+        total = source.featureCount() or 1
+        retained = 0
+        for n, f in enumerate(source.getFeatures()):
+            if feedback.isCanceled():
+                break
+            if dedup.accept(f.geometry()):
+                if kept is not None:
+                    attrs = f.attributes()
+                    f.setFields(fields, False)
+                    f.setAttributes([attrs[i] for i in kept])
+                sink.addFeature(f, QgsFeatureSink.FastInsert)
+                retained += 1
+            feedback.setProgress(100.0 * n / total)
+
+        return {'OUTPUT': dest_id, 'RETAINED_COUNT': retained, 'DUPLICATE_COUNT': dedup.duplicates}
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Pola_pochodne – pomocniczy algorytm łańcucha wydz_liniowe.
+
+Zastępuje native:fieldcalculator w krokach 7, 9, 15 i 16 (id_oddz) oraz
+łączy krok 22 (id = coalesce(id_kom, id_lin)) z krokiem 23 (długość,
+zaokrąglenie, wybór dlugosc > 0) w jeden przebieg. Reguły kompilowane są
+raz (derived.py) i liczone kolumnami na paczkach obiektów.
+"""
+
+from qgis.core import (
+    QgsFeatureSink,
+    QgsFields,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterString,
+)
+
+# liczba obiektów liczonych jedną operacją (pamięć vs narzut wywołań)
+CHUNK = 50000
+
+
+class Pola_pochodne(QgsProcessingAlgorithm):
+
+    def name(self):
+        return 'pola_pochodne'
+
+    def displayName(self):
+        return 'Pola wyliczane (jeden przebieg)'
+
+    def group(self):
+        return 'LMN'
+
+    def groupId(self):
+        return 'LMN'
+
+    def flags(self):
+        # krok wewnętrzny łańcucha – niewidoczny w przyborniku
+        return super().flags() | QgsProcessingAlgorithm.FlagHideFromToolbox
+
+    def createInstance(self):
+        return Pola_pochodne()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            'INPUT', 'Warstwa wejściowa', types=[QgsProcessing.TypeVector]
+        ))
+        self.addParameter(QgsProcessingParameterString(
+            'REGULY', 'Reguły (pole = funkcja(argumenty); …)'
+        ))
+        self.addParameter(QgsProcessingParameterString(
+            'TYLKO_DODATNIE', 'Tylko obiekty z wartością pola > 0 (nazwa pola)', optional=True
+        ))
+        self.addParameter(QgsProcessingParameterString(
+            'POLA', 'Zachowaj tylko pola (po przecinku; puste – wszystkie)', optional=True
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            'OUTPUT', 'Wynik', type=QgsProcessing.TypeVector
+        ))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        from .derived import compile_rules, evaluate
+        from .planner import keep_fields
+
+        source = self.parameterAsSource(parameters, 'INPUT', context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, 'INPUT'))
+        try:
+            rules = compile_rules(self.parameterAsString(parameters, 'REGULY', context))
+        except ValueError as e:
+            raise QgsProcessingException(str(e))
+        positive = self.parameterAsString(parameters, 'TYLKO_DODATNIE', context).strip()
+
+        # istniejące pola są zastępowane w miejscu (jak w native:fieldcalculator);
+        # QgsFields nie ma insert() – lista pól budowana od nowa
+        replaced = {source.fields().lookupField(rule.name): rule.field for rule in rules}
+        fields = QgsFields()
+        for i, field in enumerate(source.fields()):
+            fields.append(replaced.get(i, field))
+        indexes = []
+        for rule in rules:
+            index = fields.lookupField(rule.name)
+            if index < 0:
+                fields.append(rule.field)
+                index = fields.count() - 1
+            indexes.append(index)
+        check = fields.lookupField(positive) if positive else -1
+        if positive and check < 0:
+            raise QgsProcessingException(f'Brak pola {positive} w wyniku')
+
+        # kolumny, z których nie korzysta dalsza część łańcucha (planner.py), odpadają w tym przebiegu
+        keep = self.parameterAsString(parameters, 'POLA', context).strip()
+        out_fields, kept = keep_fields(fields, keep) if keep else (fields, None)
+
+        sink, dest_id = self.parameterAsSink(
+            parameters, 'OUTPUT', context, out_fields, source.wkbType(), source.sourceCrs())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, 'OUTPUT'))
+
+        source_fields = source.fields()
+        width = fields.count()
+        total = source.featureCount() or 1
+        done = 0
+        chunk = []
+
+        def flush():
+            columns = evaluate(rules, chunk, source_fields)
+            for n, f in enumerate(chunk):
+                attrs = f.attributes()
+                attrs.extend([None] * (width - len(attrs)))
+                for index, values in zip(indexes, columns):
+                    attrs[index] = values[n]
+                if check >= 0 and not (isinstance(attrs[check], (int, float)) and attrs[check] > 0):
+                    continue
+                if kept is not None:
+                    attrs = [attrs[i] for i in kept]
+                f.setFields(out_fields, False)
+                f.setAttributes(attrs)
+                sink.addFeature(f, QgsFeatureSink.FastInsert)
+            chunk.clear()
+
+        for f in source.getFeatures():
+            if feedback.isCanceled():
+                break
+            chunk.append(f)
+            done += 1
+            if len(chunk) >= CHUNK:
+                flush()
+                feedback.setProgress(100.0 * done / total)
+        if chunk and not feedback.isCanceled():
+            flush()
+
+        return {'OUTPUT': dest_id}
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Zlacz_adr_les – pomocniczy algorytm łańcucha wydz_liniowe.
+
+Zastępuje kroki 0, 1, 3 i 8 (rzutowanie pól raportu BO i trzy razy
+native:joinattributestable po nr_wew). Słownik nr_wew -> adr_les budowany
+jest z raportu BO przez joins.attribute_rows – plik DBF czytany jest
+bezpośrednio (dbf.py), bez obiektów QgsFeature. Tak samo czytane są
+tabele a_kom_a.dbf i a_line_a.dbf, i to tylko kolumny z parametru POLA.
+Semantyka jak METHOD 1 (jeden do jednego, wygrywa pierwszy pasujący
+rekord, NULL nie łączy się z niczym).
+"""
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterString,
+    QgsProcessingParameterVectorLayer,
+    QgsProcessingUtils,
+    QgsWkbTypes,
+)
+
+# typy pól, które czytnik DBF zwraca bez konwersji (daty, pola logiczne – przez OGR)
+DBF_PLAIN_TYPES = (QVariant.String, QVariant.Int, QVariant.LongLong, QVariant.Double)
+
+
+class Zlacz_adr_les(QgsProcessingAlgorithm):
+
+    def name(self):
+        return 'zlacz_adr_les'
+
+    def displayName(self):
+        return 'Dodaj adr_les z raportu BO (wg nr_wew)'
+
+    def group(self):
+        return 'LMN'
+
+    def groupId(self):
+        return 'LMN'
+
+    def flags(self):
+        # krok wewnętrzny łańcucha – niewidoczny w przyborniku
+        return super().flags() | QgsProcessingAlgorithm.FlagHideFromToolbox
+
+    def createInstance(self):
+        return Zlacz_adr_les()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            'INPUT', 'Warstwa lub tabela z polem nr_wew', types=[QgsProcessing.TypeVector]
+        ))
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            'BO', 'Raport BO (nr_wew, adr_les)', types=[QgsProcessing.TypeVector]
+        ))
+        self.addParameter(QgsProcessingParameterString(
+            'POLA', 'Zachowaj tylko pola (po przecinku; puste – wszystkie)', optional=True
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            'OUTPUT', 'Wynik', type=QgsProcessing.TypeVector
+        ))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        from .joins import as_text, attribute_rows, join_key
+        from .planner import keep_fields
+
+        layer = self.parameterAsVectorLayer(parameters, 'INPUT', context)
+        if layer is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, 'INPUT'))
+        bo = self.parameterAsVectorLayer(parameters, 'BO', context)
+        if bo is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, 'BO'))
+
+        source_fields = layer.fields()
+        i_nr = source_fields.lookupField('nr_wew')
+        if i_nr < 0:
+            raise QgsProcessingException(f'{layer.name()}: brak pola nr_wew')
+
+        # krok 0: adr_les jako tekst, nr_wew jako klucz całkowity (joins.join_key)
+        addresses = {}
+        for nr_value, adr_value in attribute_rows(bo, ('nr_wew', 'adr_les')):
+            key = join_key(nr_value)
+            if key is not None and key not in addresses:
+                addresses[key] = as_text(adr_value)
+
+        # kolizja nazw rozwiązywana jak w native:joinattributestable (adr_les_2)
+        joined = QgsFields()
+        joined.append(QgsField('adr_les', QVariant.String, 'text', 25, 0))
+        fields = QgsProcessingUtils.combineFields(source_fields, joined)
+        i_adr = source_fields.count()
+
+        # kolumny, z których nie korzysta dalsza część łańcucha (planner.py), nie są nawet czytane
+        keep = self.parameterAsString(parameters, 'POLA', context).strip()
+        out_fields, kept = keep_fields(fields, keep) if keep else (fields, None)
+        columns = [i for i in (kept if kept is not None else range(fields.count())) if i != i_adr]
+        with_adr = kept is None or i_adr in kept
+
+        sink, dest_id = self.parameterAsSink(
+            parameters, 'OUTPUT', context, out_fields, layer.wkbType(), layer.crs())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, 'OUTPUT'))
+
+        total = layer.featureCount() or 1
+        n = 0
+        if layer.wkbType() == QgsWkbTypes.NoGeometry and \
+                all(source_fields[i].type() in DBF_PLAIN_TYPES for i in columns):
+            # tabela bez geometrii (a_kom_a, a_line_a): wiersze jako krotki, jeden obiekt wyniku
+            names = [source_fields[i].name() for i in columns] + [source_fields[i_nr].name()]
+            out = QgsFeature(out_fields)
+            for n, values in enumerate(attribute_rows(layer, names), 1):
+                if feedback.isCanceled():
+                    break
+                attrs = list(values[:-1])
+                if with_adr:
+                    attrs.append(addresses.get(join_key(values[-1])))
+                out.setAttributes(attrs)
+                sink.addFeature(out, QgsFeatureSink.FastInsert)
+                if n % 10000 == 0:
+                    feedback.setProgress(100.0 * n / total)
+        else:
+            request = QgsFeatureRequest().setSubsetOfAttributes(sorted(set(columns) | {i_nr}))
+            for n, f in enumerate(layer.getFeatures(request), 1):
+                if feedback.isCanceled():
+                    break
+                attrs = f.attributes()
+                values = [attrs[i] for i in columns]
+                if with_adr:
+                    values.append(addresses.get(join_key(attrs[i_nr])))
+                f.setFields(out_fields, False)
+                f.setAttributes(values)
+                sink.addFeature(f, QgsFeatureSink.FastInsert)
+                if n % 10000 == 0:
+                    feedback.setProgress(100.0 * n / total)
+
+        if feedback.isCanceled():
+            return {}
+        return {'OUTPUT': dest_id}
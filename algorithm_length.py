@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Dlugosci_segmentow – pomocniczy algorytm łańcucha wydz_liniowe.
+
+Liczy końcowe $length po reprojekcji (krok 30); może też zaokrąglić
+wynik i wybrać obiekty z długością > 0. Długości liczone są paczkami
+obiektów przez kernels.py, a nie wyrażeniem obliczanym osobno dla
+każdego obiektu (kroki 22-25 liczy Pola_pochodne, algorithm_derived.py).
+"""
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterString,
+)
+
+
+# liczba obiektów liczonych jedną operacją (pamięć vs narzut wywołań)
+CHUNK = 50000
+
+
+class Dlugosci_segmentow(QgsProcessingAlgorithm):
+
+    def name(self):
+        return 'dlugosci_segmentow'
+
+    def displayName(self):
+        return 'Długości segmentów'
+
+    def group(self):
+        return 'LMN'
+
+    def groupId(self):
+        return 'LMN'
+
+    def flags(self):
+        # krok wewnętrzny łańcucha – niewidoczny w przyborniku
+        return super().flags() | QgsProcessingAlgorithm.FlagHideFromToolbox
+
+    def createInstance(self):
+        return Dlugosci_segmentow()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            'INPUT', 'Warstwa liniowa', types=[QgsProcessing.TypeVectorLine]
+        ))
+        self.addParameter(QgsProcessingParameterString(
+            'FIELD_NAME', 'Pole długości', defaultValue='dlugosc'
+        ))
+        self.addParameter(QgsProcessingParameterBoolean(
+            'ZAOKRAGLIJ', 'Zaokrąglij do 2 miejsc (jak round("dlugosc", 2))', defaultValue=False
+        ))
+        self.addParameter(QgsProcessingParameterBoolean(
+            'TYLKO_DODATNIE', 'Tylko obiekty z długością > 0', defaultValue=False
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            'OUTPUT', 'Wynik', type=QgsProcessing.TypeVectorLine
+        ))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # numpy (kernels.py) wczytywany dopiero przy pierwszym uruchomieniu
+        from .kernels import planar_lengths, round_half_away_all
+
+        source = self.parameterAsSource(parameters, 'INPUT', context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, 'INPUT'))
+        name = self.parameterAsString(parameters, 'FIELD_NAME', context) or 'dlugosc'
+        rounded = self.parameterAsBoolean(parameters, 'ZAOKRAGLIJ', context)
+        positive = self.parameterAsBoolean(parameters, 'TYLKO_DODATNIE', context)
+
+        # istniejące pole jest zastępowane w miejscu (jak w native:fieldcalculator);
+        # QgsFields nie ma insert() – lista pól budowana od nowa
+        length_field = QgsField(name, QVariant.Double, 'double precision', 10, 2)
+        index = source.fields().lookupField(name)
+        fields = QgsFields()
+        for i, field in enumerate(source.fields()):
+            fields.append(length_field if i == index else field)
+        if index < 0:
+            fields.append(length_field)
+            index = fields.count() - 1
+
+        sink, dest_id = self.parameterAsSink(
+            parameters, 'OUTPUT', context, fields, source.wkbType(), source.sourceCrs())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, 'OUTPUT'))
+
+        total = source.featureCount() or 1
+        done = 0
+        chunk = []
+
+        def flush():
+            lengths = planar_lengths([f.geometry() for f in chunk])
+            if rounded:
+                lengths = round_half_away_all(lengths, 2)
+            for f, length in zip(chunk, lengths):
+                if positive and not length > 0:
+                    continue
+                attrs = f.attributes()
+                if index < len(attrs):
+                    attrs[index] = length
+                else:
+                    attrs.append(length)
+                f.setFields(fields, False)
+                f.setAttributes(attrs)
+                sink.addFeature(f, QgsFeatureSink.FastInsert)
+            chunk.clear()
+
+        for f in source.getFeatures():
+            if feedback.isCanceled():
+                break
+            chunk.append(f)
+            done += 1
+            if len(chunk) >= CHUNK:
+                flush()
+                feedback.setProgress(100.0 * done / total)
+        if chunk and not feedback.isCanceled():
+            flush()
+
+        return {'OUTPUT': dest_id}
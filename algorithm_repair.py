@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Napraw_niepoprawne_geometrie – pomocniczy algorytm łańcucha wydz_liniowe.
+
+Zastępuje krok 2 (native:fixgeometries, METHOD 1): poprawność sprawdzana
+jest równolegle paczkami, naprawiane są tylko niepoprawne poligony,
+a ich zbiór zapamiętywany pod skrótem plików a_oddz_pol (validity.py).
+"""
+
+from qgis.core import (
+    QgsFeatureSink,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingOutputNumber,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterVectorLayer,
+    QgsWkbTypes,
+)
+
+
+class Napraw_niepoprawne_geometrie(QgsProcessingAlgorithm):
+
+    def name(self):
+        return 'napraw_niepoprawne_geometrie'
+
+    def displayName(self):
+        return 'Napraw geometrie (tylko niepoprawne)'
+
+    def group(self):
+        return 'LMN'
+
+    def groupId(self):
+        return 'LMN'
+
+    def flags(self):
+        # krok wewnętrzny łańcucha – niewidoczny w przyborniku
+        return super().flags() | QgsProcessingAlgorithm.FlagHideFromToolbox
+
+    def createInstance(self):
+        return Napraw_niepoprawne_geometrie()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            'INPUT', 'Warstwa poligonowa (a_oddz_pol)', types=[QgsProcessing.TypeVectorPolygon]
+        ))
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            'BO', 'Raport BO (adr_les w raporcie napraw)', types=[QgsProcessing.TypeVector], optional=True
+        ))
+        self.addParameter(QgsProcessingParameterBoolean(
+            'PAMIEC_PODRECZNA', 'Zapamiętaj naprawione geometrie między uruchomieniami', defaultValue=True
+        ))
+        self.addParameter(QgsProcessingParameterNumber(
+            'LICZBA_WATKOW', 'Liczba wątków sprawdzania (0 = wszystkie rdzenie)',
+            type=QgsProcessingParameterNumber.Integer, minValue=0, defaultValue=0
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            'OUTPUT', 'Wynik', type=QgsProcessing.TypeVectorPolygon
+        ))
+        self.addOutput(QgsProcessingOutputNumber('REPAIRED_COUNT', 'Liczba naprawionych obiektów'))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        from .cache import PreparedCache, layers_key
+        from .joins import as_text, attribute_rows, join_key
+        from .validity import load_repairs, prepared_geometries, repair_report, store_repairs
+
+        source = self.parameterAsSource(parameters, 'INPUT', context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, 'INPUT'))
+        workers = self.parameterAsInt(parameters, 'LICZBA_WATKOW', context)
+
+        # klucz z plików a_oddz_pol – fid obiektów są stałe dla tej samej zawartości
+        cache = PreparedCache() if self.parameterAsBoolean(parameters, 'PAMIEC_PODRECZNA', context) else None
+        key = layers_key(self.parameterAsVectorLayer(parameters, 'INPUT', context)) if cache is not None else None
+        cached = load_repairs(cache, key)
+
+        bo = self.parameterAsVectorLayer(parameters, 'BO', context)
+        addresses = {}
+        for nr_value, adr_value in (attribute_rows(bo, ('nr_wew', 'adr_les')) if bo is not None else ()):
+            addresses.setdefault(join_key(nr_value), as_text(adr_value))
+
+        fields = source.fields()
+        sink, dest_id = self.parameterAsSink(
+            parameters, 'OUTPUT', context, fields, QgsWkbTypes.multiType(source.wkbType()), source.sourceCrs())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, 'OUTPUT'))
+
+        i_nr = fields.lookupField('nr_wew')
+        total = source.featureCount() or 1
+        repairs = {}
+        fixed = []
+        n = 0
+        for n, (f, geom, repaired) in enumerate(prepared_geometries(source.getFeatures(), cached, workers), 1):
+            if feedback.isCanceled():
+                break
+            if repaired:
+                repairs[f.id()] = geom
+                nr_wew = f.attributes()[i_nr] if i_nr >= 0 else None
+                fixed.append((nr_wew, addresses.get(join_key(nr_wew))))
+                # naprawa dała pustą geometrię – obiekt pomijany (jak w native:fixgeometries)
+                if geom.isNull() or geom.isEmpty():
+                    continue
+            elif not geom.isNull():
+                geom.convertToMultiType()
+            f.setGeometry(geom)
+            sink.addFeature(f, QgsFeatureSink.FastInsert)
+            feedback.setProgress(100.0 * n / total)
+
+        if feedback.isCanceled():
+            return {}
+        if cached is None:
+            store_repairs(cache, key, repairs, source.sourceCrs())
+        feedback.pushInfo(repair_report(fixed, n, cached is not None))
+        return {'OUTPUT': dest_id, 'REPAIRED_COUNT': len(fixed)}
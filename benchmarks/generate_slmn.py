@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Generator syntetycznego folderu SLMN do testów wydajności.
+
+Tworzy w podanym folderze komplet plików wejściowych algorytmu
+wydz_liniowe: a_oddz_pol.shp, a_kom_lin.shp, a_line_lin.shp, a_kom_a.dbf,
+a_line_a.dbf oraz formularz z BO (raport_bo.gpkg). Oddziały to siatka
+kwadratów o wspólnych granicach w EPSG:2180, a linie to losowe łamane,
+które często przechodzą do sąsiednich oddziałów. Część linii biegnie po
+granicach oddziałów, a część powtarza się w obu warstwach liniowych, żeby
+obciążyć także usuwanie duplikatów. Ten sam 'seed' daje te same dane.
+
+Użycie (z katalogu wtyczki):
+  python benchmarks/generate_slmn.py FOLDER --oddzialy 400 --linie 3 --wierzcholki 12
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransformContext,
+    QgsFeature,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsPointXY,
+    QgsRectangle,
+    QgsVectorFileWriter,
+    QgsWkbTypes,
+)
+
+CRS = 'EPSG:2180'
+# lewy dolny narożnik siatki oddziałów (okolice Torunia w PUWG 1992)
+ORIGIN = (470000.0, 560000.0)
+
+KOD_OB_KOM = ('DROGA_L', 'DROGA_P', 'SZLAK_Z')
+KOD_OB_LINE = ('LINIA_O', 'LINIA_E', 'ROW')
+
+
+def _fields(*specs) -> QgsFields:
+    fields = QgsFields()
+    for name, vtype, length, precision in specs:
+        fields.append(QgsField(name, vtype, len=length, prec=precision))
+    return fields
+
+
+def _line_fields(id_field) -> QgsFields:
+    return _fields(
+        (id_field, QVariant.Int, 10, 0),
+        ('kod_ob', QVariant.String, 10, 0),
+        ('szer', QVariant.Double, 3, 1),
+        ('nazwa', QVariant.String, 50, 0),
+        ('nr_ppoz', QVariant.String, 6, 0),
+        ('nr_droga', QVariant.String, 6, 0),
+        ('nr_inw', QVariant.String, 12, 0),
+    )
+
+
+def _writer(path, fields, wkb_type, driver='ESRI Shapefile', layer_name=None):
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = driver
+    options.fileEncoding = 'UTF-8'
+    if layer_name:
+        options.layerName = layer_name
+    crs = QgsCoordinateReferenceSystem(CRS) if wkb_type != QgsWkbTypes.NoGeometry else QgsCoordinateReferenceSystem()
+    writer = QgsVectorFileWriter.create(path, fields, wkb_type, crs, QgsCoordinateTransformContext(), options)
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise RuntimeError(f'{path}: {writer.errorMessage()}')
+    return writer
+
+
+def _feature(fields, attributes, geometry=None) -> QgsFeature:
+    f = QgsFeature(fields)
+    if geometry is not None:
+        f.setGeometry(geometry)
+    f.setAttributes(attributes)
+    return f
+
+
+def _wydz_letters(n: int) -> str:
+    """0 -> 'a', 25 -> 'z', 26 -> 'aa' … (oznaczenia kolejnych wydzieleń liniowych)."""
+    letters = ''
+    n += 1
+    while n:
+        n, rest = divmod(n - 1, 26)
+        letters = chr(ord('a') + rest) + letters
+    return letters
+
+
+def _random_line(rng, cell_rect, cell_size, vertices) -> QgsGeometry:
+    """Łamana startująca w oddziale, o długości do ~0,9 boku oddziału."""
+    x = cell_rect.xMinimum() + rng.uniform(0.1, 0.9) * cell_size
+    y = cell_rect.yMinimum() + rng.uniform(0.1, 0.9) * cell_size
+    heading = rng.uniform(0.0, 2.0 * math.pi)
+    step = cell_size * rng.uniform(0.3, 0.9) / max(1, vertices - 1)
+    points = [QgsPointXY(x, y)]
+    for _ in range(max(1, vertices - 1)):
+        heading += rng.uniform(-0.4, 0.4)
+        x += step * math.cos(heading)
+        y += step * math.sin(heading)
+        points.append(QgsPointXY(x, y))
+    return QgsGeometry.fromPolylineXY(points)
+
+
+def _boundary_line(rng, cell_rect, cell_size, vertices) -> QgsGeometry:
+    """Odcinek biegnący po zachodniej granicy oddziału (granica wspólna z sąsiadem)."""
+    x = cell_rect.xMinimum()
+    y0 = cell_rect.yMinimum() + rng.uniform(0.0, 0.2) * cell_size
+    y1 = y0 + rng.uniform(0.5, 0.8) * cell_size
+    count = max(2, vertices)
+    return QgsGeometry.fromPolylineXY(
+        [QgsPointXY(x, y0 + (y1 - y0) * i / (count - 1)) for i in range(count)])
+
+
+def generate(folder: str, compartments: int = 100, lines_per_compartment: int = 3, vertices: int = 8,
+             cell_size: float = 500.0, boundary_share: float = 0.1, duplicate_share: float = 0.02,
+             seed: int = 1) -> dict:
+    """
+    Zapisuje syntetyczny folder SLMN i zwraca liczby utworzonych obiektów.
+    Wymaga zainicjowanego QgsApplication (benchmarks/headless.py).
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    cols = max(1, math.ceil(math.sqrt(compartments)))
+
+    oddz_fields = _fields(('nr_wew', QVariant.Int, 10, 0))
+    bo_fields = _fields(
+        ('nr_wew', QVariant.Int, 10, 0),
+        ('adr_les', QVariant.String, 25, 0),
+        ('pow', QVariant.Double, 10, 4),
+    )
+    link_fields = {
+        'id_kom': _fields(('nr_wew', QVariant.Int, 10, 0), ('id_kom', QVariant.Int, 10, 0)),
+        'id_lin': _fields(('nr_wew', QVariant.Int, 10, 0), ('id_lin', QVariant.Int, 10, 0)),
+    }
+    line_fields = {'id_kom': _line_fields('id_kom'), 'id_lin': _line_fields('id_lin')}
+
+    writers = {
+        'oddz': _writer(os.path.join(folder, 'a_oddz_pol.shp'), oddz_fields, QgsWkbTypes.Polygon),
+        'id_kom': _writer(os.path.join(folder, 'a_kom_lin.shp'), line_fields['id_kom'], QgsWkbTypes.LineString),
+        'id_lin': _writer(os.path.join(folder, 'a_line_lin.shp'), line_fields['id_lin'], QgsWkbTypes.LineString),
+        'a_id_kom': _writer(os.path.join(folder, 'a_kom_a.dbf'), link_fields['id_kom'], QgsWkbTypes.NoGeometry),
+        'a_id_lin': _writer(os.path.join(folder, 'a_line_a.dbf'), link_fields['id_lin'], QgsWkbTypes.NoGeometry),
+        'bo': _writer(os.path.join(folder, 'raport_bo.gpkg'), bo_fields, QgsWkbTypes.NoGeometry,
+                      driver='GPKG', layer_name='wydzielenia_nr_wew'),
+    }
+    counts = dict.fromkeys(('a_oddz_pol', 'a_kom_lin', 'a_line_lin', 'a_kom_a', 'a_line_a', 'raport_bo'), 0)
+
+    # --- oddziały: siatka kwadratów, każdy z wierszem oddziału w formularzu BO ---
+    cells = []   # (nr_wew, prefiks adresu [17 znaków], prostokąt, geometria)
+    nr_wew = 0
+    for n in range(compartments):
+        row, col = divmod(n, cols)
+        rect = QgsRectangle(ORIGIN[0] + col * cell_size, ORIGIN[1] + row * cell_size,
+                            ORIGIN[0] + (col + 1) * cell_size, ORIGIN[1] + (row + 1) * cell_size)
+        geom = QgsGeometry.fromRect(rect)
+        nr_wew += 1
+        # adres oddziału: RR-NN-O-LL-ODDZ.. (17 znaków), dalej wydzielenie i -00
+        prefix = f'01-01-1-{n // 1000 + 1:02d}-{n + 1:<6}'
+        cells.append((nr_wew, prefix, rect, geom))
+        writers['oddz'].addFeature(_feature(oddz_fields, [nr_wew], geom))
+        writers['bo'].addFeature(_feature(bo_fields, [nr_wew, f'{prefix}-{"a":<4}-00', round(rng.uniform(5, 30), 4)]))
+        counts['a_oddz_pol'] += 1
+        counts['raport_bo'] += 1
+
+    def touched(geom) -> list:
+        """Oddziały, przez które przechodzi linia (po zasięgu siatki, potem geometrii)."""
+        box = geom.boundingBox()
+        c0 = max(0, int((box.xMinimum() - ORIGIN[0]) // cell_size))
+        c1 = min(cols - 1, int((box.xMaximum() - ORIGIN[0]) // cell_size))
+        r0 = max(0, int((box.yMinimum() - ORIGIN[1]) // cell_size))
+        r1 = int((box.yMaximum() - ORIGIN[1]) // cell_size)
+        found = []
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                n = r * cols + c
+                if 0 <= n < len(cells) and geom.intersects(cells[n][3]):
+                    found.append(cells[n])
+        return found
+
+    # --- obiekty liniowe: a_*_lin + wiersze a_*_a i wydzielenia liniowe w BO ---
+    next_id = {'id_kom': 0, 'id_lin': 0}
+    linear_count = {}   # liczba wydzieleń liniowych w oddziale
+
+    def add_line(id_field, geom, values, wydz_for_cell=None):
+        nonlocal nr_wew
+        next_id[id_field] += 1
+        line_id = next_id[id_field]
+        layer, table = ('a_kom_lin', 'a_kom_a') if id_field == 'id_kom' else ('a_line_lin', 'a_line_a')
+        writers[id_field].addFeature(_feature(line_fields[id_field], [line_id] + values, geom))
+        counts[layer] += 1
+        wydz = {}
+        for cell_nr, prefix, _, _ in touched(geom):
+            if wydz_for_cell is not None and cell_nr in wydz_for_cell:
+                wydz_nr = wydz_for_cell[cell_nr]
+            else:
+                k = linear_count.get(cell_nr, 0)
+                linear_count[cell_nr] = k + 1
+                nr_wew += 1
+                wydz_nr = nr_wew
+                adr_les = f'{prefix}-{"~" + _wydz_letters(k):<4}-00'
+                writers['bo'].addFeature(_feature(bo_fields, [wydz_nr, adr_les, round(rng.uniform(0.05, 2.0), 4)]))
+                counts['raport_bo'] += 1
+            wydz[cell_nr] = wydz_nr
+            writers['a_' + id_field].addFeature(_feature(link_fields[id_field], [wydz_nr, line_id]))
+            counts[table] += 1
+        return wydz
+
+    for n, (_, _, rect, _) in enumerate(cells):
+        for k in range(lines_per_compartment):
+            id_field = 'id_kom' if (n + k) % 2 == 0 else 'id_lin'
+            if rng.random() < boundary_share:
+                geom = _boundary_line(rng, rect, cell_size, vertices)
+            else:
+                geom = _random_line(rng, rect, cell_size, vertices)
+            line_no = next_id[id_field] + 1
+            values = [
+                rng.choice(KOD_OB_KOM if id_field == 'id_kom' else KOD_OB_LINE),
+                rng.choice((2.0, 3.5, 4.0, 6.0)),
+                f'Obiekt {line_no}',
+                str(line_no % 1000000),
+                f'{line_no % 1000000:06d}',
+                f'INW{line_no:09d}'[:12],
+            ]
+            wydz = add_line(id_field, geom, values)
+            # ta sama geometria w drugiej warstwie – do usunięcia w kroku 20
+            if id_field == 'id_kom' and rng.random() < duplicate_share:
+                add_line('id_lin', QgsGeometry(geom), values, wydz)
+
+    # zwolnienie zapisujących domyka pliki
+    writers.clear()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Syntetyczny folder SLMN do testów wydajności wydz_liniowe.')
+    parser.add_argument('folder', help='folder docelowy (powstanie, jeśli nie istnieje)')
+    parser.add_argument('--oddzialy', type=int, default=100, help='liczba oddziałów')
+    parser.add_argument('--linie', type=int, default=3, help='liczba linii na oddział')
+    parser.add_argument('--wierzcholki', type=int, default=8, help='liczba wierzchołków linii')
+    parser.add_argument('--rozmiar', type=float, default=500.0, help='bok oddziału [m]')
+    parser.add_argument('--granice', type=float, default=0.1, help='udział linii po granicach oddziałów')
+    parser.add_argument('--duplikaty', type=float, default=0.02, help='udział linii powtórzonych w a_line_lin')
+    parser.add_argument('--ziarno', type=int, default=1, help='ziarno generatora losowego')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from headless import start_qgis, stop_qgis
+    start_qgis()
+    try:
+        counts = generate(args.folder, args.oddzialy, args.linie, args.wierzcholki, args.rozmiar,
+                          args.granice, args.duplikaty, args.ziarno)
+    finally:
+        stop_qgis()
+    for name, count in counts.items():
+        print(f'{name}: {count}')
+
+
+if __name__ == '__main__':
+    main()
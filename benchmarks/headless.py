@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Uruchomienie QGIS bez interfejsu na potrzeby generatora danych i testów
+wydajności. Ścieżki instalacji QGIS można podać zmiennymi środowiskowymi:
+  QGIS_PREFIX_PATH   – prefiks instalacji (np. /usr, C:/OSGeo4W/apps/qgis),
+  QGIS_PLUGINS_PATH  – katalog z wtyczką Processing (python/plugins).
+"""
+
+import importlib
+import os
+import sys
+
+from qgis.core import QgsApplication
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_app = None
+
+
+def start_qgis() -> QgsApplication:
+    """Inicjalizuje QgsApplication (raz na proces) i zwraca instancję."""
+    global _app
+    if _app is None:
+        QgsApplication.setPrefixPath(os.environ.get('QGIS_PREFIX_PATH', '/usr'), True)
+        _app = QgsApplication([], False)
+        _app.initQgis()
+    return _app
+
+
+def start_processing():
+    """Processing + provider 'lmn' tej wtyczki (algorytmy lmn:wydz_liniowe*)."""
+    start_qgis()
+    plugins_path = os.environ.get(
+        'QGIS_PLUGINS_PATH', os.path.join(QgsApplication.prefixPath(), 'share', 'qgis', 'python', 'plugins'))
+    if plugins_path not in sys.path:
+        sys.path.append(plugins_path)
+    from processing.core.Processing import Processing
+    Processing.initialize()
+
+    registry = QgsApplication.processingRegistry()
+    if registry.providerById('lmn') is None:
+        # wtyczka importowana jako pakiet o nazwie swojego katalogu (importy względne)
+        parent, package = os.path.split(PLUGIN_DIR)
+        if parent not in sys.path:
+            sys.path.insert(0, parent)
+        provider = importlib.import_module(package + '.provider')
+        registry.addProvider(provider.WydzLinioweProvider())
+    return registry
+
+
+def stop_qgis():
+    global _app
+    if _app is not None:
+        _app.exitQgis()
+        _app = None
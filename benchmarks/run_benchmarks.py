@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Testy wydajności wydz_liniowe bez interfejsu QGIS (standalone QgsApplication).
+
+Dla każdego scenariusza (algorytm lmn:wydz_liniowe albo lmn:wydz_liniowe_auto,
+tryb obliczeń, liczba wątków) mierzony jest czas całego uruchomienia oraz
+czasy kroków z raportu pomiarów (wynik 'PROFIL'). Wynik to plik JSON, który
+można podać jako wzorzec przy kolejnym uruchomieniu – scenariusz wolniejszy
+od wzorca o więcej niż tolerancja kończy skrypt kodem 1.
+
+Użycie (z katalogu wtyczki):
+  python benchmarks/run_benchmarks.py --skala srednia --wynik wyniki.json
+  python benchmarks/run_benchmarks.py --skala srednia --wzorzec wyniki.json --tolerancja 0.2
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from headless import start_processing, stop_qgis  # noqa: E402
+from generate_slmn import generate  # noqa: E402
+
+# (oddziały, linie na oddział, wierzchołki linii)
+SKALE = {
+    'mala': (100, 3, 8),
+    'srednia': (1000, 4, 12),
+    'duza': (10000, 5, 16),
+}
+
+SILNIKI = {'lancuch': 0, 'strumieniowy': 1}
+
+SLMN_FILES = {
+    'a_kom_adbf': 'a_kom_a.dbf',
+    'a_line_adbf': 'a_line_a.dbf',
+    'a_kom_linshp': 'a_kom_lin.shp',
+    'a_line_linshp': 'a_line_lin.shp',
+    'a_oddz_polshp': 'a_oddz_pol.shp',
+}
+
+
+def _bo_layer(folder: str) -> str:
+    return os.path.join(folder, 'raport_bo.gpkg') + '|layername=wydzielenia_nr_wew'
+
+
+def _scenarios(engines, threads) -> list:
+    """
+    (nazwa, algorytm, silnik, wątki) dla każdej liczby wątków – silnik
+    strumieniowy dzieli oddziały na grupy, a łańcuch przy więcej niż 1 wątku
+    wykonuje niezależne kroki grafu równolegle (warstwy pośrednie w plikach).
+    """
+    scenarios = []
+    for engine in engines:
+        for workers in threads:
+            suffix = f'{engine}_w{workers}'
+            scenarios.append((f'wydz_liniowe_{suffix}', 'lmn:wydz_liniowe', SILNIKI[engine], workers))
+            scenarios.append((f'wydz_liniowe_auto_{suffix}', 'lmn:wydz_liniowe_auto', SILNIKI[engine], workers))
+    return scenarios
+
+
+def _parameters(algorithm, data, out, engine, workers) -> dict:
+    params = {
+        'wydzielenia_nr_wew_formularz_z_bo': _bo_layer(data),
+        'Wydz_lin_seg': os.path.join(out, 'wydz_lin_seg.gpkg'),
+        'Wydz_lin_agreg': os.path.join(out, 'wydz_lin_agreg.gpkg'),
+        'silnik': engine,
+        'liczba_watkow': workers,
+        'profilowanie': True,
+    }
+    if algorithm == 'lmn:wydz_liniowe_auto':
+        params['slmn_folder'] = data
+    else:
+        params.update({key: os.path.join(data, fname) for key, fname in SLMN_FILES.items()})
+        params['wczytaj_wyniki'] = False
+    return params
+
+
+def run_scenario(algorithm, data, engine, workers, repeats) -> dict:
+    import processing
+    from qgis.core import QgsProcessingContext, QgsProcessingFeedback, QgsProject
+
+    times, steps = [], {}
+    for _ in range(repeats):
+        with tempfile.TemporaryDirectory(prefix='wydz_lin_bench_') as out:
+            context = QgsProcessingContext()
+            context.setProject(QgsProject.instance())
+            started = time.perf_counter()
+            results = processing.run(algorithm, _parameters(algorithm, data, out, engine, workers),
+                                     context=context, feedback=QgsProcessingFeedback())
+            times.append(time.perf_counter() - started)
+            for record in results.get('PROFIL') or []:
+                steps.setdefault(record['krok'], []).append(record['czas_s'])
+            # warstwy wczytane przez wrapper zwalniają pliki przed usunięciem katalogu
+            QgsProject.instance().removeAllMapLayers()
+    return {
+        'czas_s': round(statistics.median(times), 3),
+        'czasy_s': [round(t, 3) for t in times],
+        'kroki': {name: round(statistics.median(values), 3) for name, values in steps.items()},
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenariusze wolniejsze od wzorca o więcej niż 'tolerance' (ułamek)."""
+    regressions = []
+    for name, current in results['scenariusze'].items():
+        reference = baseline.get('scenariusze', {}).get(name)
+        if reference and current['czas_s'] > reference['czas_s'] * (1.0 + tolerance):
+            regressions.append((name, reference['czas_s'], current['czas_s']))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Testy wydajności algorytmów wydz_liniowe.')
+    parser.add_argument('--dane', help='istniejący folder SLMN z raport_bo.gpkg (domyślnie generowany)')
+    parser.add_argument('--skala', choices=sorted(SKALE), default='mala', help='rozmiar danych syntetycznych')
+    parser.add_argument('--silniki', default='lancuch,strumieniowy', help='tryby obliczeń, po przecinku')
+    parser.add_argument('--watki', default='1,4', help='liczby wątków (obu trybów obliczeń), po przecinku')
+    parser.add_argument('--powtorzenia', type=int, default=3, help='liczba powtórzeń scenariusza (mediana)')
+    parser.add_argument('--wynik', help='plik JSON z wynikami')
+    parser.add_argument('--wzorzec', help='plik JSON z wynikami wzorcowymi do porównania')
+    parser.add_argument('--tolerancja', type=float, default=0.25, help='dopuszczalny wzrost czasu (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    engines = [e.strip() for e in args.silniki.split(',') if e.strip()]
+    unknown = [e for e in engines if e not in SILNIKI]
+    if unknown:
+        parser.error('nieznany tryb obliczeń: ' + ', '.join(unknown))
+    threads = [int(t) for t in args.watki.split(',') if t.strip()]
+
+    start_processing()
+    try:
+        with tempfile.TemporaryDirectory(prefix='wydz_lin_slmn_') as tmp:
+            data = args.dane
+            if data:
+                counts = {}
+            else:
+                data = tmp
+                counts = generate(data, *SKALE[args.skala])
+            results = {'skala': None if args.dane else args.skala, 'dane': counts, 'scenariusze': {}}
+            for name, algorithm, engine, workers in _scenarios(engines, threads):
+                result = run_scenario(algorithm, data, engine, workers, args.powtorzenia)
+                results['scenariusze'][name] = result
+                print(f'{name:<40} {result["czas_s"]:>9.3f} s')
+                for step, seconds in sorted(result['kroki'].items(), key=lambda kv: kv[1], reverse=True)[:5]:
+                    print(f'    {step[:36]:<36} {seconds:>9.3f} s')
+    finally:
+        stop_qgis()
+
+    if args.wynik:
+        with open(args.wynik, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.wzorzec:
+        with open(args.wzorzec, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerancja)
+        for name, before, after in regressions:
+            print(f'REGRESJA {name}: {before:.3f} s -> {after:.3f} s')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
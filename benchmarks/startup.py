@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Pomiar udziału wtyczki w starcie QGIS.
+
+Każde powtórzenie to osobny proces Pythona (zimny start importów): po
+inicjalizacji QgsApplication mierzony jest import pakietu wtyczki oraz
+rejestracja providera 'lmn' (loadAlgorithms). Wynik zawiera też listę
+modułów obliczeniowych wczytanych przy starcie – powinna być pusta, bo
+importują się one dopiero przy pierwszym uruchomieniu algorytmu.
+
+Użycie (z katalogu wtyczki):
+  python benchmarks/startup.py --wynik start.json
+  python benchmarks/startup.py --wzorzec start.json --tolerancja 0.5
+"""
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from headless import PLUGIN_DIR  # noqa: E402
+
+# moduły, których start wtyczki nie powinien wczytywać
+HEAVY_MODULES = ('processing', 'numpy', 'psutil', 'sqlite3', 'osgeo')
+HEAVY_PLUGIN_MODULES = ('engine', 'dag', 'cache', 'profiling', 'incremental', 'preflight',
+                        'kernels', 'aggregate', 'dedup', 'spatial', 'dialog', 'derived', 'planner',
+                        'pushdown', 'validity', 'joins', 'dbf')
+
+
+def measure_once() -> dict:
+    """Pomiar w bieżącym procesie (wywoływany w procesie potomnym)."""
+    from headless import start_qgis, stop_qgis
+    from qgis.core import QgsApplication
+
+    start_qgis()
+    preloaded = set(sys.modules)
+    parent, package = os.path.split(PLUGIN_DIR)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    try:
+        started = time.perf_counter()
+        importlib.import_module(package)
+        imported = time.perf_counter()
+        provider = importlib.import_module(package + '.provider').WydzLinioweProvider()
+        QgsApplication.processingRegistry().addProvider(provider)
+        registered = time.perf_counter()
+        loaded = set(sys.modules) - preloaded
+        plugin_modules = {f'{package}.{m}' for m in HEAVY_PLUGIN_MODULES}
+        heavy = {name if name in plugin_modules else name.split('.')[0] for name in loaded
+                 if name in plugin_modules or name.split('.')[0] in HEAVY_MODULES}
+        QgsApplication.processingRegistry().removeProvider(provider)
+    finally:
+        stop_qgis()
+    return {
+        'import_ms': round(1000.0 * (imported - started), 2),
+        'rejestracja_ms': round(1000.0 * (registered - imported), 2),
+        'moduly': sorted(heavy),
+    }
+
+
+def measure(repeats: int) -> dict:
+    samples = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--pojedynczy'],
+                             check=True, capture_output=True, text=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    totals = [s['import_ms'] + s['rejestracja_ms'] for s in samples]
+    return {
+        'start_ms': round(statistics.median(totals), 2),
+        'import_ms': round(statistics.median(s['import_ms'] for s in samples), 2),
+        'rejestracja_ms': round(statistics.median(s['rejestracja_ms'] for s in samples), 2),
+        'starty_ms': totals,
+        'moduly_przy_starcie': samples[-1]['moduly'],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Czas wczytania wtyczki wydz_liniowe przy starcie QGIS.')
+    parser.add_argument('--powtorzenia', type=int, default=5, help='liczba zimnych startów (mediana)')
+    parser.add_argument('--wynik', help='plik JSON z wynikami')
+    parser.add_argument('--wzorzec', help='plik JSON z wynikami wzorcowymi do porównania')
+    parser.add_argument('--tolerancja', type=float, default=0.5, help='dopuszczalny wzrost czasu (0.5 = 50%%)')
+    parser.add_argument('--pojedynczy', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.pojedynczy:
+        print(json.dumps(measure_once()))
+        return 0
+
+    result = measure(args.powtorzenia)
+    print(f'start wtyczki: {result["start_ms"]:.1f} ms '
+          f'(import {result["import_ms"]:.1f} ms, rejestracja {result["rejestracja_ms"]:.1f} ms)')
+    if result['moduly_przy_starcie']:
+        print('moduły wczytane przy starcie: ' + ', '.join(result['moduly_przy_starcie']))
+
+    if args.wynik:
+        with open(args.wynik, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.wzorzec:
+        with open(args.wzorzec, encoding='utf-8') as f:
+            before = json.load(f)['start_ms']
+        if result['start_ms'] > before * (1.0 + args.tolerancja):
+            print(f'REGRESJA start wtyczki: {before:.1f} ms -> {result["start_ms"]:.1f} ms')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Pamięć podręczna przygotowanych oddziałów między uruchomieniami.
+
+Naprawa geometrii a_oddz_pol, złączenie adr_les, granice oddziałów i pole
+adr_oddz (kroki 2, 3, 5 i 12) zależą tylko od warstwy oddziałów i raportu
+BO, a te zmieniają się rzadko. Wyniki przygotowania zapisujemy w
+GeoPackage w profilu użytkownika, pod kluczem będącym skrótem SHA-256
+zawartości plików wejściowych – zmiana dowolnego pliku daje nowy klucz,
+więc wpisy nie wymagają unieważniania. Rozmiar katalogu ograniczają
+limit liczby wpisów i limit bajtów (usuwane są najdawniej używane).
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+
+from qgis.core import (
+    QgsApplication,
+    QgsCoordinateTransformContext,
+    QgsFeatureSink,
+    QgsVectorFileWriter,
+)
+
+# zmiana formatu wpisów = nowe klucze (stare wypadną przy czyszczeniu)
+CACHE_VERSION = 1
+
+MAX_ENTRIES = 20
+MAX_BYTES = 1024 * 1024 * 1024
+
+# pliki towarzyszące, które wchodzą do klucza razem z plikiem głównym
+SIDECARS = {
+    '.shp': ('.shp', '.shx', '.dbf', '.prj', '.cpg'),
+    '.dbf': ('.dbf', '.cpg'),
+}
+
+_CHUNK = 1024 * 1024
+
+
+def default_directory() -> str:
+    return os.path.join(QgsApplication.qgisSettingsDirPath(), 'wydz_liniowe', 'cache')
+
+
+def source_files(layer) -> list:
+    """Pliki, z których czytana jest warstwa OGR ([] dla warstw spoza plików)."""
+    if layer is None or layer.providerType() != 'ogr':
+        return []
+    path = layer.source().split('|')[0]
+    if not os.path.isfile(path):
+        return []
+    stem, ext = os.path.splitext(path)
+    files = [stem + e for e in SIDECARS.get(ext.lower(), (ext,))]
+    return [f for f in files if os.path.isfile(f)]
+
+
+def layers_key(*layers):
+    """
+    Skrót zawartości plików wejściowych i opcji warstw (layername, filtr).
+    None, gdy którakolwiek warstwa nie pochodzi z pliku – wtedy bez cache.
+    """
+    digest = hashlib.sha256(f'wydz_liniowe:{CACHE_VERSION}'.encode())
+    for layer in layers:
+        files = source_files(layer)
+        if not files:
+            return None
+        source = layer.source().split('|')
+        digest.update('|'.join(source[1:]).encode('utf-8'))
+        digest.update(layer.subsetString().encode('utf-8'))
+        for path in files:
+            digest.update(os.path.splitext(path)[1].lower().encode())
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(_CHUNK), b''):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PreparedCache:
+    """
+    Katalog wpisów <klucz>_<rodzaj>.gpkg. Rodzaj rozróżnia odbiorców
+    (łańcuch Processing, silnik strumieniowy), bo przechowują inne warstwy.
+    Zapis trafia najpierw do pliku tymczasowego i jest podmieniany w całości,
+    więc równoległe uruchomienia (tryb wsadowy) nie widzą połowicznych wpisów.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, directory=None, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.directory = directory or default_directory()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def path(self, key: str, kind: str) -> str:
+        return os.path.join(self.directory, f'{key}_{kind}.gpkg')
+
+    def get(self, key: str, kind: str, names) -> dict:
+        """Źródła warstw wpisu {nazwa: 'plik|layername=nazwa'} albo None, gdy brak wpisu."""
+        if not key:
+            return None
+        path = self.path(key, kind)
+        if not os.path.isfile(path):
+            return None
+        # czas modyfikacji = czas ostatniego użycia (kolejność usuwania)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return {name: f'{path}|layername={name}' for name in names}
+
+    def put(self, key: str, kind: str, tables: dict) -> str:
+        """
+        Zapis wpisu. 'tables' to {nazwa: (pola, typ geometrii, CRS, obiekty)}.
+        Zwraca ścieżkę wpisu; błąd zapisu nie przerywa algorytmu (None).
+        """
+        if not key:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key, kind)
+        tmp = os.path.join(self.directory, f'.{uuid.uuid4().hex}.gpkg')
+        writer = None
+        try:
+            for n, (name, (fields, wkb_type, crs, features)) in enumerate(tables.items()):
+                options = QgsVectorFileWriter.SaveVectorOptions()
+                options.driverName = 'GPKG'
+                options.layerName = name
+                if n:
+                    options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+                writer = QgsVectorFileWriter.create(
+                    tmp, fields, wkb_type, crs, QgsCoordinateTransformContext(), options)
+                if writer.hasError() != QgsVectorFileWriter.NoError:
+                    raise OSError(writer.errorMessage())
+                for f in features:
+                    writer.addFeature(f, QgsFeatureSink.FastInsert)
+                # zamknięcie pliku przed kolejną warstwą
+                writer = None
+            os.replace(tmp, path)
+        except OSError:
+            writer = None
+            for leftover in (tmp, tmp + '-wal', tmp + '-shm'):
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass
+            return None
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Usuwa najdawniej używane wpisy ponad limit liczby wpisów i bajtów."""
+        with self._lock:
+            try:
+                names = [n for n in os.listdir(self.directory) if n.endswith('.gpkg') and not n.startswith('.')]
+            except OSError:
+                return
+            entries = []
+            for name in names:
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort(reverse=True)
+            total = 0
+            for n, (_, size, path) in enumerate(entries):
+                total += size
+                if path == keep or (n < self.max_entries and total <= self.max_bytes):
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Usuwa wszystkie wpisy."""
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return
+            for name in os.listdir(self.directory):
+                if name.endswith('.gpkg'):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+Łańcuch kroków Processing jako graf zależności.
+
+Każdy etap deklaruje algorytm i parametry; wejścia będące wynikami innych
+etapów zapisuje się jako Ref('klucz'), więc zależności wynikają wprost
+z parametrów. Po zakończeniu ostatniego odbiorcy wynik etapu jest
+zwalniany (release), a przy przekroczonym budżecie pamięci etap zapisuje
+wynik do tymczasowego GeoPackage zamiast do warstwy w pamięci.
+
+Gałęzie a_kom_* i a_line_* łączą się dopiero w kroku 19 – przy
+workers > 1 gotowe etapy uruchamiane są równolegle w puli wątków
+(najpierw te z najdłuższą ścieżką krytyczną), a postęp liczony jest
+z szacunku pozostałej ścieżki krytycznej. Przy workers = 1 etapy
+wykonywane są po kolei, w kolejności numerów kroków – jak dotąd.
+
+Algorytmy QGIS nie dają się przekazać do osobnych procesów, stąd wątki:
+każdy etap dostaje własny QgsProcessingContext. Warstwy (QObject) nie
+mogą być czytane z kilku wątków naraz, więc w trybie równoległym etapy
+zapisują wyniki do tymczasowych plików GeoPackage, a do wątku trafiają
+wyłącznie ścieżki – każdy etap otwiera plik na nowo we własnym kontekście.
+"""
+
+import os
+from collections import Counter, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from qgis.PyQt.QtCore import QThread
+from qgis.core import (
+    QgsProcessing,
+    QgsProcessingContext,
+    QgsProcessingFeedback,
+    QgsProcessingUtils,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+)
+
+from .profiling import current_memory_mb, peak_memory_mb
+
+# względny koszt algorytmów (szacunek ścieżki krytycznej); pozostałe – 1
+ALG_WEIGHTS = {
+    'native:fixgeometries': 3.0,
+    'lmn:napraw_niepoprawne_geometrie': 1.0,
+    'native:clip': 4.0,
+    'native:splitwithlines': 6.0,
+    'native:joinattributesbylocation': 5.0,
+    'native:mergevectorlayers': 2.0,
+    'native:reprojectlayer': 2.0,
+    'lmn:usun_duplikaty_geometrii': 2.0,
+    'lmn:agreguj_wg_adr_les': 3.0,
+}
+
+# co ile sekund pętla główna sprawdza przerwanie przez użytkownika
+POLL_INTERVAL = 0.2
+
+
+class Ref:
+    """Wynik OUTPUT innego etapu użyty jako parametr."""
+    __slots__ = ('key',)
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __repr__(self):
+        return f'Ref({self.key!r})'
+
+
+def _refs(value):
+    if isinstance(value, Ref):
+        yield value.key
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _refs(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _refs(item)
+
+
+def _resolve(value, lookup):
+    if isinstance(value, Ref):
+        return lookup(value.key)
+    if isinstance(value, (list, tuple)):
+        return [_resolve(item, lookup) for item in value]
+    if isinstance(value, dict):
+        return {k: _resolve(v, lookup) for k, v in value.items()}
+    return value
+
+
+def file_output(stage, params: dict) -> dict:
+    """Wynik tymczasowy etapu do pliku GeoPackage (z indeksem przestrzennym R-tree) zamiast do pamięci."""
+    if params.get('OUTPUT') != QgsProcessing.TEMPORARY_OUTPUT:
+        return params
+    return dict(params, OUTPUT=QgsProcessingUtils.generateTempFilename(f'{stage.key}.gpkg'))
+
+
+def spill_if_over_budget(stage, params: dict, budget_mb: float) -> dict:
+    """Przy pamięci procesu powyżej 'budget_mb' wynik tymczasowy etapu trafia do pliku (file_output)."""
+    if not budget_mb or params.get('OUTPUT') != QgsProcessing.TEMPORARY_OUTPUT:
+        return params
+    used = current_memory_mb()
+    if used is None:
+        used = peak_memory_mb()
+    if used is None or used <= budget_mb:
+        return params
+    return file_output(stage, params)
+
+
+def thread_safe_input(value, context, written: dict):
+    """
+    Wartość parametru dla etapu w wątku roboczym. Warstwa kontekstu głównego
+    (obiekt, identyfikator warstwy tymczasowej albo projektu) zastępowana
+    jest ścieżką pliku, który etap otworzy sam; warstwy w pamięci, z filtrem
+    albo spoza OGR zapisywane są raz ('written') do tymczasowego GeoPackage.
+    """
+    if isinstance(value, (list, tuple)):
+        return [thread_safe_input(item, context, written) for item in value]
+    if isinstance(value, QgsVectorLayer):
+        layer = value
+    elif isinstance(value, str) and value:
+        layer = QgsProcessingUtils.mapLayerFromString(value, context, False)
+    else:
+        return value
+    if not isinstance(layer, QgsVectorLayer):
+        return value
+    if layer.providerType() == 'ogr' and not layer.subsetString():
+        return layer.source()
+    if layer.id() not in written:
+        path = QgsProcessingUtils.generateTempFilename(f'{layer.name() or "warstwa"}.gpkg')
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'GPKG'
+        error = QgsVectorFileWriter.writeAsVectorFormatV3(layer, path, context.transformContext(), options)[0]
+        if error != QgsVectorFileWriter.NoError:
+            raise OSError(f'Nie udało się zapisać warstwy {layer.name()} do pliku tymczasowego')
+        written[layer.id()] = path
+    return written[layer.id()]
+
+
+def release_output(value, context):
+    """
+    Zwalnia wynik etapu: warstwę tymczasową z kontekstu, a wynik zapisany
+    do pliku tymczasowego – razem z plikiem.
+    """
+    if not isinstance(value, str):
+        return
+    store = context.temporaryLayerStore()
+    if store.mapLayer(value) is not None:
+        store.removeMapLayer(value)
+        return
+    temp_folder = os.path.normcase(os.path.abspath(QgsProcessingUtils.tempFolder()))
+    path = os.path.normcase(os.path.abspath(value.split('|')[0]))
+    if not path.startswith(temp_folder + os.sep):
+        # pliki użytkownika i pamięci podręcznej zostają
+        return
+    for layer in list(store.mapLayers().values()):
+        if os.path.normcase(os.path.abspath(layer.source().split('|')[0])) == path:
+            store.removeMapLayer(layer)
+    for leftover in (path, path + '-wal', path + '-shm'):
+        try:
+            os.remove(leftover)
+        except OSError:
+            pass
+
+
+class Stage:
+    __slots__ = ('step', 'key', 'alg_id', 'params', 'weight', 'inputs')
+
+    def __init__(self, step, key, alg_id, params, weight):
+        self.step = step
+        self.key = key
+        self.alg_id = alg_id
+        self.params = params
+        self.weight = weight
+        self.inputs = list(OrderedDict.fromkeys(_refs(params)))
+
+
+class _StageFeedback(QgsProcessingFeedback):
+    """
+    Feedback etapu uruchomionego w wątku: komunikaty trafiają do feedbacku
+    łańcucha, a postęp – nie (liczy go harmonogram z całego grafu).
+    """
+
+    def __init__(self, parent):
+        super().__init__()
+        self._parent = parent
+
+    def reportError(self, error, fatalError=False):
+        self._parent.reportError(error, fatalError)
+
+    def pushWarning(self, warning):
+        self._parent.pushWarning(warning)
+
+    def pushInfo(self, info):
+        self._parent.pushInfo(info)
+
+    def pushCommandInfo(self, info):
+        self._parent.pushCommandInfo(info)
+
+    def pushDebugInfo(self, info):
+        self._parent.pushDebugInfo(info)
+
+    def pushConsoleInfo(self, info):
+        self._parent.pushConsoleInfo(info)
+
+
+class StageGraph:
+    """Etapy łańcucha z zależnościami; runner(etap, parametry, kontekst, feedback) -> wyniki algorytmu."""
+
+    def __init__(self):
+        self._stages = OrderedDict()
+
+    def add(self, step: int, key: str, alg_id: str, params: dict, weight: float = None) -> Stage:
+        stage = Stage(step, key, alg_id, params, ALG_WEIGHTS.get(alg_id, 1.0) if weight is None else weight)
+        self._stages[key] = stage
+        return stage
+
+    def __len__(self):
+        return len(self._stages)
+
+    def __contains__(self, key):
+        return key in self._stages
+
+    def stages(self) -> list:
+        """Etapy w kolejności numerów kroków."""
+        return sorted(self._stages.values(), key=lambda s: s.step)
+
+    def dependencies(self, stage) -> list:
+        """Etapy grafu, na których wyniki czeka 'stage' (wejścia spoza grafu są już gotowe)."""
+        return [key for key in stage.inputs if key in self._stages]
+
+    def consumers(self) -> dict:
+        """{klucz: etapy korzystające z jego wyniku}."""
+        result = {key: [] for key in self._stages}
+        for stage in self._stages.values():
+            for key in self.dependencies(stage):
+                result[key].append(stage.key)
+        return result
+
+    def critical_path(self) -> dict:
+        """{klucz: waga etapu + najdłuższa ścieżka do końca grafu}."""
+        consumers = self.consumers()
+        remaining = {}
+        # od końca – konsumenci mają wyższe numery kroków niż ich wejścia
+        for stage in reversed(self.stages()):
+            remaining[stage.key] = stage.weight + max(
+                (remaining[c] for c in consumers[stage.key]), default=0.0)
+        return remaining
+
+    def run(self, runner, outputs: dict, context, feedback, workers: int = 1, steps: int = None,
+            on_done=None, keep=(), hold=None, budget_mb: float = 0) -> bool:
+        """
+        Wykonuje graf; wyniki etapów trafiają do outputs[klucz]. 'steps' to
+        liczba kroków feedbacku (QgsProcessingMultiStepFeedback) zajmowanych
+        przez graf. Wyniki spoza 'keep' są zwalniane po ostatnim odbiorcy
+        (po wywołaniu on_done dla tego odbiorcy). 'hold' to zbiór kluczy
+        należący do wywołującego – wyniki z niego czekają, aż on_done usunie
+        z niego klucz (np. po zapisie do pamięci podręcznej), najpóźniej do
+        końca przebiegu. 'budget_mb' – patrz spill_if_over_budget (przy
+        workers > 1 wyniki i tak trafiają do plików).
+        Zwraca False po przerwaniu przez użytkownika.
+        """
+        workers = workers or os.cpu_count() or 1
+        liveness = _Liveness(self, outputs, context, keep, hold)
+        try:
+            if workers <= 1:
+                return self._run_serial(runner, outputs, context, feedback, on_done, liveness, budget_mb)
+            return self._run_parallel(runner, outputs, context, feedback, workers, steps or len(self),
+                                      on_done, liveness)
+        finally:
+            liveness.close()
+
+    def _run_serial(self, runner, outputs, context, feedback, on_done, liveness, budget_mb):
+        for stage in self.stages():
+            feedback.setCurrentStep(stage.step)
+            if feedback.isCanceled():
+                return False
+            params = _resolve(stage.params, lambda key: outputs[key]['OUTPUT'])
+            params = spill_if_over_budget(stage, params, budget_mb)
+            outputs[stage.key] = runner(stage, params, context, feedback)
+            if on_done is not None:
+                on_done(stage.key)
+            liveness.finished(stage)
+        return not feedback.isCanceled()
+
+    def _run_parallel(self, runner, outputs, context, feedback, workers, steps, on_done, liveness):
+        main_thread = QThread.currentThread()
+        remaining = self.critical_path()
+        total = max(remaining.values(), default=0.0) or 1.0
+        waiting = {stage.key: set(self.dependencies(stage)) for stage in self.stages()}
+        running = {}
+        written = {}
+
+        def output_path(key):
+            # wyniki etapów są w plikach (file_output) – do wątku trafia sama ścieżka
+            return outputs[key]['OUTPUT']
+
+        def execute(stage, params, stage_feedback):
+            stage_context = QgsProcessingContext()
+            stage_context.copyThreadSafeSettings(context)
+            try:
+                return runner(stage, params, stage_context, stage_feedback), stage_context
+            finally:
+                stage_context.pushToThread(main_thread)
+
+        def report():
+            left = [remaining[key] for key in waiting] + [remaining[s.key] for s, _ in running.values()]
+            position = steps * (1.0 - max(left, default=0.0) / total)
+            current = min(int(position), steps - 1)
+            feedback.setCurrentStep(current)
+            feedback.setProgress(100.0 * (position - current))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                while waiting or running:
+                    if feedback.isCanceled():
+                        return False
+                    # najpierw etapy z najdłuższą pozostałą ścieżką krytyczną
+                    ready = sorted((key for key, deps in waiting.items() if not deps),
+                                   key=lambda key: (-remaining[key], self._stages[key].step))
+                    for key in ready[:max(0, workers - len(running))]:
+                        stage = self._stages[key]
+                        del waiting[key]
+                        params = file_output(stage, _resolve(stage.params, output_path))
+                        params = {name: thread_safe_input(value, context, written) for name, value in params.items()}
+                        stage_feedback = _StageFeedback(feedback)
+                        future = pool.submit(execute, stage, params, stage_feedback)
+                        running[future] = (stage, stage_feedback)
+                    done, _ = wait(list(running), timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, _ = running.pop(future)
+                        result, stage_context = future.result()
+                        # warstwy tymczasowe etapu przechodzą do kontekstu głównego
+                        context.takeResultsFrom(stage_context)
+                        outputs[stage.key] = result
+                        for deps in waiting.values():
+                            deps.discard(stage.key)
+                        if on_done is not None:
+                            on_done(stage.key)
+                        liveness.finished(stage)
+                    report()
+            finally:
+                # przerwanie albo błąd etapu – pozostałe etapy kończą się jak najszybciej
+                for _, stage_feedback in running.values():
+                    stage_feedback.cancel()
+        return not feedback.isCanceled()
+
+
+class _Liveness:
+    """Liczba etapów, które jeszcze czekają na wynik; przy zerze wynik jest zwalniany."""
+
+    def __init__(self, graph, outputs, context, keep, hold=None):
+        self._graph = graph
+        self._outputs = outputs
+        self._context = context
+        self._keep = set(keep)
+        # zbiór wywołującego – sprawdzany przy każdym zwalnianiu, nie kopiowany
+        self._hold = hold if hold is not None else set()
+        self._pending = Counter()
+        for stage in graph.stages():
+            self._pending.update(graph.dependencies(stage))
+        self._released = set()
+
+    def finished(self, stage):
+        for key in self._graph.dependencies(stage):
+            self._pending[key] -= 1
+        self._sweep(self._hold)
+
+    def close(self):
+        """Koniec przebiegu – zwalnia także wyniki wstrzymane w 'hold'."""
+        self._sweep(())
+
+    def _sweep(self, hold):
+        for key, count in self._pending.items():
+            if count == 0 and key not in self._keep and key not in hold and key not in self._released:
+                self._released.add(key)
+                release_output(self._outputs[key].get('OUTPUT'), self._context)
+                self._outputs[key] = {'OUTPUT': None}
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Czytnik plików DBF (dBASE III) mapowanych w pamięci.
+
+Tabele a_kom_a.dbf, a_line_a.dbf i raport BO zapisany jako DBF są
+potrzebne tylko jako słowniki złączeń, a przez OGR każdy wiersz staje się
+obiektem QgsFeature. Tutaj plik jest mapowany (mmap), a dekodowane są
+wyłącznie wskazane kolumny – liczby całkowite do array('q'), liczby
+rzeczywiste do array('d'), teksty do listy napisów internowanych.
+
+Strona kodowa: plik .cpg obok DBF, potem bajt LDID nagłówka, a gdy oba
+milczą – CP1250 (Windows, polskie znaki w danych SLMN).
+"""
+
+import codecs
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# wartość NULL w kolumnach całkowitych (array('q') nie przechowuje None)
+NULL_INT = -(2 ** 63)
+
+DEFAULT_ENCODING = 'cp1250'
+
+# bajt 29 nagłówka (Language Driver ID) -> kodowanie Pythona
+LDID_ENCODINGS = {
+    0x01: 'cp437',
+    0x02: 'cp850',
+    0x03: 'cp1252',
+    # 0x57 ('ANSI' – strona kodowa systemu) celowo pominięte: dla danych SLMN to CP1250
+    0x64: 'cp852',
+    0x65: 'cp866',
+    0x66: 'cp865',
+    0x6A: 'cp737',
+    0x6B: 'cp857',
+    0x78: 'big5',
+    0x7A: 'gbk',
+    0x7B: 'shift_jis',
+    0x7D: 'cp1255',
+    0x7E: 'cp1256',
+    0xC8: 'cp1250',
+    0xC9: 'cp1251',
+    0xCA: 'cp1254',
+    0xCB: 'cp1253',
+}
+
+_HEADER = struct.Struct('<BBBBIHH')
+_FIELD = struct.Struct('<11sc4xBB14x')
+
+
+def _cpg_encoding(path: str):
+    """Kodowanie z pliku .cpg (np. 'UTF-8', '1250', 'ANSI 1250', 'CP1250', 'ISO-8859-2')."""
+    cpg = os.path.splitext(path)[0] + '.cpg'
+    try:
+        with open(cpg, 'rb') as f:
+            text = f.read(64).decode('ascii', 'ignore').strip()
+    except OSError:
+        return None
+    if not text:
+        return None
+    candidates = [text]
+    digits = ''.join(ch for ch in text if ch.isdigit())
+    if digits and text.upper().replace('ANSI', '').replace('CP', '').strip().isdigit():
+        candidates.insert(0, 'cp' + digits)
+    for name in candidates:
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            continue
+    return None
+
+
+def detect_encoding(path: str, ldid: int) -> str:
+    return _cpg_encoding(path) or LDID_ENCODINGS.get(ldid) or DEFAULT_ENCODING
+
+
+class DbfField:
+    __slots__ = ('name', 'type', 'length', 'decimals', 'offset')
+
+    def __init__(self, name, type_, length, decimals, offset):
+        self.name = name
+        self.type = type_
+        self.length = length
+        self.decimals = decimals
+        self.offset = offset
+
+    @property
+    def is_integer(self) -> bool:
+        return self.type in ('N', 'F') and self.decimals == 0 and self.length <= 18
+
+    @property
+    def is_numeric(self) -> bool:
+        return self.type in ('N', 'F')
+
+
+class DbfTable:
+    """
+    Tabela DBF tylko do odczytu. Użycie:
+        with DbfTable(path) as table:
+            for nr_wew, adr_les in table.rows(('nr_wew', 'adr_les')): ...
+    Nazwy kolumn porównywane są bez rozróżniania wielkości liter (jak w QGIS).
+    """
+
+    def __init__(self, path: str, encoding: str = None):
+        self.path = path
+        self._mm = None
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # pusty plik nie daje się zmapować
+            self._file.close()
+            raise ValueError(f'Pusty plik DBF: {path}')
+        try:
+            self._read_header()
+        except (struct.error, ValueError):
+            self.close()
+            raise ValueError(f'Nieprawidłowy nagłówek DBF: {path}')
+        self.encoding = encoding or detect_encoding(path, self._ldid)
+
+    def _read_header(self):
+        mm = self._mm
+        _, _, _, _, count, header_len, record_len = _HEADER.unpack_from(mm, 0)
+        self._ldid = mm[29]
+        if record_len <= 0 or header_len < 33:
+            raise ValueError('nagłówek')
+        self.fields = []
+        offset = 1   # bajt 0 rekordu to znacznik usunięcia
+        pos = 32
+        while pos + 32 <= header_len and mm[pos] != 0x0D:
+            raw_name, raw_type, length, decimals = _FIELD.unpack_from(mm, pos)
+            name = raw_name.split(b'\x00', 1)[0].decode('ascii', 'replace').strip()
+            self.fields.append(DbfField(name, raw_type.decode('ascii', 'replace').upper(), length, decimals, offset))
+            offset += length
+            pos += 32
+        self._header_len = header_len
+        self._record_len = record_len
+        # liczba rekordów z nagłówka, ale nie więcej niż mieści plik
+        self.record_count = min(count, max(0, (len(mm) - header_len) // record_len))
+        self._by_name = {f.name.lower(): f for f in self.fields}
+
+    def field(self, name: str):
+        return self._by_name.get(name.lower())
+
+    def _live_records(self):
+        """Początki nieusuniętych rekordów."""
+        mm, start, size = self._mm, self._header_len, self._record_len
+        for n in range(self.record_count):
+            base = start + n * size
+            if mm[base] != 0x2A:    # '*' – rekord usunięty
+                yield base
+
+    def column(self, name: str):
+        """
+        Kolumna jako tablica: array('q') (NULL = NULL_INT), array('d')
+        (NULL = NaN) albo lista tekstów (NULL = None). Brak kolumny -> None.
+        """
+        field = self.field(name)
+        if field is None:
+            return None
+        mm, off, length = self._mm, field.offset, field.length
+        raw = (mm[base + off:base + off + length] for base in self._live_records())
+        if field.is_integer:
+            values = array('q')
+            for b in raw:
+                v = _parse_number(b)
+                values.append(NULL_INT if v is None else int(v))
+            return values
+        if field.is_numeric:
+            values = array('d')
+            for b in raw:
+                v = _parse_number(b)
+                values.append(math.nan if v is None else float(v))
+            return values
+        encoding, intern = self.encoding, sys.intern
+        values = []
+        for b in raw:
+            text = b.rstrip(b' \x00')
+            values.append(intern(text.decode(encoding, 'replace')) if text else None)
+        return values
+
+    def rows(self, names):
+        """Krotki wartości wskazanych kolumn (None dla NULL i brakujących kolumn)."""
+        columns = []
+        for name in names:
+            values = self.column(name)
+            if values is None:
+                columns.append(None)
+            elif isinstance(values, array) and values.typecode == 'q':
+                columns.append([None if v == NULL_INT else v for v in values])
+            elif isinstance(values, array):
+                columns.append([None if math.isnan(v) else v for v in values])
+            else:
+                columns.append(values)
+        count = sum(1 for _ in self._live_records())
+        columns = [c if c is not None else [None] * count for c in columns]
+        return zip(*columns)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _parse_number(raw: bytes):
+    text = raw.strip(b' \x00')
+    if not text or text.strip(b'*') == b'':
+        return None
+    try:
+        return int(text) if b'.' not in text and b'e' not in text.lower() else float(text)
+    except ValueError:
+        return None
+
+
+def dbf_path(layer):
+    """Ścieżka DBF, jeśli warstwa to zwykła tabela DBF czytana przez OGR (bez filtra), inaczej None."""
+    if layer is None or layer.providerType() != 'ogr' or layer.subsetString():
+        return None
+    path = layer.source().split('|')[0]
+    if os.path.splitext(path)[1].lower() != '.dbf' or not os.path.isfile(path):
+        return None
+    return path
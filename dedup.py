@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Usuwanie duplikatów geometrii przez skrót postaci kanonicznej (krok 20).
+
+native:deleteduplicategeometries porównuje każdą geometrię z kandydatami
+z indeksu przestrzennego (isGeosEqual), co przy gęsto nakładających się
+a_kom_lin i a_line_lin (drogi) daje wiele kosztownych porównań. Tutaj
+każda geometria sprowadzana jest do postaci kanonicznej – opcjonalne
+przyciąganie do siatki, tylko XY, typ wieloczęściowy, normalizacja GEOS
+(kierunek linii i kolejność części) – a duplikat rozpoznawany jest po
+skrócie jej WKB. Dokładne porównanie WKB następuje tylko, gdy skrót już
+wystąpił, więc czas jest liniowy, a obiekty mogą napływać strumieniowo.
+
+Różnica względem isGeosEqual: linie równe topologicznie, ale o innym
+podziale na wierzchołki (dodatkowy punkt w środku odcinka), nie są
+traktowane jako duplikaty.
+"""
+
+import hashlib
+
+from qgis.core import QgsGeometry
+
+
+def canonical_wkb(geom, grid: float = 0.0) -> bytes:
+    """WKB postaci kanonicznej; przyciągnięcie do siatki 'grid' (0 = bez) służy tylko porównaniu."""
+    canonical = QgsGeometry(geom)
+    if grid > 0:
+        snapped = canonical.snappedToGrid(grid, grid)
+        # geometria zapadnięta do punktu nie może zlewać się z innymi
+        if not snapped.isNull() and not snapped.isEmpty():
+            canonical = snapped
+    abstract = canonical.get()
+    abstract.dropZValue()
+    abstract.dropMValue()
+    canonical.convertToMultiType()
+    canonical.normalize()
+    return bytes(canonical.asWkb())
+
+
+class GeometryDeduplicator:
+    """
+    Zostaje pierwszy obiekt o danej geometrii, jak w native:deleteduplicategeometries.
+    Obiekty bez geometrii są zawsze przepuszczane.
+    """
+
+    def __init__(self, grid: float = 0.0):
+        self.grid = grid
+        self.duplicates = 0
+        # skrót -> WKB kanoniczne (albo lista WKB przy kolizji skrótów)
+        self._seen = {}
+
+    def accept(self, geom) -> bool:
+        if geom is None or geom.isNull():
+            return True
+        wkb = canonical_wkb(geom, self.grid)
+        digest = hashlib.blake2b(wkb, digest_size=16).digest()
+        known = self._seen.get(digest)
+        if known is None:
+            self._seen[digest] = wkb
+            return True
+        if isinstance(known, bytes):
+            if known == wkb:
+                self.duplicates += 1
+                return False
+            self._seen[digest] = [known, wkb]
+            return True
+        if wkb in known:
+            self.duplicates += 1
+            return False
+        known.append(wkb)
+        return True
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Pola wyliczane łańcucha bez wyrażeń QGIS.
+
+Kroki 7, 9, 15, 16, 22 i 23 liczyły po jednym polu przez
+native:fieldcalculator – za każdym razem kontekst wyrażenia, obliczenie
+QgsExpression dla każdego obiektu i kopia całej warstwy. Tutaj reguły
+kompilowane są raz do funkcji Pythona działających na kolumnach paczki
+obiektów (kolumna = lista wartości), a wszystkie pola danego kroku
+liczone są w jednym przebiegu:
+
+  id_oddz = id_oddz(id_kom, adr_les)    "id_kom" || trim(substr("adr_les", 1, 17))
+  id = coalesce(id_kom, id_lin)         coalesce("id_kom", "id_lin") jako liczba
+  dlugosc = dlugosc(2)                  round($length, 2); dlugosc() – bez zaokrąglenia
+
+substr(…, 1, 17) przy NumPy to jedno rzutowanie kolumny na napisy
+o długości 17 znaków; długości liczy kernels.py paczkami.
+"""
+
+import re
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import QgsField
+
+from .joins import as_float, as_text, id_oddz
+from .kernels import planar_lengths, round_half_away_all
+
+try:
+    import numpy as np
+except ImportError:  # NumPy jest w instalacjach QGIS, ale nie jest wymagany
+    np = None
+
+# długość adresu oddziału w adresie leśnym (substr(adr, 1, 17))
+ODDZ_ADDRESS_LENGTH = 17
+
+_RULE = re.compile(r'^\s*(\w+)\s*=\s*(\w+)\s*\(([^)]*)\)\s*$')
+
+
+class Rule:
+    """Pole wyliczane: definicja pola wynikowego i funkcja kolumnowa."""
+    __slots__ = ('name', 'field', 'inputs', 'geometry', 'compute')
+
+    def __init__(self, name, field, inputs, compute, geometry=False):
+        self.name = name
+        self.field = field
+        self.inputs = inputs
+        self.compute = compute
+        self.geometry = geometry
+
+    def __repr__(self):
+        return f'Rule({self.name!r}, {self.inputs!r})'
+
+
+def id_oddz_column(ids, addresses) -> list:
+    """"id" || trim(substr(adr, 1, 17)) dla całych kolumn (NULL w którejkolwiek -> None)."""
+    if np is None or not ids:
+        return [id_oddz(i, a) for i, a in zip(ids, addresses)]
+    prefixes = [as_text(v) for v in ids]
+    texts = [as_text(v) for v in addresses]
+    nulls = [p is None or t is None for p, t in zip(prefixes, texts)]
+    # rzutowanie na '<U17' obcina napisy – substr dla całej kolumny naraz
+    sliced = np.char.strip(np.array([t or '' for t in texts], dtype=str).astype(f'<U{ODDZ_ADDRESS_LENGTH}'))
+    joined = np.char.add(np.array([p or '' for p in prefixes], dtype=str), sliced).tolist()
+    return [None if null else value for null, value in zip(nulls, joined)]
+
+
+def _id_oddz_rule(name, args):
+    if len(args) != 2:
+        raise ValueError(f'{name}: id_oddz wymaga dwóch pól (identyfikator, adres)')
+    return Rule(name, QgsField(name, QVariant.String, 'text', 50, 0), args,
+                lambda columns, geometries: id_oddz_column(columns[args[0]], columns[args[1]]))
+
+
+def _coalesce_rule(name, args):
+    if not args:
+        raise ValueError(f'{name}: coalesce wymaga co najmniej jednego pola')
+
+    def compute(columns, geometries):
+        result = [None] * len(geometries)
+        for arg in args:
+            for n, value in enumerate(columns[arg]):
+                if result[n] is None:
+                    result[n] = as_float(value)
+        return result
+
+    return Rule(name, QgsField(name, QVariant.Double, 'double precision', 20, 0), args, compute)
+
+
+def _length_rule(name, args):
+    if len(args) > 1:
+        raise ValueError(f'{name}: dlugosc przyjmuje najwyżej liczbę miejsc po przecinku')
+    decimals = int(args[0]) if args else None
+
+    def compute(columns, geometries):
+        lengths = planar_lengths(geometries)
+        return lengths if decimals is None else round_half_away_all(lengths, decimals)
+
+    return Rule(name, QgsField(name, QVariant.Double, 'double precision', 10, 2), [], compute, geometry=True)
+
+
+# nazwa funkcji w regule -> kompilator reguły
+FUNCTIONS = {
+    'id_oddz': _id_oddz_rule,
+    'coalesce': _coalesce_rule,
+    'dlugosc': _length_rule,
+}
+
+
+def parse_rules(text: str) -> list:
+    """Reguły 'pole = funkcja(argumenty); …' jako [(pole, funkcja, [argumenty])] (ValueError przy błędzie)."""
+    rules = []
+    for part in filter(str.strip, text.split(';')):
+        match = _RULE.match(part)
+        if match is None:
+            raise ValueError(f'Nieprawidłowa reguła: {part.strip()}')
+        name, function, raw_args = match.groups()
+        if function not in FUNCTIONS:
+            raise ValueError(f'Nieznana funkcja reguły: {function}')
+        rules.append((name, function, [a.strip() for a in raw_args.split(',') if a.strip()]))
+    return rules
+
+
+def compile_rules(text: str) -> list:
+    """Reguły jako lista Rule gotowych do evaluate()."""
+    return [FUNCTIONS[function](name, args) for name, function, args in parse_rules(text)]
+
+
+def evaluate(rules, features, fields) -> list:
+    """
+    Wartości wszystkich reguł dla paczki obiektów: lista kolumn w kolejności
+    reguł. Kolumny wejściowe wyciągane są raz; reguła może korzystać
+    z pola wyliczonego przez wcześniejszą regułę.
+    """
+    attributes = [f.attributes() for f in features]
+    geometries = [f.geometry() for f in features] if any(r.geometry for r in rules) else [None] * len(features)
+    columns = {}
+    results = []
+    for rule in rules:
+        for name in rule.inputs:
+            if name not in columns:
+                index = fields.lookupField(name)
+                columns[name] = [a[index] if 0 <= index < len(a) else None for a in attributes]
+        values = rule.compute(columns, geometries)
+        columns[rule.name] = values
+        results.append(values)
+    return results
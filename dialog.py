@@ -5,15 +5,16 @@ from qgis.PyQt.QtWidgets import (
     QMessageBox, QWidget, QFileDialog, QPushButton, QHBoxLayout, QLineEdit,
     QProgressDialog
 )
-from qgis.PyQt.QtCore import Qt, pyqtSignal
-from qgis.PyQt import QtCore
+from qgis.PyQt.QtCore import Qt
 from qgis.core import (
-    QgsProject, QgsProcessingContext, QgsVectorLayer,
-    QgsMapLayerProxyModel, QgsProcessingFeedback
+    QgsApplication, QgsProject, QgsProcessingContext, QgsVectorLayer,
+    QgsMapLayerProxyModel, QgsProcessingFeedback, QgsProcessingAlgRunnerTask,
+    QgsMessageLog, Qgis
 )
 from qgis.gui import QgsMapLayerComboBox
 from .algorithm import Wydz_liniowe
 from .utils import ensure_output_string, load_vector_if_exists, infer_layer_name_from_source
+from .preflight import scan_slmn_folder
 
 PLACEHOLDER_TMP = '[Zapis do warstwy tymczasowej]'
 
@@ -47,7 +48,8 @@ class FilePicker(QWidget):
             self,
             'Wybierz plik wyjściowy',
             '',
-            'ESRI Shapefile (*.shp);;GPKG (*.gpkg);;GeoJSON (*.geojson)'
+            'ESRI Shapefile (*.shp);;GPKG (*.gpkg);;GeoJSON (*.geojson);;'
+            'GeoParquet (*.parquet);;Arrow IPC (*.arrow)'
         )
         if path:
             self.edit.setText(path)
@@ -87,24 +89,11 @@ class FolderPicker(QWidget):
 
 class ProgressFeedback(QgsProcessingFeedback):
     """
-    Sprzęga Processing z QProgressDialog w trybie synchronicznym.
+    Feedback dla zadania uruchamianego w tle.
+    Postęp trafia na pasek przez sygnał QgsTask.progressChanged (kolejkowany
+    do wątku GUI), więc nie trzeba wołać processEvents.
     Pokazujemy WYŁĄCZNIE pasek postępu – bez etykiet/tekstów.
     """
-    progressChanged = pyqtSignal(float)
-
-    def __init__(self, progress_dialog: QProgressDialog):
-        super().__init__()
-        self._dlg = progress_dialog
-        self._canceled = False
-
-    def setProgress(self, progress: float):
-        super().setProgress(progress)
-        try:
-            self._dlg.setValue(int(progress))
-            # odśwież GUI, żeby pasek się rysował
-            QtCore.QCoreApplication.processEvents(QtCore.QEventLoop.AllEvents, 50)
-        except Exception:
-            pass
 
     # Wyłączamy aktualizacje tekstów (ma być sam pasek)
     def setProgressText(self, text: str):
@@ -116,13 +105,6 @@ class ProgressFeedback(QgsProcessingFeedback):
     def pushWarning(self, warning: str):
         pass
 
-    def isCanceled(self) -> bool:
-        return self._canceled or super().isCanceled()
-
-    def cancel(self):
-        self._canceled = True
-        super().cancel()
-
 
 class WydzLinioweDialog(QDialog):
     def __init__(self, iface, parent=None):
@@ -131,6 +113,10 @@ class WydzLinioweDialog(QDialog):
         self.setWindowTitle('Wydzielenia liniowe')
         self.setMinimumWidth(640)
 
+        # zadanie w tle i obiekty, które muszą żyć do jego zakończenia
+        self._task = None
+        self._run_state = None
+
         main = QVBoxLayout(self)
 
         grid = QGridLayout()
@@ -162,31 +148,29 @@ class WydzLinioweDialog(QDialog):
         buttons.rejected.connect(self.reject)
         main.addWidget(buttons)
 
-    def _resolve_slmn_inputs(self, folder: str) -> dict:
+    def _resolve_slmn_inputs(self, folder: str, bo_layer=None) -> dict:
         """
-        Zwraca słownik z wczytanymi warstwami z podanego folderu.
+        Zwraca słownik z wczytanymi warstwami z podanego folderu
+        (tabele DBF jako ścieżki).
         Podnosi wyjątek z listą braków lub błędów.
         """
+        # kontrola wstępna z samych nagłówków (schemat, typy geometrii, .prj,
+        # liczby obiektów) – zanim cokolwiek zostanie wczytane przez OGR
+        report = scan_slmn_folder(folder, bo_layer)
+        for warning in report.warnings:
+            QgsMessageLog.logMessage(warning, 'WydzLiniowe', Qgis.Warning)
+        if not report.ok:
+            raise RuntimeError(report.text())
+
         missing = []
         invalid = []
 
         def _make_path(fname): return os.path.join(folder, fname)
 
-        # a_kom_a.dbf
+        # tabele DBF – algorytm dostaje ścieżkę, a złączenia czytają plik
+        # bezpośrednio; nagłówki sprawdziła już kontrola wstępna
         p_kom_a = _make_path(SLMN_REQUIRED['a_kom_a'])
-        lyr_kom_a = load_vector_if_exists(p_kom_a, 'a_kom_a') if os.path.exists(p_kom_a) else None
-        if not os.path.exists(p_kom_a):
-            missing.append(SLMN_REQUIRED['a_kom_a'])
-        elif not (lyr_kom_a and lyr_kom_a.isValid()):
-            invalid.append(SLMN_REQUIRED['a_kom_a'])
-
-        # a_line_a.dbf
         p_line_a = _make_path(SLMN_REQUIRED['a_line_a'])
-        lyr_line_a = load_vector_if_exists(p_line_a, 'a_line_a') if os.path.exists(p_line_a) else None
-        if not os.path.exists(p_line_a):
-            missing.append(SLMN_REQUIRED['a_line_a'])
-        elif not (lyr_line_a and lyr_line_a.isValid()):
-            invalid.append(SLMN_REQUIRED['a_line_a'])
 
         # a_kom_lin.shp
         p_kom_lin = _make_path(SLMN_REQUIRED['a_kom_lin'])
@@ -221,8 +205,8 @@ class WydzLinioweDialog(QDialog):
             raise RuntimeError('\n\n'.join(msg))
 
         return {
-            'a_kom_adbf': lyr_kom_a,
-            'a_line_adbf': lyr_line_a,
+            'a_kom_adbf': p_kom_a,
+            'a_line_adbf': p_line_a,
             'a_kom_linshp': lyr_kom_lin,
             'a_line_linshp': lyr_line_lin,
             'a_oddz_polshp': lyr_oddz_pol,
@@ -293,7 +277,7 @@ class WydzLinioweDialog(QDialog):
 
         # Wczytaj warstwy z folderu SLMN
         try:
-            slmn_layers = self._resolve_slmn_inputs(folder)
+            slmn_layers = self._resolve_slmn_inputs(folder, self.in_wydzielenia.currentLayer())
         except Exception as e:
             QMessageBox.critical(self, 'Błąd wejścia', str(e))
             return
@@ -314,46 +298,65 @@ class WydzLinioweDialog(QDialog):
         context = QgsProcessingContext()
         context.setProject(QgsProject.instance())
 
-        # Pokaż WYŁĄCZNIE pasek postępu (bez tekstu)
+        # Pokaż WYŁĄCZNIE pasek postępu (bez tekstu); okno niemodalne –
+        # w trakcie obliczeń można dalej pracować na mapie
         progress = QProgressDialog('', 'Anuluj', 0, 100, self)
         progress.setWindowTitle('Wydzielenia liniowe — postęp')
-        progress.setWindowModality(Qt.WindowModal)
+        progress.setWindowModality(Qt.NonModal)
         progress.setMinimumDuration(0)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
         progress.setLabelText('')   # upewnij się, że etykieta jest pusta
         progress.setValue(0)
         progress.show()
-        QtCore.QCoreApplication.processEvents()
 
-        feedback = ProgressFeedback(progress)
+        feedback = ProgressFeedback()
+
+        # --- URUCHOMIENIE W TLE (menedżer zadań QGIS) ---
+        task = QgsProcessingAlgRunnerTask(Wydz_liniowe(), params, context, feedback)
+        # referencje muszą przeżyć zadanie (warstwy SLMN nie należą do projektu)
+        self._run_state = {
+            'params': params, 'context': context, 'feedback': feedback, 'progress': progress,
+            'dest_agreg': dest_agreg, 'dest_seg': dest_seg, 'canceled': False,
+        }
+        self._task = task
 
-        # Obsługa anulowania
+        task.progressChanged.connect(lambda value: progress.setValue(int(value)))
+        task.executed.connect(self._on_task_executed)
+
+        # Obsługa anulowania – natychmiast: przerywamy zadanie i zamykamy pasek
         def on_cancel():
-            try:
-                feedback.cancel()
-            except Exception:
-                pass
+            if self._run_state is not None:
+                self._run_state['canceled'] = True
+            feedback.cancel()
+            task.cancel()
+            progress.close()
         progress.canceled.connect(on_cancel)
 
-        # --- URUCHOMIENIE SYNCHRONICZNE ---
-        alg = Wydz_liniowe()
-        try:
-            results, ok = alg.run(params, context, feedback)
-            if not ok:
-                raise RuntimeError('Algorytm zakończony niepowodzeniem lub został przerwany.')
-        except Exception as e:
-            progress.close()
-            QMessageBox.critical(self, 'Błąd', f'Algorytm zakończony błędem:\n{e}')
+        self.btn_run.setEnabled(False)
+        QgsApplication.taskManager().addTask(task)
+
+    def _on_task_executed(self, ok: bool, results: dict):
+        """Wywoływane w wątku GUI po zakończeniu zadania."""
+        state, self._run_state, self._task = self._run_state, None, None
+        self.btn_run.setEnabled(True)
+        if state is None:
+            return
+        state['progress'].close()
+        if state['canceled']:
+            return
+        if not ok:
+            QMessageBox.critical(self, 'Błąd', 'Algorytm zakończony niepowodzeniem lub został przerwany.')
             return
-        finally:
-            progress.close()
 
         # Dodaj warstwy (tymczasowym nadamy stałe nazwy; z pliku – nazwa z pliku)
+        context = state['context']
         try:
-            self._add_result_layer(results, 'Wydz_lin_agreg', 'wydz_lin_agreg', dest_agreg, context)
-            self._add_result_layer(results, 'Wydz_lin_seg', 'wydz_lin_seg', dest_seg, context)
+            self._add_result_layer(results, 'Wydz_lin_agreg', 'wydz_lin_agreg', state['dest_agreg'], context)
+            self._add_result_layer(results, 'Wydz_lin_seg', 'wydz_lin_seg', state['dest_seg'], context)
         except Exception as e:
             QMessageBox.warning(self, 'Uwaga', f'Wyniki obliczeń zakończone, ale nie udało się dodać warstw:\n{e}')
             return
 
         QMessageBox.information(self, 'Zakończono', 'Przetwarzanie zakończone pomyślnie.')
-        self.accept()
\ No newline at end of file
+        self.accept()
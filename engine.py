@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+Silnik strumieniowy algorytmu wydz_liniowe.
+
+Realizuje te same etapy logiczne co łańcuch 33 kroków Processing
+(refaktoryzacja, złączenia, przycięcie, podział, pola pochodne, usuwanie
+duplikatów, filtr, agregacja), ale obiekty QgsFeature przechodzą przez nie
+w jednym przebiegu – bez tymczasowych warstw pośrednich.
+"""
+
+import heapq
+import os
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+    QgsWkbTypes,
+)
+
+from .aggregate import GroupSpill, aggregate_sorted
+from .cache import layers_key
+from .dedup import GeometryDeduplicator
+from .joins import JoinTables, as_float, as_text, is_null
+from .kernels import round_half_away
+from .spatial import (
+    Compartment,
+    CompartmentIndex,
+    CompartmentOverlay,
+    compartments_extent,
+    partition_compartments,
+)
+from .validity import load_repairs, prepared_geometries, repair_report, store_repairs
+
+TARGET_CRS = 'EPSG:2180'
+
+# (nazwa, typ, długość, precyzja) – jak w krokach 26/27 łańcucha
+SEG_FIELDS = [
+    ('id', QVariant.Double, 20, 0),
+    ('adr_les', QVariant.String, 25, 0),
+    ('kod_ob', QVariant.String, 10, 0),
+    ('dlugosc', QVariant.Double, 10, 2),
+    ('szer', QVariant.Double, 3, 1),
+    ('nazwa', QVariant.String, 50, 0),
+    ('nr_ppoz', QVariant.String, 6, 0),
+    ('nr_droga', QVariant.String, 6, 0),
+    ('nr_inw', QVariant.String, 12, 0),
+    ('SILP_pow', QVariant.Double, 10, 4),
+]
+
+# jak w krokach 28 i 30 łańcucha
+AGREG_FIELDS = [
+    ('adr_les', QVariant.String, 25, 0),
+    ('kod_ob', QVariant.String, 10, 0),
+    ('dlugosc', QVariant.Double, 10, 2),
+    ('SILP_pow', QVariant.Double, 10, 4),
+]
+
+# wpis pamięci podręcznej: oddziały po naprawie, w EPSG:2180, z adr_oddz
+CACHE_KIND = 'silnik'
+CACHE_LAYER = 'oddzialy'
+CACHE_FIELDS = [
+    ('fid_zr', QVariant.LongLong, 20, 0),
+    ('adr_oddz', QVariant.String, 25, 0),
+]
+
+# atrybuty a_kom_lin / a_line_lin przenoszone do wydz_lin_seg (krok 26)
+CARRIED_FIELDS = ('kod_ob', 'szer', 'nazwa', 'nr_ppoz', 'nr_droga', 'nr_inw')
+
+
+def _make_fields(spec) -> QgsFields:
+    fields = QgsFields()
+    for name, vtype, length, precision in spec:
+        type_name = {QVariant.Double: 'double precision', QVariant.LongLong: 'int8'}.get(vtype, 'text')
+        fields.append(QgsField(name, vtype, type_name, length, precision))
+    return fields
+
+
+def _merge_order(piece) -> tuple:
+    # (gałąź, fid obiektu źródłowego) – kolejność scalenia w kroku 19
+    return piece[0], piece[1]
+
+
+def seg_fields() -> QgsFields:
+    """Pola warstwy wynikowej wydz_lin_seg."""
+    return _make_fields(SEG_FIELDS)
+
+
+def agreg_fields() -> QgsFields:
+    """Pola warstwy wynikowej wydz_lin_agreg."""
+    return _make_fields(AGREG_FIELDS)
+
+
+# ----------------------------------------------------------------------
+# Silnik
+# ----------------------------------------------------------------------
+
+class StreamingEngine:
+    """
+    Jednoprzebiegowa wersja Wydz_liniowe.processAlgorithm.
+    'layers' to słownik warstw wejściowych pod nazwami parametrów algorytmu.
+
+    Przy workers > 1 oddziały są dzielone na spójne przestrzennie grupy,
+    a linie każdej grupy liczone w puli wątków. Każdy odcinek wynikowy
+    należy do dokładnie jednego oddziału, więc wyniki grup skleja się
+    bez dodatkowego scalania.
+    """
+
+    # słowniki, oddziały, obiekty liniowe, agregacja
+    STEPS = 4
+
+    # ile grup oddziałów na jeden wątek (wyrównanie obciążenia)
+    PARTITIONS_PER_WORKER = 4
+
+    def __init__(self, context, feedback, workers=1, profiler=None, cache=None, dedup_grid=0.0):
+        self.context = context
+        self.feedback = feedback
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.profiler = profiler
+        self.cache = cache
+        self.dedup_grid = dedup_grid
+        self.crs = QgsCoordinateReferenceSystem(TARGET_CRS)
+
+    @contextmanager
+    def _step(self, name, input_count=None):
+        """Pomiar etapu przez StepProfiler; bez profilera zwraca pusty rekord."""
+        if self.profiler is None:
+            yield {}
+            return
+        with self.profiler.step(name, 'silnik strumieniowy', input_count) as record:
+            yield record
+
+    def _transform(self, layer):
+        src = layer.crs()
+        if not src.isValid() or src == self.crs:
+            return None
+        return QgsCoordinateTransform(src, self.crs, self.context.transformContext())
+
+    # --- kroki 2, 3, 12: oddziały ---
+
+    def _prepare_compartments(self, oddz_layer, joins) -> list:
+        i_nr = oddz_layer.fields().lookupField('nr_wew')
+        xform = self._transform(oddz_layer)
+        # naprawy tylko niepoprawnych poligonów, jak krok 2 – w układzie źródłowym (validity.py)
+        key = layers_key(oddz_layer) if self.cache is not None else None
+        cached = load_repairs(self.cache, key)
+        repairs = {}
+        fixed = []
+        compartments = []
+        # z a_oddz_pol potrzebne jest tylko nr_wew
+        request = QgsFeatureRequest().setSubsetOfAttributes([i_nr] if i_nr >= 0 else [])
+        n = 0
+        for n, (f, geom, repaired) in enumerate(
+                prepared_geometries(oddz_layer.getFeatures(request), cached, self.workers), 1):
+            adr = joins.adr_les_for_nr_wew(f.attributes()[i_nr]) if i_nr >= 0 else None
+            if repaired:
+                repairs[f.id()] = geom
+                fixed.append((f.attributes()[i_nr] if i_nr >= 0 else None, adr))
+            if geom.isNull() or geom.isEmpty():
+                continue
+            if xform:
+                geom.transform(xform)
+            compartments.append(Compartment(f.id(), geom, adr))
+        if cached is None and not self.feedback.isCanceled():
+            store_repairs(self.cache, key, repairs, oddz_layer.crs())
+        self.feedback.pushInfo(repair_report(fixed, n, cached is not None))
+        return compartments
+
+    def _load_compartments(self, oddz_layer, bo_layer, joins) -> list:
+        """Oddziały z pamięci podręcznej (PreparedCache), a przy jej braku przygotowane i zapisane."""
+        key = layers_key(oddz_layer, bo_layer) if self.cache is not None else None
+        cached = self.cache.get(key, CACHE_KIND, [CACHE_LAYER]) if key else None
+        if cached:
+            layer = QgsVectorLayer(cached[CACHE_LAYER], CACHE_LAYER, 'ogr')
+            if layer.isValid():
+                self.feedback.pushInfo('Oddziały z pamięci podręcznej – bez naprawy geometrii i złączenia.')
+                return [Compartment(f['fid_zr'], f.geometry(), as_text(f['adr_oddz'])) for f in layer.getFeatures()]
+
+        compartments = self._prepare_compartments(oddz_layer, joins)
+        if key:
+            fields = _make_fields(CACHE_FIELDS)
+
+            def features():
+                for c in compartments:
+                    f = QgsFeature(fields)
+                    f.setGeometry(c.geometry)
+                    f.setAttributes([c.fid, c.adr_oddz])
+                    yield f
+
+            self.cache.put(key, CACHE_KIND, {CACHE_LAYER: (fields, QgsWkbTypes.Unknown, self.crs, features())})
+        return compartments
+
+    # --- kroki 4-18: jedna gałąź (a_kom_lin albo a_line_lin) ---
+
+    def _pieces(self, branch, joins, overlay, owned=None, rect=None, progress=None):
+        """
+        Odcinki jednej gałęzi z adr_les. 'owned' (zbiór fid oddziałów)
+        i 'rect' (zasięg w EPSG:2180) ograniczają przebieg do jednej grupy;
+        'progress' jest wołane po każdym obiekcie wejściowym.
+        """
+        source, fields, id_field, xform = branch
+        idx = {name: fields.lookupField(name) for name in ('id_kom', 'id_lin') + CARRIED_FIELDS}
+        # tylko id_kom/id_lin i pola przenoszone do wyniku – bez pozostałych kolumn
+        request = QgsFeatureRequest().setSubsetOfAttributes([i for i in idx.values() if i >= 0])
+        if rect is not None:
+            request.setFilterRect(
+                xform.transformBoundingBox(rect, QgsCoordinateTransform.ReverseTransform) if xform else rect)
+        for f in source.getFeatures(request):
+            if self.feedback.isCanceled():
+                return
+            if progress is not None:
+                progress()
+            geom = f.geometry()
+            if geom.isNull() or geom.isEmpty():
+                continue
+            if xform:
+                geom.transform(xform)
+            pieces = overlay.pieces(geom)
+            if not pieces:
+                continue
+            attrs = f.attributes()
+            values = {name: (attrs[i] if i >= 0 else None) for name, i in idx.items()}
+            for piece, candidates in pieces:
+                # odcinek na granicy oddziałów: pierwszy oddział z pasującym id_oddz
+                owner, adr_les = candidates[0], None
+                for c in candidates:
+                    adr_les = joins.adr_les_for_piece(id_field, values[id_field], c.adr_oddz)
+                    if adr_les is not None:
+                        owner = c
+                        break
+                if owned is not None and owner.fid not in owned:
+                    continue
+                yield f.id(), piece, adr_les, values
+
+    # --- kroki 19-27: scalenie, duplikaty, filtr, pola pochodne ---
+
+    def _merged_pieces(self, branches, joins, overlay, owned=None, rect=None, progress=None):
+        """
+        Krok 19: odcinki obu gałęzi (najpierw a_kom_lin) jako
+        (gałąź, fid obiektu źródłowego, odcinek, adr_les, atrybuty).
+        """
+        for n, branch in enumerate(branches):
+            for fid, piece, adr_les, values in self._pieces(branch, joins, overlay, owned, rect, progress):
+                piece.convertToMultiType()
+                yield n, fid, piece, adr_les, values
+
+    def _segments(self, pieces, joins):
+        """
+        Gotowe obiekty wydz_lin_seg z odcinków w kolejności scalenia. Jeden
+        GeometryDeduplicator na cały wynik – także przy obliczeniach
+        równoległych, bo odcinek graniczny z obu gałęzi może trafić do różnych grup.
+        """
+        # 20) duplikaty geometrii – skrót postaci kanonicznej (dedup.py)
+        dedup = GeometryDeduplicator(self.dedup_grid)
+        fields = seg_fields()
+        for _, _, piece, adr_les, values in pieces:
+            # 20) duplikaty geometrii, 21) adr_les IS NOT NULL
+            if not dedup.accept(piece) or adr_les is None:
+                continue
+            # 23-25) długość zaokrąglona do 2 miejsc, tylko > 0
+            dlugosc = round_half_away(piece.length(), 2)
+            if not dlugosc > 0:
+                continue
+            # 22) id = coalesce(id_kom, id_lin)
+            id_value = values['id_kom'] if not is_null(values['id_kom']) else values['id_lin']
+            # 26-27) kolejność atrybutów + pow z SILP
+            f = QgsFeature(fields)
+            f.setGeometry(piece)
+            f.setAttributes([
+                as_float(id_value), adr_les, as_text(values['kod_ob']), dlugosc,
+                as_float(values['szer']), as_text(values['nazwa']),
+                as_text(values['nr_ppoz']), as_text(values['nr_droga']),
+                as_text(values['nr_inw']), joins.pow_for_adr_les(adr_les),
+            ])
+            yield f
+
+    def _partition_pieces(self, branches, joins, index, group) -> list:
+        """
+        Zadanie wątku: odcinki należące do jednej grupy oddziałów, przed krokiem 20,
+        uporządkowane wg (gałąź, fid) – jak w przebiegu jednowątkowym.
+        """
+        rect = compartments_extent(group)
+        # własne kopie oddziałów – przygotowane geometrie nie są współdzielone
+        local = CompartmentIndex([c.copy() for c in index.in_rect(rect)])
+        owned = {c.fid for c in group}
+        pieces = list(self._merged_pieces(branches, joins, CompartmentOverlay(local), owned, rect))
+        pieces.sort(key=_merge_order)
+        return pieces
+
+    def run(self, layers: dict, seg_sink, agreg_sink) -> dict:
+        feedback = self.feedback
+
+        # kroki 0, 1, 3, 7, 8, 9 i 27 – słowniki złączeń budowane raz
+        tables = [layers[k] for k in ('wydzielenia_nr_wew_formularz_z_bo', 'a_kom_adbf', 'a_line_adbf')]
+        with self._step('Słowniki złączeń', sum(t.featureCount() for t in tables)) as record:
+            joins = JoinTables.build(*tables, feedback)
+            record['wyjscie'] = len(joins.nr_wew_to_adr) + len(joins.adr_to_pow) + sum(
+                len(d) for d in joins.id_oddz_to_adr.values())
+
+        feedback.setCurrentStep(1)
+        if feedback.isCanceled():
+            return {}
+        # kroki 4-6 i 10-14 – jedna nakładka linia/oddziały na wspólnym indeksie
+        oddz_layer = layers['a_oddz_polshp']
+        with self._step('Oddziały', oddz_layer.featureCount()) as record:
+            compartments = self._load_compartments(
+                oddz_layer, layers['wydzielenia_nr_wew_formularz_z_bo'], joins)
+            index = CompartmentIndex(compartments)
+            record['wyjscie'] = len(compartments)
+
+        # krok 19 – kolejność scalania jak w native:mergevectorlayers: najpierw a_kom_lin;
+        # QgsVectorLayerFeatureSource pozwala czytać warstwę z wątków roboczych
+        branches = []
+        for key, id_field in (('a_kom_linshp', 'id_kom'), ('a_line_linshp', 'id_lin')):
+            layer = layers[key]
+            branches.append((QgsVectorLayerFeatureSource(layer), layer.fields(), id_field, self._transform(layer)))
+
+        feedback.setCurrentStep(2)
+        # kroki 28-30 – segmenty porządkowane wg adr_les na dysku (aggregate.py)
+        with GroupSpill() as spill:
+            return self._write_outputs(layers, joins, index, compartments, branches, spill, seg_sink, agreg_sink)
+
+    def _write_outputs(self, layers, joins, index, compartments, branches, spill, seg_sink, agreg_sink) -> dict:
+        feedback = self.feedback
+        seg_count = 0
+
+        def write(features):
+            nonlocal seg_count
+            for f in features:
+                seg_sink.addFeature(f, QgsFeatureSink.FastInsert)
+                attrs = f.attributes()
+                spill.add(attrs[1], attrs[2], attrs[9], attrs[3], f.geometry())
+                seg_count += 1
+
+        line_count = sum(layers[key].featureCount() for key in ('a_kom_linshp', 'a_line_linshp'))
+        with self._step('Obiekty liniowe', line_count) as record:
+            if self.workers > 1 and len(compartments) > 1:
+                groups = partition_compartments(compartments, self.workers * self.PARTITIONS_PER_WORKER)
+                feedback.pushInfo(f'Obliczenia równoległe: {len(groups)} grup oddziałów, {self.workers} wątków.')
+                with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                    futures = [pool.submit(self._partition_pieces, branches, joins, index, g) for g in groups]
+                    parts = []
+                    for n, future in enumerate(futures):
+                        if feedback.isCanceled():
+                            for pending in futures:
+                                pending.cancel()
+                            return {}
+                        parts.append(future.result())
+                        feedback.setProgress(100.0 * (n + 1) / len(futures))
+                # scalenie grup w kolejności przebiegu jednowątkowego (gałąź, obiekt źródłowy;
+                # przy równych – kolejność grup) i jedno usuwanie duplikatów dla całości
+                write(self._segments(heapq.merge(*parts, key=_merge_order), joins))
+            else:
+                total = line_count or 1
+                done = 0
+
+                def progress():
+                    nonlocal done
+                    done += 1
+                    feedback.setProgress(100.0 * done / total)
+
+                # zasięg wszystkich oddziałów jako filterRect – linie spoza niego nie są czytane
+                rect = compartments_extent(compartments) if compartments else None
+                pieces = self._merged_pieces(branches, joins, CompartmentOverlay(index), rect=rect, progress=progress)
+                write(self._segments(pieces, joins))
+            record['wyjscie'] = seg_count
+        if feedback.isCanceled():
+            return {}
+
+        feedback.setCurrentStep(3)
+        afields = agreg_fields()
+        agreg_count = 0
+        done = 0
+        with self._step('Agregacja', seg_count) as record:
+            # grupa zapisywana zaraz po zamknięciu; first_value kod_ob i SILP_pow,
+            # długość liczona od nowa z zebranej geometrii (krok 30)
+            for adr_les, kod_ob, silp_pow, _, geom in aggregate_sorted(spill.rows()):
+                if feedback.isCanceled():
+                    return {}
+                f = QgsFeature(afields)
+                f.setGeometry(geom)
+                f.setAttributes([adr_les, kod_ob, geom.length(), silp_pow])
+                agreg_sink.addFeature(f, QgsFeatureSink.FastInsert)
+                agreg_count += 1
+                done += geom.constGet().numGeometries()
+                feedback.setProgress(100.0 * min(done, seg_count) / (seg_count or 1))
+            record['wyjscie'] = agreg_count
+
+        return {'seg': seg_count, 'agreg': agreg_count}
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Tryb przyrostowy Wydz_liniowe_auto.
+
+Dla każdego oddziału (adres trim(substr(adr_les,1,17))) liczony jest odcisk
+jego wejść: geometria i atrybuty poligonu a_oddz_pol, linii a_kom_lin /
+a_line_lin, które go przecinają, wierszy a_kom_a / a_line_a i wierszy
+raportu BO z tym adresem. Manifest z odciskami zapisywany jest obok
+wyników. Przy kolejnym uruchomieniu przeliczane są tylko oddziały o
+zmienionym odcisku – razem z sąsiadami, żeby odcinki na wspólnych
+granicach trafiły do tego samego oddziału co w pełnym przebiegu – a w
+wynikowych GeoPackage podmieniane są tylko obiekty tych oddziałów.
+"""
+
+import hashlib
+import json
+import os
+from collections import defaultdict
+
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsVectorLayer,
+)
+
+from .joins import JoinTables, as_text, attribute_rows, oddz_address
+from .pushdown import compartment_rect, rect_request
+from .spatial import Compartment, CompartmentIndex
+from .validity import repair
+
+MANIFEST_VERSION = 1
+
+# powyżej tego udziału zmienionych oddziałów pełny przebieg jest tańszy
+FULL_RUN_SHARE = 0.5
+
+# warstwy liniowe: parametr bazowego modelu -> pole identyfikatora
+LINE_LAYERS = (('a_kom_linshp', 'id_kom'), ('a_line_linshp', 'id_lin'))
+
+# parametry bazowego modelu zmieniające wynik – inne wartości niż w manifeście = pełne obliczenie
+RESULT_PARAMETERS = ('silnik', 'siatka_duplikatow')
+
+
+def manifest_path(agreg_path: str) -> str:
+    """Manifest leży obok wydz_lin_agreg: wydz_lin_agreg.manifest.json."""
+    return os.path.splitext(agreg_path.split('|')[0])[0] + '.manifest.json'
+
+
+def result_settings(params: dict) -> dict:
+    """Wartości RESULT_PARAMETERS z parametrów bazowego modelu (w postaci jak po odczycie JSON)."""
+    return json.loads(json.dumps({name: params.get(name) for name in RESULT_PARAMETERS}))
+
+
+def load_manifest(path: str, folder: str, settings: dict = None):
+    """
+    Odciski z poprzedniego przebiegu dla tego samego folderu SLMN i tych samych
+    parametrów wpływających na wynik (None, gdy brak/nieaktualny).
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('wersja') != MANIFEST_VERSION:
+        return None
+    if os.path.normcase(os.path.abspath(manifest.get('folder', ''))) != os.path.normcase(os.path.abspath(folder)):
+        return None
+    if manifest.get('parametry') != (settings or {}):
+        return None
+    return manifest.get('oddzialy')
+
+
+def save_manifest(path: str, folder: str, fingerprints: dict, settings: dict = None):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'wersja': MANIFEST_VERSION, 'folder': os.path.abspath(folder),
+                   'parametry': settings or {}, 'oddzialy': fingerprints},
+                  f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _digest(*parts) -> bytes:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else repr(as_text(part)).encode('utf-8'))
+        h.update(b'\x1f')
+    return h.digest()
+
+
+def _wkb(geom) -> bytes:
+    return b'' if geom is None or geom.isNull() else bytes(geom.asWkb())
+
+
+class CompartmentFingerprints:
+    """Odciski wejść oddziałów oraz obiekty wejściowe potrzebne do ich przeliczenia."""
+
+    def __init__(self):
+        self._digests = defaultdict(list)
+        self._oddz_fids = defaultdict(list)
+        self._line_fids = {key: defaultdict(set) for key, _ in LINE_LAYERS}
+        self._compartments = []
+        self._index = None
+
+    @classmethod
+    def build(cls, bo_layer, oddz_layer, kom_a, line_a, line_layers: dict, feedback=None):
+        prints = cls()
+        joins = JoinTables.build(bo_layer, kom_a, line_a)
+
+        # raport BO – wiersze należą do oddziału z ich adr_les
+        for nr_wew, adr, pow_value in attribute_rows(bo_layer, ('nr_wew', 'adr_les', 'pow')):
+            prints._digests[oddz_address(adr)].append(_digest('bo', nr_wew, adr, pow_value))
+
+        # a_kom_a / a_line_a – oddział z adr_les przypisanego przez nr_wew
+        for table, id_field in ((kom_a, 'id_kom'), (line_a, 'id_lin')):
+            for nr_wew, id_value in attribute_rows(table, ('nr_wew', id_field)):
+                address = oddz_address(joins.adr_les_for_nr_wew(nr_wew))
+                prints._digests[address].append(_digest(id_field, id_value, nr_wew))
+
+        # a_oddz_pol – naprawione geometrie w indeksie (odpowiednik kroku 2)
+        i_nr = oddz_layer.fields().lookupField('nr_wew')
+        request = QgsFeatureRequest().setSubsetOfAttributes([i_nr] if i_nr >= 0 else [])
+        for f in oddz_layer.getFeatures(request):
+            if feedback is not None and feedback.isCanceled():
+                return prints
+            nr_wew = f.attributes()[i_nr] if i_nr >= 0 else None
+            address = oddz_address(joins.adr_les_for_nr_wew(nr_wew))
+            geom = f.geometry()
+            if address is None or geom.isNull() or geom.isEmpty():
+                continue
+            prints._digests[address].append(_digest('oddz', _wkb(geom), nr_wew))
+            prints._oddz_fids[address].append(f.id())
+            # naprawa tylko niepoprawnych (validity.py) – sprawdzenie jest tańsze niż makeValid
+            if not geom.isGeosValid():
+                geom = repair(geom)
+            if not geom.isEmpty():
+                prints._compartments.append(Compartment(f.id(), geom, address))
+        prints._index = CompartmentIndex(prints._compartments)
+
+        # linie – odcisk trafia do każdego oddziału, który linia przecina
+        for key, _ in LINE_LAYERS:
+            layer = line_layers[key]
+            xform = None
+            if layer.crs().isValid() and oddz_layer.crs().isValid() and layer.crs() != oddz_layer.crs():
+                xform = QgsCoordinateTransform(layer.crs(), oddz_layer.crs(), layer.transformContext())
+            # linie spoza zasięgu oddziałów nie trafiają do żadnego odcisku
+            request = rect_request(compartment_rect(oddz_layer, layer, layer.transformContext()))
+            for f in layer.getFeatures(request):
+                if feedback is not None and feedback.isCanceled():
+                    return prints
+                geom = f.geometry()
+                if geom.isNull() or geom.isEmpty():
+                    continue
+                if xform:
+                    geom.transform(xform)
+                found = prints._index.candidates(geom)
+                if not found:
+                    continue
+                digest = _digest(key, _wkb(f.geometry()), *f.attributes())
+                for c in found:
+                    prints._digests[c.adr_oddz].append(digest)
+                    prints._line_fids[key][c.adr_oddz].add(f.id())
+        return prints
+
+    def fingerprints(self) -> dict:
+        """{adres oddziału: skrót}; kolejność obiektów nie wpływa na wynik."""
+        return {address: hashlib.sha256(b''.join(sorted(digests))).hexdigest()
+                for address, digests in self._digests.items() if address}
+
+    def with_neighbours(self, addresses) -> set:
+        """Oddziały 'addresses' i oddziały, które się z nimi stykają."""
+        result = set(addresses)
+        for c in self._compartments:
+            if c.adr_oddz in addresses:
+                result.update(n.adr_oddz for n in self._index.candidates(c.geometry))
+        return result
+
+    def oddz_fids(self, addresses) -> list:
+        return sorted({fid for a in addresses for fid in self._oddz_fids.get(a, ())})
+
+    def line_fids(self, key, addresses) -> list:
+        fids = self._line_fids[key]
+        return sorted({fid for a in addresses for fid in fids.get(a, ())})
+
+
+def subset_layer(layer, fids) -> QgsVectorLayer:
+    """Warstwa tymczasowa z wybranymi obiektami (te same pola i CRS)."""
+    return layer.materialize(QgsFeatureRequest().setFilterFids(fids))
+
+
+def replace_features(path: str, source, changed, removed) -> tuple:
+    """
+    Usuwa z warstwy 'path' obiekty oddziałów changed ∪ removed i dopisuje
+    z 'source' (None – nic do dopisania) obiekty oddziałów changed.
+    Zwraca (usunięte, dodane).
+    """
+    target = QgsVectorLayer(path, 'wynik', 'ogr')
+    if not target.isValid():
+        raise OSError(f'Nie można otworzyć warstwy wynikowej: {path}')
+    fields = target.fields()
+    i_adr = fields.lookupField('adr_les')
+    stale = set(changed) | set(removed)
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([i_adr])
+    fids = [f.id() for f in target.getFeatures(request) if oddz_address(f.attributes()[i_adr]) in stale]
+
+    added = []
+    mapping = [(fields.lookupField(field.name()), n) for n, field in enumerate(source.fields())
+               if field.name().lower() != 'fid'] if source is not None else []
+    i_src = source.fields().lookupField('adr_les') if source is not None else -1
+    for f in (source.getFeatures() if source is not None else ()):
+        attrs = f.attributes()
+        if oddz_address(attrs[i_src]) not in changed:
+            continue
+        out = QgsFeature(fields)
+        out.setGeometry(f.geometry())
+        for i_dst, i in mapping:
+            if i_dst >= 0:
+                out.setAttribute(i_dst, attrs[i])
+        added.append(out)
+
+    provider = target.dataProvider()
+    if fids and not provider.deleteFeatures(fids):
+        raise OSError(f'Nie udało się usunąć obiektów z {path}')
+    if added and not provider.addFeatures(added)[0]:
+        raise OSError(f'Nie udało się dopisać obiektów do {path}')
+    return len(fids), len(added)
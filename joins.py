@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Złączenia atrybutowe silnika strumieniowego (hash join).
+
+Łańcuch Processing wykonuje złączenia w krokach 1, 3, 8 (algorithm_join.py),
+17, 18 i 27 – za każdym razem czytając od nowa formularz z BO albo
+a_kom_a/a_line_a i zapisując nową warstwę. Tutaj słowniki
+nr_wew -> adr_les, id_oddz -> adr_les i adr_les -> pow budowane są raz
+na przebieg, a obiekty liniowe tylko odpytują je w locie. Tabele DBF są
+czytane bezpośrednio (dbf.py), bez tworzenia obiektów QgsFeature.
+"""
+
+import sys
+
+from qgis.core import NULL, QgsFeatureRequest
+
+from .dbf import DbfTable, dbf_path
+
+
+# ----------------------------------------------------------------------
+# Konwersje wartości – odpowiedniki semantyki wyrażeń QGIS
+# ----------------------------------------------------------------------
+
+def is_null(value) -> bool:
+    return value is None or value == NULL
+
+
+def as_text(value):
+    """Postać tekstowa jak przy operatorze || w wyrażeniach QGIS (NULL -> None)."""
+    if is_null(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def as_float(value):
+    """Rzutowanie na double jak w native:refactorfields (NULL/nieliczbowe -> None)."""
+    if is_null(value):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def join_key(value):
+    """
+    Klucz złączenia atrybutowego.
+    nr_wew bywa int8 (formularz z BO), liczbą N w DBF albo tekstem –
+    liczby całkowite sprowadzamy do int, żeby 123, 123.0 i '123' się łączyły.
+    """
+    if is_null(value):
+        return None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, int):
+        return value
+    text = str(value)
+    stripped = text.strip()
+    if stripped.lstrip('-').isdigit():
+        return int(stripped)
+    return text
+
+
+def oddz_address(adr):
+    """trim(substr(adr_les, 1, 17)) – adres oddziału zawarty w adresie leśnym."""
+    text = as_text(adr)
+    if text is None:
+        return None
+    return text[:17].strip()
+
+
+def id_oddz(id_value, adr):
+    """"id" || trim(substr(adr, 1, 17)) – kroki 7, 9, 15 i 16."""
+    prefix = as_text(id_value)
+    address = oddz_address(adr)
+    if prefix is None or address is None:
+        return None
+    return prefix + address
+
+
+def _attribute_request(layer, names) -> QgsFeatureRequest:
+    """Żądanie bez geometrii, tylko z kolumnami potrzebnymi do złączenia."""
+    fields = layer.fields()
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([n for n in names if fields.lookupField(n) >= 0], fields)
+    return request
+
+
+def attribute_rows(layer, names):
+    """
+    Wiersze tabeli jako krotki wartości kolumn 'names' (None dla brakujących).
+    Plik DBF jest czytany bezpośrednio, pozostałe źródła przez OGR.
+    """
+    path = dbf_path(layer)
+    if path is not None:
+        try:
+            table = DbfTable(path)
+        except (OSError, ValueError):
+            table = None
+        if table is not None:
+            with table:
+                yield from table.rows(names)
+            return
+    fields = layer.fields()
+    idx = [fields.lookupField(n) for n in names]
+    for f in layer.getFeatures(_attribute_request(layer, names)):
+        attrs = f.attributes()
+        yield tuple(attrs[i] if i >= 0 else None for i in idx)
+
+
+class JoinTables:
+    """
+    Słowniki złączeń budowane raz na przebieg.
+
+    Semantyka jak METHOD 1 native:joinattributestable (jeden do jednego,
+    wygrywa pierwszy pasujący rekord; NULL nie łączy się z niczym).
+    Teksty adr_les są internowane, więc trzy słowniki współdzielą te same
+    obiekty napisów zamiast trzymać setki tysięcy kopii.
+    """
+
+    def __init__(self):
+        self.nr_wew_to_adr = {}
+        self.adr_to_pow = {}
+        # osobno dla a_kom_a (id_kom) i a_line_a (id_lin)
+        self.id_oddz_to_adr = {'id_kom': {}, 'id_lin': {}}
+
+    @classmethod
+    def build(cls, bo_layer, kom_a, line_a, feedback=None) -> 'JoinTables':
+        tables = cls()
+        tables._load_bo(bo_layer)
+        for table, id_field in ((kom_a, 'id_kom'), (line_a, 'id_lin')):
+            if feedback is not None and feedback.isCanceled():
+                break
+            tables._load_slmn_table(table, id_field)
+        if feedback is not None:
+            feedback.pushInfo(
+                f'Słowniki złączeń: nr_wew {len(tables.nr_wew_to_adr)}, '
+                f'id_kom {len(tables.id_oddz_to_adr["id_kom"])}, '
+                f'id_lin {len(tables.id_oddz_to_adr["id_lin"])}, '
+                f'adr_les {len(tables.adr_to_pow)}')
+        return tables
+
+    # --- kroki 0 i 27: formularz z BO ---
+
+    def _load_bo(self, bo_layer):
+        nr_wew_to_adr, adr_to_pow = self.nr_wew_to_adr, self.adr_to_pow
+        for nr_value, adr_value, pow_value in attribute_rows(bo_layer, ('nr_wew', 'adr_les', 'pow')):
+            adr = as_text(adr_value)
+            if adr is not None:
+                adr = sys.intern(adr)
+            nr = join_key(nr_value)
+            if nr is not None and nr not in nr_wew_to_adr:
+                nr_wew_to_adr[nr] = adr
+            key = join_key(adr)
+            if key is not None and key not in adr_to_pow:
+                adr_to_pow[key] = as_float(pow_value)
+
+    # --- kroki 1/7 i 8/9: a_kom_a / a_line_a ---
+
+    def _load_slmn_table(self, table, id_field):
+        lookup, nr_wew_to_adr = self.id_oddz_to_adr[id_field], self.nr_wew_to_adr
+        for nr_value, id_value in attribute_rows(table, ('nr_wew', id_field)):
+            adr = nr_wew_to_adr.get(join_key(nr_value))
+            key = id_oddz(id_value, adr)
+            if key is not None and key not in lookup:
+                lookup[key] = adr
+
+    # --- zapytania w trakcie strumienia ---
+
+    def adr_les_for_nr_wew(self, nr_wew):
+        """Kroki 1, 3 i 8."""
+        return self.nr_wew_to_adr.get(join_key(nr_wew))
+
+    def adr_les_for_piece(self, id_field, id_value, adr_oddz):
+        """Kroki 15-18: adr_les odcinka po id_oddz = id || trim(substr(adr_oddz,1,17))."""
+        key = id_oddz(id_value, adr_oddz)
+        if key is None:
+            return None
+        return self.id_oddz_to_adr[id_field].get(key)
+
+    def pow_for_adr_les(self, adr_les):
+        """Krok 27."""
+        return self.adr_to_pow.get(join_key(adr_les))
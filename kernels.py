@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Obliczenia wektorowe na wielu geometriach naraz (NumPy).
+
+Długość planarna liczona jest z WKB: współrzędne wszystkich linii trafiają
+do jednej tablicy, długości odcinków liczone są jedną operacją, a sumy na
+część i na obiekt przez reduceat/add.at. Wynik odpowiada
+QgsGeometry.length() (suma sqrt(dx² + dy²) po wierzchołkach, bez Z)
+z dokładnością do kolejności sumowania. Geometrie krzywoliniowe, kolekcje
+i WKB big-endian liczone są przez QgsGeometry.length(). Bez NumPy całość
+liczona jest przez QgsGeometry.length().
+"""
+
+import math
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # NumPy jest w instalacjach QGIS, ale nie jest wymagany
+    np = None
+
+_WKB_LINESTRING = 2
+_WKB_MULTILINESTRING = 5
+_UINT = struct.Struct('<I')
+
+
+def _flat_type(code: int):
+    """(typ płaski, liczba współrzędnych) dla kodu WKB ISO albo EWKB."""
+    dim = 2
+    if code & 0x80000000:
+        dim += 1
+    if code & 0x40000000:
+        dim += 1
+    code &= 0x0FFFFFFF
+    thousands, flat = divmod(code, 1000)
+    dim += {0: 0, 1: 1, 2: 1, 3: 2}.get(thousands, 0)
+    return flat, dim
+
+
+def _line_parts(wkb: bytes):
+    """
+    Bloki współrzędnych linii: [(początek, liczba punktów, wymiar)] albo
+    None, gdy geometria wymaga QgsGeometry.length().
+    """
+    if len(wkb) < 9 or wkb[0] != 1:
+        return None
+    flat, dim = _flat_type(_UINT.unpack_from(wkb, 1)[0])
+    if flat == _WKB_LINESTRING:
+        return [(9, _UINT.unpack_from(wkb, 5)[0], dim)]
+    if flat != _WKB_MULTILINESTRING:
+        return None
+    parts = []
+    pos = 9
+    for _ in range(_UINT.unpack_from(wkb, 5)[0]):
+        if wkb[pos] != 1:
+            return None
+        part_flat, part_dim = _flat_type(_UINT.unpack_from(wkb, pos + 1)[0])
+        if part_flat != _WKB_LINESTRING:
+            return None
+        count = _UINT.unpack_from(wkb, pos + 5)[0]
+        parts.append((pos + 9, count, part_dim))
+        pos += 9 + count * part_dim * 8
+    return parts
+
+
+def planar_lengths(geometries) -> list:
+    """Długości planarne listy QgsGeometry (0 dla pustych i NULL)."""
+    lengths = [0.0] * len(geometries)
+    if np is None:
+        for n, geom in enumerate(geometries):
+            if geom is not None and not geom.isNull():
+                lengths[n] = geom.length()
+        return lengths
+
+    # bloki pogrupowane wg wymiaru (2D, Z/M, ZM) – każda grupa to jedna tablica
+    groups = {}
+    for n, geom in enumerate(geometries):
+        if geom is None or geom.isNull() or geom.isEmpty():
+            continue
+        wkb = bytes(geom.asWkb())
+        parts = _line_parts(wkb)
+        if parts is None:
+            lengths[n] = geom.length()
+            continue
+        for start, count, dim in parts:
+            if count < 2:
+                continue
+            blocks, counts, owners = groups.setdefault(dim, ([], [], []))
+            blocks.append(wkb[start:start + count * dim * 8])
+            counts.append(count)
+            owners.append(n)
+
+    result = np.asarray(lengths, dtype='<f8')
+    for dim, (blocks, counts, owners) in groups.items():
+        coords = np.frombuffer(b''.join(blocks), dtype='<f8').reshape(-1, dim)
+        dx = np.diff(coords[:, 0])
+        dy = np.diff(coords[:, 1])
+        segments = np.sqrt(dx * dx + dy * dy)
+        counts = np.asarray(counts, dtype=np.int64)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        # odcinki łączące ostatni punkt części z pierwszym punktem następnej
+        segments = np.delete(segments, starts[1:] - 1)
+        seg_starts = np.concatenate(([0], np.cumsum(counts - 1)[:-1]))
+        np.add.at(result, np.asarray(owners, dtype=np.int64), np.add.reduceat(segments, seg_starts))
+    return result.tolist()
+
+
+def round_half_away(value: float, places: int) -> float:
+    """round() z wyrażeń QGIS: std::round(x * 10^n) / 10^n (połówki od zera)."""
+    scale = 10.0 ** places
+    scaled = abs(value) * scale
+    return math.copysign(math.floor(scaled + 0.5) / scale, value)
+
+
+def round_half_away_all(values, places: int) -> list:
+    """round_half_away dla wielu wartości naraz."""
+    if np is None:
+        return [round_half_away(v, places) for v in values]
+    scale = 10.0 ** places
+    array = np.asarray(values, dtype='<f8')
+    return (np.copysign(np.floor(np.abs(array) * scale + 0.5), array) / scale).tolist()
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Plan kolumn łańcucha: które pola i czy geometria są naprawdę potrzebne.
+
+Algorytmy Processing przepisują do wyniku wszystkie pola i geometrię
+wejścia, choć dalsze kroki korzystają z kilku kolumn – a_kom_a.dbf
+i a_line_a.dbf są potrzebne tylko jako (nr_wew, id_kom/id_lin), raport
+BO jako (nr_wew, adr_les, pow) bez geometrii, a krok 26 i tak zostawia
+dziewięć pól. ColumnPlan przechodzi graf etapów (dag.StageGraph) od
+wyników do wejść i dla każdego etapu wyznacza zbiór pól, z których
+korzystają jego odbiorcy (None = wszystkie), oraz to, czy potrzebują
+geometrii. Na tej podstawie:
+
+  - wejścia łańcucha czytane są raz z setSubsetOfAttributes / NoGeometry
+    i zastępowane warstwą tymczasową tylko z potrzebnymi kolumnami,
+  - etapy lmn:* (pola wyliczane, usuwanie duplikatów, złączenie adr_les)
+    dostają parametr POLA i odrzucają zbędne kolumny w tym samym przebiegu
+    (złączenie adr_les czyta tabele DBF samo, więc jego wejścia zostają
+    bez kopii).
+
+Nieznany algorytm traktowany jest zachowawczo – potrzebuje wszystkiego.
+"""
+
+import re
+
+from qgis.core import QgsFeatureRequest, QgsFields, QgsProcessingUtils, QgsVectorLayer, QgsWkbTypes
+
+from .dag import Ref
+
+# wejście z geometrią przycinane, gdy odpada co najmniej taka część pól
+# (kopia geometrii kosztuje – zwraca się dopiero przy wielu zbędnych kolumnach)
+GEOMETRY_PRUNE_SHARE = 0.5
+
+# algorytmy przepisujące pola wejścia INPUT bez zmian (i korzystające z geometrii)
+PASS_THROUGH = {
+    'native:fixgeometries': True,
+    'native:clip': True,
+    'native:splitwithlines': True,
+    'native:polygonstolines': True,
+    'native:reprojectlayer': True,
+    'lmn:usun_duplikaty_geometrii': True,
+}
+
+# parametry nakładek – tylko geometria, bez pól
+OVERLAY_PARAMS = {'native:clip': 'OVERLAY', 'native:splitwithlines': 'LINES'}
+
+# algorytmy lmn:* z parametrem POLA (odrzucenie zbędnych kolumn w przebiegu)
+PRUNABLE = ('lmn:pola_pochodne', 'lmn:usun_duplikaty_geometrii', 'lmn:zlacz_adr_les')
+
+_QUOTED = re.compile(r'"([^"]+)"')
+_BARE = re.compile(r'^\s*(\w+)\s*$')
+
+
+def expression_fields(expression) -> set:
+    """Pola użyte w wyrażeniu QGIS: nazwy w cudzysłowach albo samo pole."""
+    if not expression:
+        return set()
+    names = set(_QUOTED.findall(expression))
+    bare = _BARE.match(expression)
+    if bare and not names:
+        names.add(bare.group(1))
+    return names
+
+
+def _union(a, b):
+    return None if a is None or b is None else a | b
+
+
+def _minus(need, names):
+    return None if need is None else need - set(names)
+
+
+class _Need:
+    __slots__ = ('fields', 'geometry')
+
+    def __init__(self, fields=frozenset(), geometry=False):
+        self.fields = set(fields) if fields is not None else None
+        self.geometry = geometry
+
+    def add(self, fields, geometry):
+        self.fields = _union(self.fields, None if fields is None else set(fields))
+        self.geometry = self.geometry or geometry
+
+
+def _input_needs(stage, need) -> list:
+    """[(nazwa parametru, wartość, pola, geometria)] – czego etap potrzebuje od wejść."""
+    alg, params = stage.alg_id, stage.params
+    fields, geometry = need.fields, need.geometry
+
+    if alg in PASS_THROUGH:
+        result = [('INPUT', params.get('INPUT'), fields, PASS_THROUGH[alg])]
+        if alg in OVERLAY_PARAMS:
+            name = OVERLAY_PARAMS[alg]
+            result.append((name, params.get(name), set(), True))
+        return result
+    if alg == 'native:refactorfields':
+        mapping = params.get('FIELDS_MAPPING') or []
+        used = set()
+        for m in mapping:
+            if fields is None or m['name'] in fields:
+                used |= expression_fields(m.get('expression'))
+        return [('INPUT', params.get('INPUT'), used, geometry)]
+    if alg == 'native:extractbyexpression':
+        expression = params.get('EXPRESSION') or ''
+        return [('INPUT', params.get('INPUT'), _union(fields, expression_fields(expression)),
+                 geometry or '$' in expression or 'geometry' in expression)]
+    if alg == 'native:fieldcalculator':
+        return [('INPUT', params.get('INPUT'),
+                 _union(_minus(fields, [params.get('FIELD_NAME')]), expression_fields(params.get('FORMULA'))),
+                 geometry or '$' in (params.get('FORMULA') or ''))]
+    if alg == 'native:joinattributestable':
+        prefix = params.get('PREFIX') or ''
+        copied = params.get('FIELDS_TO_COPY') or []
+        # puste FIELDS_TO_COPY – złączenie kopiuje wszystkie pola INPUT_2
+        return [('INPUT', params.get('INPUT'),
+                 _union(_minus(fields, [prefix + c for c in copied]), {params.get('FIELD')}), geometry),
+                ('INPUT_2', params.get('INPUT_2'), {params.get('FIELD_2')} | set(copied) if copied else None, False)]
+    if alg == 'native:joinattributesbylocation':
+        prefix = params.get('PREFIX') or ''
+        copied = params.get('JOIN_FIELDS') or []
+        return [('INPUT', params.get('INPUT'), _minus(fields, [prefix + c for c in copied]), True),
+                ('JOIN', params.get('JOIN'), set(copied) if copied else None, True)]
+    if alg == 'native:mergevectorlayers':
+        # pola 'layer' i 'path' dodaje scalenie
+        return [('LAYERS', layer, _minus(fields, ['layer', 'path']), geometry)
+                for layer in params.get('LAYERS') or []]
+    if alg == 'lmn:pola_pochodne':
+        from .derived import parse_rules
+        rules = parse_rules(params.get('REGULY') or '')
+        produced = {name for name, _, _ in rules}
+        used = {arg for _, function, args in rules if function != 'dlugosc' for arg in args}
+        positive = params.get('TYLKO_DODATNIE')
+        if positive:
+            used.add(positive)
+        return [('INPUT', params.get('INPUT'), _union(_minus(fields, produced), used - produced),
+                 geometry or any(function == 'dlugosc' for _, function, _ in rules))]
+    if alg == 'lmn:zlacz_adr_les':
+        # tabele DBF czytane bezpośrednio (dbf.py) tylko z kolumnami z POLA –
+        # kopia warstwy przez OGR zniweczyłaby ten odczyt
+        return [('INPUT', params.get('INPUT'), None, geometry),
+                ('BO', params.get('BO'), None, False)]
+    if alg == 'lmn:napraw_niepoprawne_geometrie':
+        # fid wejścia są kluczem napraw w pamięci podręcznej – wejście bez przycinania
+        return [('INPUT', params.get('INPUT'), None, True),
+                ('BO', params.get('BO'), {'nr_wew', 'adr_les'}, False)]
+    if alg == 'lmn:dlugosci_segmentow':
+        return [('INPUT', params.get('INPUT'), _minus(fields, [params.get('FIELD_NAME') or 'dlugosc']), True)]
+    if alg == 'lmn:agreguj_wg_adr_les':
+        return [('INPUT', params.get('INPUT'), {'adr_les', 'kod_ob', 'SILP_pow', 'dlugosc'}, True)]
+    # nieznany algorytm – wszystkie wejścia w całości
+    return [(name, value, None, True) for name, value in params.items() if name != 'OUTPUT']
+
+
+def _value_key(value):
+    # ścieżki porównywane wartością, warstwy i inne obiekty – tożsamością
+    return value if isinstance(value, str) else id(value)
+
+
+class ColumnPlan:
+    """
+    Zapotrzebowanie na kolumny w grafie etapów. 'outputs' to klucze etapów,
+    których wynik trafia do użytkownika (potrzebne w całości).
+    """
+
+    def __init__(self, graph, outputs=()):
+        self._graph = graph
+        self._needs = {stage.key: _Need() for stage in graph.stages()}
+        self._external = {}
+        for key in outputs:
+            self._needs[key] = _Need(None, True)
+        # od końca – odbiorcy mają wyższe numery kroków niż ich wejścia
+        for stage in reversed(graph.stages()):
+            for _, value, fields, geometry in _input_needs(stage, self._needs[stage.key]):
+                if isinstance(value, Ref):
+                    if value.key in self._needs:
+                        self._needs[value.key].add(fields, geometry)
+                elif isinstance(value, (str, QgsVectorLayer)):
+                    self._external.setdefault(_value_key(value), (value, _Need()))[1].add(fields, geometry)
+
+    def fields(self, key):
+        """Pola wyniku etapu 'key', z których korzystają odbiorcy (None = wszystkie)."""
+        return self._needs[key].fields
+
+    def geometry(self, key) -> bool:
+        return self._needs[key].geometry
+
+    def inputs(self) -> list:
+        """[(wartość parametru wejściowego spoza grafu, pola albo None, geometria)]."""
+        return [(value, need.fields, need.geometry) for value, need in self._external.values()]
+
+    def apply(self, context, feedback=None, rects=()) -> int:
+        """
+        Przycina wejścia łańcucha (warstwy tymczasowe w kontekście zamiast
+        oryginałów w parametrach etapów) i ustawia POLA etapów lmn:*.
+        'rects' to pary (wartość parametru wejściowego, prostokąt w układzie
+        tej warstwy) – obiekty spoza prostokąta odpadają w tym samym odczycie
+        (pushdown.py). Zwraca liczbę przyciętych wejść.
+        """
+        rect_for = {_value_key(value): rect for value, rect in rects if rect is not None}
+        replaced = {}
+        for value, fields, geometry in self.inputs():
+            layer = value if isinstance(value, QgsVectorLayer) else \
+                QgsProcessingUtils.mapLayerFromString(value, context)
+            rect = rect_for.get(_value_key(value))
+            pruned = prune_layer(layer, fields, geometry, rect) if isinstance(layer, QgsVectorLayer) else None
+            if pruned is None:
+                continue
+            context.temporaryLayerStore().addMapLayer(pruned)
+            replaced[_value_key(value)] = pruned.id()
+            if feedback is not None:
+                kept = pruned.fields().count()
+                feedback.pushInfo(f'{layer.name()}: {kept} z {layer.fields().count()} pól'
+                                  + ('' if geometry else ', bez geometrii')
+                                  + (f', {pruned.featureCount()} z {layer.featureCount()} obiektów'
+                                     if rect is not None else ''))
+
+        def swap(value):
+            if isinstance(value, list):
+                return [swap(item) for item in value]
+            if isinstance(value, (str, QgsVectorLayer)):
+                return replaced.get(_value_key(value), value)
+            return value
+
+        for stage in self._graph.stages():
+            if replaced:
+                stage.params = {name: swap(value) for name, value in stage.params.items()}
+            fields = self._needs[stage.key].fields
+            if stage.alg_id in PRUNABLE and fields is not None:
+                stage.params['POLA'] = ','.join(sorted(fields))
+        return len(replaced)
+
+
+def prune_layer(layer, fields, geometry, rect=None):
+    """
+    Kopia warstwy tylko z polami 'fields' (wielkość liter bez znaczenia;
+    None – wszystkie), gdy niepotrzebna – bez geometrii, a przy 'rect' –
+    tylko z obiektami w prostokącie; czytana z setSubsetOfAttributes,
+    NoGeometry i filterRect. None, gdy przycięcie się nie opłaca.
+    """
+    if layer is None or (fields is None and rect is None):
+        return None
+    source_fields = layer.fields()
+    if fields is None:
+        keep = list(range(source_fields.count()))
+    else:
+        wanted = {name.lower() for name in fields}
+        keep = [i for i, field in enumerate(source_fields) if field.name().lower() in wanted]
+    dropped = source_fields.count() - len(keep)
+    has_geometry = layer.wkbType() != QgsWkbTypes.NoGeometry
+    # prostokąt zawęża odczyt zawsze; bez niego przycięcie kolumn musi się opłacać
+    if rect is None:
+        if has_geometry and geometry:
+            if dropped < GEOMETRY_PRUNE_SHARE * source_fields.count():
+                return None
+        elif dropped == 0 and not has_geometry:
+            return None
+    request = QgsFeatureRequest().setSubsetOfAttributes(keep)
+    if rect is not None:
+        request.setFilterRect(rect)
+    if not geometry:
+        request.setFlags(request.flags() | QgsFeatureRequest.NoGeometry)
+    pruned = layer.materialize(request)
+    pruned.setName(layer.name())
+    return pruned
+
+
+def keep_fields(fields, names):
+    """(QgsFields tylko z polami 'names', indeksy tych pól) – dla parametru POLA."""
+    wanted = {name.strip().lower() for name in names.split(',') if name.strip()}
+    kept = QgsFields()
+    indexes = []
+    for i, field in enumerate(fields):
+        if field.name().lower() in wanted:
+            kept.append(field)
+            indexes.append(i)
+    return kept, indexes
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 import os
+import time
+
 from qgis.PyQt.QtWidgets import QAction
 from qgis.PyQt.QtGui import QIcon
 from qgis.core import QgsMessageLog, Qgis, QgsApplication
-import processing
 
 from .utils import plugin_dir
-from .provider import WydzLinioweProvider
+
+# processing i moduły algorytmów importowane są dopiero w initGui / przy
+# użyciu – samo wczytanie wtyczki przy starcie QGIS ich nie potrzebuje
 
 PLUGIN_MENU = 'LMN'
 PLUGIN_ACTION_TEXT = 'wydz_liniowe'
@@ -16,11 +19,18 @@ class WydzLiniowePlugin:
         self.iface = iface
         self.action = None
         self.provider = None
+        # czasy wczytania wtyczki [ms]: import providera i algorytmów, rejestracja, całe initGui
+        self.startup_ms = {}
 
     def initGui(self):
+        started = time.perf_counter()
+        from .provider import WydzLinioweProvider
+
         # Rejestracja providera Processing – algorytmy dostępne w Toolboxie
+        # (loadAlgorithms importuje moduły algorytmów, bez modułów obliczeniowych)
         self.provider = WydzLinioweProvider()
         QgsApplication.processingRegistry().addProvider(self.provider)
+        self.startup_ms['rejestracja'] = round(1000.0 * (time.perf_counter() - started), 1)
 
         # Akcja na pasku narzędzi
         icon_path = os.path.join(plugin_dir(), 'icon.png')
@@ -34,6 +44,7 @@ class WydzLiniowePlugin:
         # dzięki czemu pojawią się checkboxy "Wczytaj plik wynikowy po zakończeniu"
         def _open_processing_dialog():
             try:
+                import processing
                 processing.execAlgorithmDialog('lmn:wydz_liniowe_auto', {})
             except Exception as e:
                 QgsMessageLog.logMessage(f'Nie można uruchomić dialogu: {e}', 'WydzLiniowe', Qgis.Critical)
@@ -44,7 +55,10 @@ class WydzLiniowePlugin:
         self.iface.addToolBarIcon(self.action)
         self.iface.addPluginToMenu(PLUGIN_MENU, self.action)
 
-        QgsMessageLog.logMessage('Wtyczka WydzLiniowe załadowana.', 'WydzLiniowe', Qgis.Info)
+        self.startup_ms['initGui'] = round(1000.0 * (time.perf_counter() - started), 1)
+        QgsMessageLog.logMessage(
+            f"Wtyczka WydzLiniowe załadowana (rejestracja algorytmów {self.startup_ms['rejestracja']} ms, "
+            f"initGui {self.startup_ms['initGui']} ms).", 'WydzLiniowe', Qgis.Info)
 
     def unload(self):
         if self.action:
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Szybka kontrola folderu SLMN przed uruchomieniem łańcucha.
+
+Czytane są wyłącznie nagłówki: opisy pól DBF, 100-bajtowe nagłówki
+.shp/.shx (typ geometrii, zasięg), tekst .prj i liczby obiektów (z .shx
+i nagłówka DBF) – bez otwierania warstw przez OGR i bez czytania
+geometrii. Pięć plików SLMN i raport BO sprawdzane są równolegle, więc
+raport jest gotowy w milisekundach, a błędy schematu, niezgodne układy
+współrzędnych czy uszkodzone pliki wychodzą przed pierwszym krokiem,
+a nie w połowie obliczeń.
+
+Wynik dla pliku trafia do pamięci podręcznej procesu z kluczem (ścieżka,
+czas modyfikacji, rozmiar) wszystkich plików składowych – kolejne
+uruchomienie na tym samym folderze nie czyta dysku.
+"""
+
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .dbf import DbfTable, dbf_path
+
+# plik -> pola wymagane przez łańcuch (wielkość liter bez znaczenia)
+SLMN_FIELDS = {
+    'a_kom_a.dbf': ('nr_wew', 'id_kom'),
+    'a_line_a.dbf': ('nr_wew', 'id_lin'),
+    'a_kom_lin.shp': ('id_kom',),
+    'a_line_lin.shp': ('id_lin',),
+    'a_oddz_pol.shp': ('nr_wew',),
+}
+BO_FIELDS = ('adr_les', 'nr_wew', 'pow')
+
+# plik -> oczekiwany rodzaj geometrii
+SLMN_SHAPES = {
+    'a_kom_lin.shp': 'line',
+    'a_line_lin.shp': 'line',
+    'a_oddz_pol.shp': 'polygon',
+}
+
+# typ kształtu ESRI -> rodzaj geometrii
+SHAPE_KINDS = {
+    0: 'null',
+    1: 'point', 11: 'point', 21: 'point',
+    3: 'line', 13: 'line', 23: 'line',
+    5: 'polygon', 15: 'polygon', 25: 'polygon',
+    8: 'multipoint', 18: 'multipoint', 28: 'multipoint',
+    31: 'multipatch',
+}
+
+SHP_FILE_CODE = 9994
+SHP_HEADER_SIZE = 100
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class FileReport:
+    """Wynik kontroli jednego pliku."""
+    __slots__ = ('name', 'path', 'fields', 'count', 'kind', 'extent', 'prj', 'errors', 'warnings')
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.fields = []
+        self.count = None
+        self.kind = None
+        self.extent = None
+        self.prj = None
+        self.errors = []
+        self.warnings = []
+
+
+class PreflightReport:
+    """Raport kontroli folderu: błędy blokują uruchomienie, ostrzeżenia – nie."""
+
+    def __init__(self, files, errors, warnings, elapsed):
+        self.files = files
+        self.errors = errors
+        self.warnings = warnings
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def text(self) -> str:
+        parts = []
+        if self.errors:
+            parts.append('Błędy danych wejściowych:\n  - ' + '\n  - '.join(self.errors))
+        if self.warnings:
+            parts.append('Ostrzeżenia:\n  - ' + '\n  - '.join(self.warnings))
+        return '\n\n'.join(parts)
+
+    def summary(self) -> str:
+        counts = ', '.join(f'{r.name}: {r.count}' for r in self.files.values() if r.count is not None)
+        return f'Kontrola wstępna ({1000.0 * self.elapsed:.0f} ms) – liczba obiektów: {counts}'
+
+
+def _signature(paths) -> tuple:
+    result = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            result.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            result.append((path, None, None))
+    return tuple(result)
+
+
+def _sidecar(path: str, ext: str) -> str:
+    """Plik towarzyszący (.shx, .dbf, .prj) – także przy rozszerzeniu pisanym wielkimi literami."""
+    base = os.path.splitext(path)[0]
+    for candidate in (base + ext, base + ext.upper()):
+        if os.path.exists(candidate):
+            return candidate
+    return base + ext
+
+
+def _check_fields(report, names, required):
+    present = {n.lower() for n in names}
+    missing = [f for f in required if f.lower() not in present]
+    if missing:
+        report.errors.append(f'{report.name}: brak pól {", ".join(missing)}')
+
+
+def _scan_dbf(report, path, required):
+    try:
+        with DbfTable(path) as table:
+            report.fields = [f.name for f in table.fields]
+            report.count = table.record_count
+    except (OSError, ValueError) as e:
+        report.errors.append(f'{report.name}: nieczytelny plik DBF ({e})')
+        return
+    _check_fields(report, report.fields, required)
+
+
+def _read_shp_header(path):
+    """(długość pliku w bajtach, typ kształtu, zasięg) z nagłówka .shp."""
+    with open(path, 'rb') as f:
+        raw = f.read(SHP_HEADER_SIZE)
+    if len(raw) < SHP_HEADER_SIZE:
+        raise ValueError('plik krótszy niż nagłówek')
+    code, _, _, _, _, _, words = struct.unpack_from('>7i', raw, 0)
+    version, shape_type = struct.unpack_from('<2i', raw, 28)
+    extent = struct.unpack_from('<4d', raw, 36)
+    if code != SHP_FILE_CODE or version != 1000:
+        raise ValueError('nieprawidłowy nagłówek')
+    return words * 2, shape_type, extent
+
+
+def _scan_shp(report, path, required, expected_kind):
+    try:
+        length, shape_type, extent = _read_shp_header(path)
+    except (OSError, ValueError, struct.error) as e:
+        report.errors.append(f'{report.name}: uszkodzony plik .shp ({e})')
+        return
+    report.kind = SHAPE_KINDS.get(shape_type, f'typ {shape_type}')
+    report.extent = extent
+    if length != os.path.getsize(path):
+        report.warnings.append(f'{report.name}: długość z nagłówka .shp nie zgadza się z rozmiarem pliku')
+    if expected_kind and report.kind not in (expected_kind, 'null'):
+        report.errors.append(f'{report.name}: geometria {report.kind}, oczekiwano {expected_kind}')
+
+    shx = _sidecar(path, '.shx')
+    try:
+        # rekord indeksu .shx ma 8 bajtów
+        report.count = (os.path.getsize(shx) - SHP_HEADER_SIZE) // 8
+    except OSError:
+        report.errors.append(f'{report.name}: brak pliku indeksu .shx')
+
+    dbf = _sidecar(path, '.dbf')
+    if not os.path.exists(dbf):
+        report.errors.append(f'{report.name}: brak pliku atrybutów .dbf')
+    else:
+        attributes = FileReport(report.name, dbf)
+        _scan_dbf(attributes, dbf, required)
+        report.fields = attributes.fields
+        report.errors.extend(attributes.errors)
+        if report.count is not None and attributes.count is not None and report.count != attributes.count:
+            report.errors.append(
+                f'{report.name}: liczba geometrii ({report.count}) różna od liczby rekordów DBF ({attributes.count})')
+
+    prj = _sidecar(path, '.prj')
+    try:
+        with open(prj, 'r', encoding='ascii', errors='replace') as f:
+            report.prj = f.read().strip() or None
+    except OSError:
+        pass
+    if report.prj is None:
+        report.warnings.append(f'{report.name}: brak pliku .prj – przyjęty zostanie układ projektu')
+    if report.count == 0:
+        report.warnings.append(f'{report.name}: warstwa nie zawiera obiektów')
+
+
+def scan_file(name: str, path: str, required=(), expected_kind=None) -> FileReport:
+    """Kontrola pliku .dbf albo .shp; wynik zapamiętywany do zmiany plików."""
+    is_shp = os.path.splitext(path)[1].lower() == '.shp'
+    if is_shp:
+        parts = [path] + [_sidecar(path, ext) for ext in ('.shx', '.dbf', '.prj')]
+    else:
+        parts = [path]
+    key = (name, tuple(required), expected_kind, _signature(parts))
+    with _cache_lock:
+        cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    report = FileReport(name, path)
+    if not os.path.isfile(path):
+        report.errors.append(f'{name}: brak pliku')
+    elif is_shp:
+        _scan_shp(report, path, required, expected_kind)
+    else:
+        _scan_dbf(report, path, required)
+    with _cache_lock:
+        _cache[path] = (key, report)
+    return report
+
+
+def _scan_bo(bo):
+    """Raport BO: DBF na dysku – z nagłówka, inna warstwa – z listy pól (bez odczytu obiektów)."""
+    path = bo if isinstance(bo, str) else dbf_path(bo)
+    if path:
+        return scan_file('raport BO', path, BO_FIELDS)
+    report = FileReport('raport BO', bo.source())
+    report.fields = bo.fields().names()
+    _check_fields(report, report.fields, BO_FIELDS)
+    return report
+
+
+def _same_crs(prj_texts) -> bool:
+    # porównanie bez białych znaków – programy różnie łamią WKT
+    return len({''.join(t.split()).upper() for t in prj_texts}) <= 1
+
+
+def scan_slmn_folder(folder: str, bo=None, workers: int = None) -> PreflightReport:
+    """
+    Kontrola pięciu plików SLMN z folderu i (opcjonalnie) raportu BO –
+    ścieżki DBF albo warstwy. Pliki sprawdzane są równolegle.
+    """
+    start = time.perf_counter()
+    jobs = [(name, os.path.join(folder, name), SLMN_FIELDS[name], SLMN_SHAPES.get(name))
+            for name in SLMN_FIELDS]
+    with ThreadPoolExecutor(max_workers=workers or len(jobs) + 1) as pool:
+        futures = [pool.submit(scan_file, *job) for job in jobs]
+        bo_future = pool.submit(_scan_bo, bo) if bo is not None else None
+        files = {job[0]: future.result() for job, future in zip(jobs, futures)}
+        if bo_future is not None:
+            files['raport BO'] = bo_future.result()
+
+    errors = [e for r in files.values() for e in r.errors]
+    warnings = [w for r in files.values() for w in r.warnings]
+
+    prj_texts = [r.prj for name, r in files.items() if name in SLMN_SHAPES and r.prj]
+    if not _same_crs(prj_texts):
+        warnings.append('Warstwy .shp mają różne układy współrzędnych (.prj) – '
+                        'łańcuch sprowadzi je do EPSG:2180')
+
+    return PreflightReport(files, errors, warnings, time.perf_counter() - start)
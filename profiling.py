@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Pomiar kroków algorytmu wydz_liniowe (opcjonalny).
+
+Dla każdego kroku zapisywany jest czas rzeczywisty, czas CPU procesu,
+liczba obiektów na wejściu i wyjściu oraz szczytowa pamięć procesu.
+Wynik trafia do logu Processing, do pliku JSON/CSV oraz do wyników
+algorytmu (klucz 'PROFIL'), dzięki czemu tryb wsadowy może go zbierać.
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from qgis.core import QgsProcessingUtils, QgsVectorLayer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# kolejność kolumn w raporcie CSV
+PROFILE_COLUMNS = ['krok', 'algorytm', 'czas_s', 'cpu_s', 'wejscie', 'wyjscie', 'pamiec_szczyt_mb']
+
+
+def peak_memory_mb():
+    """Szczytowe zużycie pamięci procesu w MB (None, jeśli nie da się odczytać)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux podaje kB, macOS bajty
+        return round(peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0, 1)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024.0 * 1024.0), 1)
+    return None
+
+
+def current_memory_mb():
+    """Bieżące zużycie pamięci procesu (RSS) w MB (None, jeśli nie da się odczytać)."""
+    if psutil is not None:
+        return round(psutil.Process().memory_info().rss / (1024.0 * 1024.0), 1)
+    try:
+        # Linux bez psutil
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024.0), 1)
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+class StepProfiler:
+    """Zbiera rekordy pomiarów kolejnych kroków."""
+
+    def __init__(self):
+        self.records = []
+
+    @staticmethod
+    def count(value, context):
+        """Liczba obiektów warstwy podanej jako obiekt, id albo ścieżka (None, gdy nieznana)."""
+        if value is None:
+            return None
+        layer = value if isinstance(value, QgsVectorLayer) else None
+        if layer is None and isinstance(value, str):
+            layer = QgsProcessingUtils.mapLayerFromString(value, context)
+        if isinstance(layer, QgsVectorLayer):
+            count = layer.featureCount()
+            return count if count >= 0 else None
+        return None
+
+    @contextmanager
+    def step(self, name: str, algorithm: str = '', input_count=None):
+        """Mierzy blok kodu; wywołujący może uzupełnić rekord['wyjscie']."""
+        record = {'krok': name, 'algorytm': algorithm, 'wejscie': input_count, 'wyjscie': None}
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['czas_s'] = round(time.perf_counter() - wall, 3)
+            record['cpu_s'] = round(time.process_time() - cpu, 3)
+            record['pamiec_szczyt_mb'] = peak_memory_mb()
+            self.records.append(record)
+
+    def summary(self) -> str:
+        """Tabela do logu Processing, kroki posortowane od najdłuższego."""
+        total = sum(r['czas_s'] for r in self.records) or 1.0
+        lines = [f'{"krok":<32} {"czas [s]":>9} {"cpu [s]":>9} {"%":>6} {"wejście":>9} {"wyjście":>9} {"RAM [MB]":>9}']
+        for r in sorted(self.records, key=lambda r: r['czas_s'], reverse=True):
+            lines.append(
+                f'{r["krok"][:32]:<32} {r["czas_s"]:>9.3f} {r["cpu_s"]:>9.3f} '
+                f'{100.0 * r["czas_s"] / total:>6.1f} {_fmt(r["wejscie"]):>9} {_fmt(r["wyjscie"]):>9} '
+                f'{_fmt(r["pamiec_szczyt_mb"]):>9}')
+        return '\n'.join(lines)
+
+    def write(self, path: str):
+        """Zapis raportu – CSV dla rozszerzenia .csv, w pozostałych przypadkach JSON."""
+        if os.path.splitext(path)[1].lower() == '.csv':
+            write_profile_csv(path, self.records)
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.records, f, ensure_ascii=False, indent=2)
+
+
+def write_profile_csv(path: str, records, extra_columns=()):
+    """Wspólny zapis CSV (używany też do zbiorczego raportu trybu wsadowego)."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(extra_columns) + PROFILE_COLUMNS,
+                                delimiter=';', extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def _fmt(value) -> str:
+    return '-' if value is None else str(value)
@@ -1,7 +1,5 @@
 # -*- coding: utf-8 -*-
 from qgis.core import QgsProcessingProvider
-from .algorithm import Wydz_liniowe
-from .algorithm_auto import Wydz_liniowe_auto
 
 class WydzLinioweProvider(QgsProcessingProvider):
     def id(self) -> str:
@@ -15,6 +13,27 @@ class WydzLinioweProvider(QgsProcessingProvider):
         return 'LMN'
 
     def loadAlgorithms(self):
-        # Rejestruj oba algorytmy
+        # Klasy algorytmów importowane przy rejestracji providera, nie przy
+        # imporcie wtyczki. Moduły algorytmów importują na poziomie modułu tylko
+        # qgis.core i stałe parametrów – moduły obliczeniowe (także joins, dbf)
+        # wczytują się w processAlgorithm, przy pierwszym uruchomieniu
+        from .algorithm import Wydz_liniowe
+        from .algorithm_auto import Wydz_liniowe_auto
+        from .algorithm_batch import Wydz_liniowe_batch
+        from .algorithm_length import Dlugosci_segmentow
+        from .algorithm_dedup import Usun_duplikaty_geometrii
+        from .algorithm_aggregate import Agreguj_wg_adr_les
+        from .algorithm_derived import Pola_pochodne
+        from .algorithm_repair import Napraw_niepoprawne_geometrie
+        from .algorithm_join import Zlacz_adr_les
+
+        # Rejestruj algorytmy
         self.addAlgorithm(Wydz_liniowe())        # bazowy (z modelera)
         self.addAlgorithm(Wydz_liniowe_auto())   # wrapper z folderem SLMN
+        self.addAlgorithm(Wydz_liniowe_batch())  # wiele folderów SLMN naraz
+        self.addAlgorithm(Dlugosci_segmentow())  # krok wewnętrzny łańcucha (ukryty)
+        self.addAlgorithm(Usun_duplikaty_geometrii())  # krok wewnętrzny łańcucha (ukryty)
+        self.addAlgorithm(Agreguj_wg_adr_les())  # krok wewnętrzny łańcucha (ukryty)
+        self.addAlgorithm(Pola_pochodne())  # krok wewnętrzny łańcucha (ukryty)
+        self.addAlgorithm(Napraw_niepoprawne_geometrie())  # krok wewnętrzny łańcucha (ukryty)
+        self.addAlgorithm(Zlacz_adr_les())  # krok wewnętrzny łańcucha (ukryty)
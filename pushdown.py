@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Odczyt linii SLMN ograniczony do zasięgu oddziałów.
+
+a_kom_lin.shp i a_line_lin.shp obejmują zwykle całe nadleśnictwo, a
+oddziały (a_oddz_pol) – czasem tylko jego część, np. jedno leśnictwo.
+Zasięg oddziałów (z nagłówka .shp, bez czytania geometrii) albo grupy
+oddziałów przekazywany jest do dostawcy jako filterRect, a plik indeksu
+przestrzennego .qix obok pliku .shp sprawia, że OGR czyta z dysku tylko
+rekordy z tego prostokąta zamiast całego pliku.
+
+Indeks .qix tworzony jest raz i używany w kolejnych uruchomieniach;
+gdy plik .shp jest nowszy od indeksu (dane podmienione), indeks jest
+budowany od nowa – OGR nie sprawdza, czy .qix jest aktualny.
+"""
+
+import os
+import threading
+
+from qgis.core import QgsCoordinateTransform, QgsFeatureRequest, QgsRectangle, QgsVectorDataProvider
+
+# pliki SLMN czytane z filtrem przestrzennym (parametry algorytmu)
+SLMN_SHAPEFILES = ('a_kom_linshp', 'a_line_linshp', 'a_oddz_polshp')
+
+# prostokąt obejmujący co najmniej taką część zasięgu warstwy nie zawęża odczytu
+# (filtr i tak przeczytałby prawie wszystko – zostaje zwykły odczyt)
+FULL_EXTENT_SHARE = 0.9
+
+_indexed = {}
+_indexed_lock = threading.Lock()
+
+
+def shapefile_path(layer):
+    """Ścieżka pliku .shp warstwy OGR albo None (inny format lub dostawca)."""
+    if layer is None or layer.providerType() != 'ogr':
+        return None
+    path = layer.source().split('|')[0]
+    return path if path.lower().endswith('.shp') else None
+
+
+def qix_path(shp: str) -> str:
+    return os.path.splitext(shp)[0] + '.qix'
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def index_is_current(shp: str) -> bool:
+    """Indeks .qix istnieje i nie jest starszy niż plik .shp."""
+    qix, data = _mtime(qix_path(shp)), _mtime(shp)
+    return qix is not None and data is not None and qix >= data
+
+
+def ensure_spatial_index(layer) -> str:
+    """
+    Indeks .qix dla warstwy shapefile: 'uzyty' (aktualny już był),
+    'utworzony' albo '' (nie shapefile, brak uprawnień do zapisu itp.).
+    """
+    shp = shapefile_path(layer)
+    if shp is None:
+        return ''
+    key = (shp, _mtime(shp))
+    with _indexed_lock:
+        if _indexed.get(shp) == key and index_is_current(shp):
+            return 'uzyty'
+    if index_is_current(shp):
+        state = 'uzyty'
+    else:
+        provider = layer.dataProvider()
+        if not provider.capabilities() & QgsVectorDataProvider.CreateSpatialIndex:
+            return ''
+        if not provider.createSpatialIndex() or not os.path.exists(qix_path(shp)):
+            return ''
+        state = 'utworzony'
+    with _indexed_lock:
+        _indexed[shp] = key
+    return state
+
+
+def ensure_indexes(layers, feedback=None) -> dict:
+    """Indeksy .qix dla warstw SLMN; {nazwa warstwy: stan} z ensure_spatial_index."""
+    states = {}
+    for layer in layers:
+        if layer is None:
+            continue
+        states[layer.name()] = state = ensure_spatial_index(layer)
+        if feedback is not None and not state and shapefile_path(layer):
+            feedback.pushWarning(f'{layer.name()}: nie udało się utworzyć indeksu przestrzennego .qix '
+                                 '(folder tylko do odczytu?) – plik będzie czytany w całości.')
+    if feedback is not None:
+        built = [name for name, state in states.items() if state == 'utworzony']
+        if built:
+            feedback.pushInfo('Utworzono indeks przestrzenny .qix: ' + ', '.join(built))
+    return states
+
+
+def layer_rect(rect, rect_crs, layer, transform_context):
+    """
+    Prostokąt 'rect' (w układzie 'rect_crs') w układzie warstwy albo None,
+    gdy nie zawęża on odczytu warstwy.
+    """
+    if rect is None or rect.isNull() or rect.isEmpty():
+        return None
+    if rect_crs.isValid() and layer.crs().isValid() and rect_crs != layer.crs():
+        rect = QgsCoordinateTransform(rect_crs, layer.crs(), transform_context).transformBoundingBox(rect)
+    extent = layer.extent()
+    if extent.isNull() or extent.isEmpty():
+        return rect
+    covered = rect.intersect(extent)
+    if covered.area() >= FULL_EXTENT_SHARE * extent.area():
+        return None
+    return QgsRectangle(rect)
+
+
+def compartment_rect(oddz_layer, layer, transform_context):
+    """Zasięg a_oddz_pol w układzie 'layer' (None – bez zawężenia)."""
+    if oddz_layer is None or layer is None:
+        return None
+    return layer_rect(oddz_layer.extent(), oddz_layer.crs(), layer, transform_context)
+
+
+def rect_request(rect) -> QgsFeatureRequest:
+    """QgsFeatureRequest z filterRect, gdy 'rect' jest podany."""
+    request = QgsFeatureRequest()
+    if rect is not None:
+        request.setFilterRect(rect)
+    return request
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Operacje przestrzenne silnika strumieniowego na oddziałach (a_oddz_pol).
+
+Wspólny indeks oddziałów budowany jest raz na przebieg, a geometrie są
+przygotowywane (prepared geometry GEOS), więc koszt na linię zależy tylko
+od kilku oddziałów, które ona faktycznie przecina. Nakładka
+CompartmentOverlay zastępuje przycięcie (kroki 4/6), podział granicami
+oddziałów (kroki 5, 10, 11) i złączenie przestrzenne (kroki 13/14)
+jednym przecięciem linii z oddziałami.
+"""
+
+from qgis.core import QgsGeometry, QgsRectangle, QgsSpatialIndex, QgsWkbTypes
+
+
+def lines_only(geom):
+    """Zostawia wyłącznie część liniową wyniku przecięcia (jak native:clip)."""
+    if geom is None or geom.isNull() or geom.isEmpty():
+        return None
+    if geom.type() == QgsWkbTypes.LineGeometry:
+        return geom
+    if QgsWkbTypes.flatType(geom.wkbType()) == QgsWkbTypes.GeometryCollection:
+        lines = QgsGeometry(geom)
+        if lines.convertGeometryCollectionToSubclass(QgsWkbTypes.LineGeometry) and not lines.isEmpty():
+            return lines
+    return None
+
+
+class Compartment:
+    """Oddział z a_oddz_pol po naprawie geometrii i przypisaniu adresu."""
+    __slots__ = ('fid', 'geometry', 'adr_oddz', '_engine', '_boundary')
+
+    def __init__(self, fid, geometry, adr_oddz):
+        self.fid = fid
+        self.geometry = geometry
+        self.adr_oddz = adr_oddz
+        self._engine = None
+        self._boundary = None
+
+    def copy(self) -> 'Compartment':
+        """
+        Kopia z własną przygotowaną geometrią – przygotowana geometria GEOS
+        buduje indeksy leniwie i nie może być współdzielona między wątkami.
+        """
+        return Compartment(self.fid, self.geometry, self.adr_oddz)
+
+    def prepare(self):
+        """Przygotowana geometria GEOS – szybkie testy intersects dla wielu linii."""
+        if self._engine is None:
+            engine = QgsGeometry.createGeometryEngine(self.geometry.constGet())
+            engine.prepareGeometry()
+            self._engine = engine
+        return self._engine
+
+    def intersects(self, geom) -> bool:
+        return self.prepare().intersects(geom.constGet())
+
+    @property
+    def boundary(self) -> QgsGeometry:
+        """Granica oddziału (odpowiednik native:polygonstolines)."""
+        if self._boundary is None:
+            self._boundary = QgsGeometry(self.geometry.constGet().boundary())
+        return self._boundary
+
+
+class CompartmentIndex:
+    """Indeks R-tree oddziałów; granica ma ten sam zasięg co poligon, więc indeks jest jeden."""
+
+    def __init__(self, compartments):
+        self._by_fid = {}
+        self._index = QgsSpatialIndex()
+        for c in compartments:
+            self._by_fid[c.fid] = c
+            self._index.addFeature(c.fid, c.geometry.boundingBox())
+
+    def __len__(self):
+        return len(self._by_fid)
+
+    def __iter__(self):
+        return iter(self._by_fid.values())
+
+    def in_rect(self, rect) -> list:
+        """Oddziały, których zasięg przecina prostokąt (bez testu geometrii)."""
+        return [self._by_fid[fid] for fid in sorted(self._index.intersects(rect))]
+
+    def candidates(self, geom) -> list:
+        """Oddziały przecinające 'geom', w kolejności fid (jak przy złączeniach Processing)."""
+        found = []
+        for fid in sorted(self._index.intersects(geom.boundingBox())):
+            c = self._by_fid[fid]
+            if c.intersects(geom):
+                found.append(c)
+        return found
+
+
+class CompartmentOverlay:
+    """
+    Nakładka linia/oddziały w jednym kroku.
+
+    Dla każdej linii zwraca odcinki z listą oddziałów, do których należą.
+    Odcinek wewnątrz oddziału ma jeden oddział; odcinek biegnący po
+    wspólnej granicy dwóch oddziałów jest zwracany raz, z oboma
+    (w kolejności fid) – wybór właściwego następuje przy złączeniu po
+    id_oddz, zamiast niejednoznacznego złączenia przestrzennego.
+    """
+
+    def __init__(self, index):
+        self._index = index
+
+    def pieces(self, geom) -> list:
+        interior = []
+        shared = []   # [geometria, [oddział, ...]]
+        for c in self._index.candidates(geom):
+            inside = lines_only(geom.intersection(c.geometry))
+            if inside is None:
+                continue
+            on_boundary = lines_only(inside.intersection(c.boundary))
+            if on_boundary is not None:
+                inside = lines_only(inside.difference(c.boundary))
+                for part in on_boundary.asGeometryCollection():
+                    for entry in shared:
+                        if entry[0].isGeosEqual(part):
+                            entry[1].append(c)
+                            break
+                    else:
+                        shared.append([part, [c]])
+            if inside is not None:
+                interior.extend((part, [c]) for part in inside.asGeometryCollection())
+        return interior + [tuple(entry) for entry in shared]
+
+
+def partition_compartments(compartments, count) -> list:
+    """
+    Dzieli oddziały na 'count' spójnych przestrzennie grup o zbliżonej
+    liczności – porządek Mortona (krzywa Z) środków zasięgów, cięty na
+    równe kawałki. Sąsiednie oddziały trafiają zwykle do tej samej grupy,
+    więc niewiele linii jest czytanych przez więcej niż jedną grupę.
+    """
+    if not compartments:
+        return []
+    count = max(1, min(count, len(compartments)))
+    extent = compartments_extent(compartments)
+    width = extent.width() or 1.0
+    height = extent.height() or 1.0
+
+    def morton(c):
+        center = c.geometry.boundingBox().center()
+        x = int((center.x() - extent.xMinimum()) / width * 0xFFFF)
+        y = int((center.y() - extent.yMinimum()) / height * 0xFFFF)
+        key = 0
+        for bit in range(16):
+            key |= ((x >> bit) & 1) << (2 * bit) | ((y >> bit) & 1) << (2 * bit + 1)
+        return key
+
+    ordered = sorted(compartments, key=morton)
+    size, rest = divmod(len(ordered), count)
+    groups, start = [], 0
+    for i in range(count):
+        end = start + size + (1 if i < rest else 0)
+        groups.append(ordered[start:end])
+        start = end
+    return groups
+
+
+def compartments_extent(compartments) -> QgsRectangle:
+    """Łączny zasięg oddziałów."""
+    extent = QgsRectangle()
+    extent.setMinimal()
+    for c in compartments:
+        extent.combineExtentWith(c.geometry.boundingBox())
+    return extent
@@ -1,11 +1,30 @@
 # -*- coding: utf-8 -*-
 import os
+from functools import lru_cache
 from qgis.core import QgsVectorLayer
 
 def plugin_dir() -> str:
     """Zwraca katalog bieżącej wtyczki (tam powinna być ikona icon.png)."""
     return os.path.dirname(os.path.abspath(__file__))
 
+@lru_cache(maxsize=1)
+def opis_html() -> str:
+    """
+    Czyta plik Opis.txt z katalogu wtyczki i zwraca prosty HTML
+    do wyświetlenia po prawej stronie natywnego dialogu Processing.
+    Bez żadnego nagłówka nad treścią. Plik czytany jest raz – przy
+    pierwszym wyświetleniu opisu.
+    """
+    try:
+        path = os.path.join(plugin_dir(), 'Opis.txt')
+        with open(path, 'r', encoding='utf-8') as f:
+            txt = f.read().strip()
+        body = '<br>'.join(txt.splitlines())
+        return f'<div style="white-space:normal">{body}</div>'
+    except Exception:
+        return ('<div>Wtyczka „Wydzielenia liniowe”. '
+                'Umieść plik <code>Opis.txt</code> w folderze wtyczki, aby tutaj pojawiła się treść opisu.</div>')
+
 def ensure_output_string(path: str) -> str:
     """
     Zwraca prawidłowy identyfikator wyjścia Processing.
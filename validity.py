@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Naprawa geometrii a_oddz_pol tylko tam, gdzie jest potrzebna.
+
+Krok 2 (native:fixgeometries, METHOD 1) naprawiał przy każdym
+uruchomieniu każdy poligon oddziału, choć niepoprawnych jest zwykle
+kilka, a makeValid kosztuje wielokrotnie więcej niż samo sprawdzenie
+poprawności. Tutaj poprawność (GEOS isValid) sprawdzana jest paczkami
+w puli wątków, naprawiane (METHOD 1 – struktura) są tylko poligony
+niepoprawne, a ich naprawione geometrie trafiają do pamięci podręcznej
+(cache.py) pod skrótem plików a_oddz_pol. Przy kolejnym uruchomieniu na
+tych samych danych żaden poligon nie jest już sprawdzany ani naprawiany –
+dla danych bez błędów wpis jest pusty.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import Qgis, QgsFeature, QgsField, QgsFields, QgsGeometry, QgsVectorLayer, QgsWkbTypes
+
+# liczba geometrii sprawdzanych w jednym zadaniu puli wątków
+CHECK_CHUNK = 500
+
+# wpis pamięci podręcznej: naprawione geometrie z fid obiektu źródłowego
+CACHE_KIND = 'naprawy'
+CACHE_LAYER = 'naprawy'
+
+# tyle naprawionych oddziałów wypisywanych jest w raporcie z nazwy
+MAX_REPORTED = 50
+
+
+def repair(geom) -> QgsGeometry:
+    """Jak native:fixgeometries, METHOD 1: makeValid (struktura), tylko części poligonowe, multi."""
+    fixed = geom.makeValid(Qgis.MakeValidMethod.Structure)
+    if QgsWkbTypes.flatType(fixed.wkbType()) == QgsWkbTypes.GeometryCollection:
+        fixed.convertGeometryCollectionToSubclass(QgsWkbTypes.PolygonGeometry)
+    if not fixed.isEmpty():
+        fixed.convertToMultiType()
+    return fixed
+
+
+def _valid_flags(geometries) -> list:
+    # puste geometrie zostają bez zmian (jak w native:fixgeometries)
+    return [geom.isNull() or geom.isEmpty() or geom.isGeosValid() for geom in geometries]
+
+
+def prepared_geometries(features, cached=None, workers=0, chunk=CHECK_CHUNK):
+    """
+    (obiekt, geometria, czy naprawiona) dla kolejnych obiektów. Przy 'cached'
+    ({fid: naprawiona geometria} z load_repairs) bez sprawdzania poprawności;
+    inaczej paczki chunk * workers obiektów sprawdzane są równolegle,
+    a naprawiane tylko niepoprawne geometrie.
+    """
+    if cached is not None:
+        for f in features:
+            fixed = cached.get(f.id())
+            yield (f, QgsGeometry(fixed), True) if fixed is not None else (f, f.geometry(), False)
+        return
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    batch = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def drain():
+            geometries = [f.geometry() for f in batch]
+            parts = [geometries[i:i + chunk] for i in range(0, len(geometries), chunk)]
+            flags = [flag for part in pool.map(_valid_flags, parts) for flag in part]
+            done = [(f, geom if valid else repair(geom), not valid)
+                    for f, geom, valid in zip(batch, geometries, flags)]
+            batch.clear()
+            return done
+
+        for f in features:
+            batch.append(f)
+            if len(batch) >= chunk * workers:
+                yield from drain()
+        if batch:
+            yield from drain()
+
+
+def _cache_fields() -> QgsFields:
+    fields = QgsFields()
+    fields.append(QgsField('fid_zr', QVariant.LongLong, 'int8', 20, 0))
+    return fields
+
+
+def load_repairs(cache, key):
+    """Naprawione geometrie {fid: geometria} z pamięci podręcznej albo None, gdy brak wpisu."""
+    entry = cache.get(key, CACHE_KIND, [CACHE_LAYER]) if cache is not None and key else None
+    if not entry:
+        return None
+    layer = QgsVectorLayer(entry[CACHE_LAYER], CACHE_LAYER, 'ogr')
+    if not layer.isValid():
+        return None
+    i_fid = layer.fields().lookupField('fid_zr')
+    if i_fid < 0:
+        return None
+    return {f.attributes()[i_fid]: f.geometry() for f in layer.getFeatures()}
+
+
+def store_repairs(cache, key, repairs: dict, crs):
+    """Zapis naprawionych geometrii (także pustego zbioru – dane bez błędów)."""
+    if cache is None or not key:
+        return
+    fields = _cache_fields()
+
+    def features():
+        for fid, geom in repairs.items():
+            f = QgsFeature(fields)
+            f.setGeometry(geom)
+            f.setAttributes([fid])
+            yield f
+
+    cache.put(key, CACHE_KIND, {CACHE_LAYER: (fields, QgsWkbTypes.MultiPolygon, crs, features())})
+
+
+def repair_report(fixed, total, from_cache=False) -> str:
+    """Komunikat o naprawionych oddziałach; 'fixed' to lista (nr_wew, adr_les)."""
+    source = ' (z pamięci podręcznej)' if from_cache else ''
+    if not fixed:
+        return f'Geometrie oddziałów poprawne – bez naprawy{source} ({total} obiektów).'
+    listed = ', '.join(f'nr_wew {nr} ({adr or "brak adr_les"})' for nr, adr in fixed[:MAX_REPORTED])
+    more = f' i {len(fixed) - MAX_REPORTED} innych' if len(fixed) > MAX_REPORTED else ''
+    return f'Naprawiono geometrie {len(fixed)} z {total} oddziałów{source}: {listed}{more}.'
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Zapis wyników: formaty kolumnowe (GeoParquet, Arrow IPC) i zbiorczy
+zapis obu warstw do jednego GeoPackage.
+
+Obie warstwy wynikowe można zapisać do pliku .parquet (GeoParquet,
+geometria WKB) albo .arrow/.feather (Arrow IPC). Zapis idzie przez
+sterowniki GDAL (Parquet, Arrow; GDAL >= 3.5 z biblioteką Arrow), które
+zbierają obiekty w paczki (row group / record batch) o zadanym rozmiarze
+i kompresują je. Silnik strumieniowy pisze do takiego pliku bezpośrednio,
+łańcuch Processing – jednym przebiegiem po ostatnim kroku.
+
+GpkgBulkWriter zapisuje wydz_lin_seg i wydz_lin_agreg do jednego pliku
+GeoPackage w jednej transakcji, bez utrzymywania indeksu R-tree przy
+każdym wstawieniu – indeks przestrzenny i indeksy adr_les budowane są
+raz, po zapisaniu wszystkich obiektów.
+"""
+
+import os
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (
+    QgsFeatureSink,
+    QgsProcessingException,
+    QgsProcessingOutputLayerDefinition,
+    QgsVectorFileWriter,
+    QgsWkbTypes,
+)
+
+# rozszerzenie -> sterownik GDAL
+COLUMNAR_DRIVERS = {
+    '.parquet': 'Parquet',
+    '.arrow': 'Arrow',
+    '.arrows': 'Arrow',
+    '.feather': 'Arrow',
+    '.ipc': 'Arrow',
+}
+
+# kolejność jak w parametrze 'kompresja'
+COMPRESSION_OPTIONS = ['ZSTD', 'SNAPPY', 'LZ4', 'GZIP', 'NONE']
+# Arrow IPC obsługuje tylko część kodeków
+ARROW_COMPRESSION = ('ZSTD', 'LZ4', 'NONE')
+
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+
+def destination_path(value) -> str:
+    """Ścieżka z wartości parametru wyjściowego (tekst albo QgsProcessingOutputLayerDefinition)."""
+    if isinstance(value, QgsProcessingOutputLayerDefinition):
+        value = value.sink.staticValue()
+    return value if isinstance(value, str) else ''
+
+
+def columnar_driver(value):
+    """Sterownik GDAL dla wyjścia kolumnowego albo None dla pozostałych formatów."""
+    path = destination_path(value).split('|')[0]
+    return COLUMNAR_DRIVERS.get(os.path.splitext(path)[1].lower())
+
+
+def driver_available(driver: str) -> bool:
+    try:
+        from osgeo import ogr
+    except ImportError:
+        return False
+    return ogr.GetDriverByName(driver) is not None
+
+
+def layer_options(driver: str, row_group_size: int, compression: str) -> list:
+    size = max(1, int(row_group_size or DEFAULT_ROW_GROUP_SIZE))
+    if driver == 'Parquet':
+        return [f'ROW_GROUP_SIZE={size}', f'COMPRESSION={compression}', 'GEOMETRY_ENCODING=WKB']
+    if compression not in ARROW_COMPRESSION:
+        compression = 'ZSTD'
+    return [f'BATCH_SIZE={size}', f'COMPRESSION={compression}']
+
+
+def create_columnar_writer(path, fields, wkb_type, crs, transform_context,
+                           row_group_size=DEFAULT_ROW_GROUP_SIZE, compression='ZSTD') -> QgsVectorFileWriter:
+    """Otwarty zapis do pliku kolumnowego (QgsFeatureSink); zamknięcie przez usunięcie obiektu."""
+    driver = columnar_driver(path)
+    if driver is None:
+        raise QgsProcessingException(f'Nieobsługiwany format kolumnowy: {path}')
+    if not driver_available(driver):
+        raise QgsProcessingException(
+            f'Biblioteka GDAL w tej instalacji QGIS nie ma sterownika {driver} – '
+            f'wybierz inny format wyniku (np. GPKG).')
+    if os.path.exists(path):
+        # sterowniki Parquet/Arrow nie nadpisują istniejących plików
+        os.remove(path)
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = driver
+    options.layerOptions = layer_options(driver, row_group_size, compression)
+    writer = QgsVectorFileWriter.create(path, fields, wkb_type, crs, transform_context, options)
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise QgsProcessingException(f'Nie można utworzyć {path}: {writer.errorMessage()}')
+    return writer
+
+
+def write_columnar(layer, path, transform_context, row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                   compression='ZSTD', feedback=None) -> int:
+    """Kopia warstwy do pliku kolumnowego; zwraca liczbę zapisanych obiektów."""
+    writer = create_columnar_writer(path, layer.fields(), layer.wkbType(), layer.crs(),
+                                    transform_context, row_group_size, compression)
+    total = layer.featureCount() or 1
+    count = 0
+    for f in layer.getFeatures():
+        if feedback is not None and feedback.isCanceled():
+            break
+        writer.addFeature(f, QgsFeatureSink.FastInsert)
+        count += 1
+        if feedback is not None and count % 10000 == 0:
+            feedback.setProgress(100.0 * count / total)
+    # zamknięcie pliku – zapis ostatniej paczki
+    del writer
+    return count
+
+
+# ----------------------------------------------------------------------
+# GeoPackage – zapis zbiorczy
+# ----------------------------------------------------------------------
+
+# nazwy warstw w pliku zbiorczym
+GPKG_LAYERS = {'Wydz_lin_seg': 'wydz_lin_seg', 'Wydz_lin_agreg': 'wydz_lin_agreg'}
+
+# ustawienia SQLite na czas zapisu (plik powstaje od zera – dziennik niepotrzebny)
+BULK_PRAGMAS = (
+    'PRAGMA synchronous = OFF',
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA locking_mode = EXCLUSIVE',
+    'PRAGMA cache_size = -262144',
+)
+
+# pola z indeksem atrybutowym (gdy istnieją w warstwie)
+INDEXED_FIELDS = ('adr_les',)
+
+
+def gpkg_layer_source(path: str, name: str) -> str:
+    return f'{path}|layername={name}'
+
+
+def _ogr_field_type(ogr, field):
+    return {
+        QVariant.Int: ogr.OFTInteger,
+        QVariant.LongLong: ogr.OFTInteger64,
+        QVariant.Double: ogr.OFTReal,
+    }.get(field.type(), ogr.OFTString)
+
+
+class _GpkgLayerSink(QgsFeatureSink):
+    """Warstwa pliku zbiorczego jako QgsFeatureSink (obiekty trafiają do otwartej transakcji)."""
+
+    def __init__(self, ogr, layer, fields):
+        super().__init__()
+        self._ogr = ogr
+        self._layer = layer
+        self._defn = layer.GetLayerDefn()
+        self._count = len(fields)
+        self.written = 0
+
+    def addFeatures(self, features, flags=QgsFeatureSink.Flags()):
+        # joins (i dbf) dopiero przy zapisie – stałe modułu są potrzebne już przy rejestracji algorytmów
+        from .joins import is_null
+
+        ogr = self._ogr
+        for f in features:
+            out = ogr.Feature(self._defn)
+            geom = f.geometry()
+            if not geom.isNull():
+                out.SetGeometryDirectly(ogr.CreateGeometryFromWkb(bytes(geom.asWkb())))
+            for i, value in enumerate(f.attributes()[:self._count]):
+                if is_null(value):
+                    out.SetFieldNull(i)
+                else:
+                    out.SetField(i, value)
+            if self._layer.CreateFeature(out) != 0:
+                return False
+            self.written += 1
+        return True
+
+    def addFeature(self, feature, flags=QgsFeatureSink.Flags()):
+        return self.addFeatures([feature], flags)
+
+
+class GpkgBulkWriter:
+    """
+    Jeden plik GeoPackage z kilkoma warstwami, zapisywany w jednej transakcji.
+    Użycie:
+        writer = GpkgBulkWriter(path, crs)
+        seg = writer.add_layer('wydz_lin_seg', fields, QgsWkbTypes.MultiLineString)
+        ... seg.addFeature(f) ...
+        writer.finish()   # zatwierdzenie, potem indeksy
+    """
+
+    def __init__(self, path: str, crs):
+        try:
+            from osgeo import ogr, osr
+        except ImportError:
+            raise QgsProcessingException('Zapis zbiorczy GeoPackage wymaga modułu osgeo (GDAL).')
+        self._ogr = ogr
+        self.path = path
+        for leftover in (path, path + '-wal', path + '-shm', path + '-journal'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        self._ds = ogr.GetDriverByName('GPKG').CreateDataSource(path)
+        if self._ds is None:
+            raise QgsProcessingException(f'Nie można utworzyć pliku GeoPackage: {path}')
+        self._srs = osr.SpatialReference()
+        self._srs.SetFromUserInput(crs.authid() or crs.toWkt())
+        self._srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        self._layers = []
+        for pragma in BULK_PRAGMAS:
+            self._execute(pragma)
+        self._ds.StartTransaction(force=True)
+
+    def _execute(self, sql: str):
+        result = self._ds.ExecuteSQL(sql)
+        if result is not None:
+            self._ds.ReleaseResultSet(result)
+
+    def add_layer(self, name: str, fields, wkb_type) -> _GpkgLayerSink:
+        ogr = self._ogr
+        flat = int(QgsWkbTypes.flatType(wkb_type))
+        geom_type = ogr.GT_SetModifier(flat, int(QgsWkbTypes.hasZ(wkb_type)), int(QgsWkbTypes.hasM(wkb_type)))
+        # SPATIAL_INDEX=NO – R-tree budowany dopiero w finish()
+        layer = self._ds.CreateLayer(name, self._srs, geom_type, ['SPATIAL_INDEX=NO', 'GEOMETRY_NAME=geom'])
+        if layer is None:
+            raise QgsProcessingException(f'Nie można utworzyć warstwy {name} w {self.path}')
+        for field in fields:
+            definition = ogr.FieldDefn(field.name(), _ogr_field_type(ogr, field))
+            if field.length() > 0:
+                definition.SetWidth(field.length())
+            if field.precision() > 0:
+                definition.SetPrecision(field.precision())
+            layer.CreateField(definition)
+        sink = _GpkgLayerSink(ogr, layer, fields)
+        self._layers.append((name, layer, sink))
+        return sink
+
+    def finish(self, feedback=None):
+        """Zatwierdza transakcję, buduje R-tree i indeksy atrybutowe, zamyka plik."""
+        if self._ds is None:
+            return
+        if self._ds.CommitTransaction() != 0:
+            raise QgsProcessingException(f'Nie udało się zapisać {self.path}')
+        for name, layer, _ in self._layers:
+            if feedback is not None and feedback.isCanceled():
+                break
+            self._execute(f"SELECT CreateSpatialIndex('{name}', '{layer.GetGeometryColumn()}')")
+            defn = layer.GetLayerDefn()
+            for field in INDEXED_FIELDS:
+                if defn.GetFieldIndex(field) >= 0:
+                    self._execute(f'CREATE INDEX "idx_{name}_{field}" ON "{name}" ("{field}")')
+        self._execute('PRAGMA locking_mode = NORMAL')
+        self._layers = []
+        self._ds = None
+
+    def abort(self):
+        """Porzuca zapis (przerwanie) – plik zostaje usunięty."""
+        if self._ds is None:
+            return
+        self._ds.RollbackTransaction()
+        self._layers = []
+        self._ds = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def write_gpkg_bulk(path: str, layers: dict, crs, feedback=None) -> dict:
+    """
+    Zbiorczy zapis warstw {nazwa w pliku: QgsVectorLayer} do jednego
+    GeoPackage; zwraca {nazwa: źródło 'plik|layername=nazwa'}.
+    """
+    writer = GpkgBulkWriter(path, crs)
+    try:
+        for name, layer in layers.items():
+            sink = writer.add_layer(name, layer.fields(), layer.wkbType())
+            for f in layer.getFeatures():
+                if feedback is not None and feedback.isCanceled():
+                    writer.abort()
+                    return {}
+                sink.addFeature(f)
+    except Exception:
+        writer.abort()
+        raise
+    writer.finish(feedback)
+    return {name: gpkg_layer_source(path, name) for name in layers}